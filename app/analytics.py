@@ -0,0 +1,283 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+import os
+
+import numpy as np
+
+from .mapping import SCHEMA_MAPPINGS, validate_and_map_data
+from .segments import quote_identifier
+from .staging import frame_to_arrow, list_staging_files, staging_path, warehouse_schema
+from .sync import sync_chunks
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    pc = None
+
+# Threads used by Arrow for scans, group-bys and sorts; defaults to every core
+ANALYTICS_THREADS = int(os.getenv("ANALYTICS_THREADS", "0"))
+# Rows per chunk when reading a standard table from a source database
+ANALYTICS_CHUNK_SIZE = int(os.getenv("ANALYTICS_CHUNK_SIZE", "100000"))
+# Upper bound on rows returned by one analytics request
+ANALYTICS_MAX_ROWS = int(os.getenv("ANALYTICS_MAX_ROWS", "100000"))
+
+RFM_BINS = 5
+
+# Row order of each result; only the returned rows are sorted
+RFM_ORDER = [("monetary", "descending"), ("customer_id", "ascending")]
+STORE_SPEND_ORDER = [("revenue", "descending")]
+PRODUCT_MIX_ORDER = [("customer_id", "ascending"), ("spend", "descending")]
+
+if pa is not None and ANALYTICS_THREADS > 0:
+    pa.set_cpu_count(ANALYTICS_THREADS)
+
+class AnalyticsError(ValueError):
+    pass
+
+def _require_arrow():
+    if pa is None:
+        raise AnalyticsError("Analytics requires pyarrow")
+
+def _table_columns(table_name: str, columns: Optional[List[str]]) -> List[str]:
+    """Requested columns plus the primary key, in schema order"""
+    fields = SCHEMA_MAPPINGS[table_name]["required_fields"]
+    if columns is None:
+        return list(fields)
+    wanted = set(columns) | {SCHEMA_MAPPINGS[table_name]["primary_key"]}
+    return [f for f in fields if f in wanted]
+
+def latest_rows(table, key: str):
+    """Keep the last row for each key, in original order"""
+    rows = table.append_column("_row", pa.array(np.arange(table.num_rows)))
+    last = rows.group_by(key, use_threads=True).aggregate([("_row", "max")])["_row_max"]
+    return table.take(last.take(pc.sort_indices(last)))
+
+def read_staged_table(table_name: str, staging_ids: Optional[List[str]] = None, columns: Optional[List[str]] = None):
+    """A standard table read from its Parquet staging files.
+
+    Without ``staging_ids`` every staged file of the table is read in creation
+    order, so incremental syncs stack on the initial load; the last staged row
+    for a primary key wins.
+    """
+    _require_arrow()
+    if staging_ids is None:
+        staging_ids = [f["staging_id"] for f in list_staging_files(table_name)]
+    if not staging_ids:
+        raise AnalyticsError(f"No staged data for {table_name}; load it with stage=true or pass connection details")
+
+    import pyarrow.parquet as pq
+
+    columns = _table_columns(table_name, columns)
+    tables = []
+    for staging_id in staging_ids:
+        if staging_id.split("/")[0] != table_name:
+            raise AnalyticsError(f"Staging file {staging_id} does not hold {table_name}")
+        table = pq.read_table(staging_path(staging_id), columns=columns, use_threads=True)
+        tables.append(table.replace_schema_metadata(None))
+    # Older staging files hold second-precision timestamps
+    table = pa.concat_tables(tables, promote_options="permissive")
+    if len(tables) > 1:
+        table = latest_rows(table, SCHEMA_MAPPINGS[table_name]["primary_key"])
+    return table
+
+def read_source_table(
+    source_db,
+    table_name: str,
+    source_table: str,
+    source_schema: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    chunk_size: Optional[int] = None
+):
+    """A standard table read from a source database, mapped chunk by chunk into Arrow"""
+    _require_arrow()
+    table_sql = quote_identifier(source_table)
+    if source_schema:
+        table_sql = f"{quote_identifier(source_schema)}.{table_sql}"
+
+    columns = _table_columns(table_name, columns)
+    batches = []
+    row_count = 0
+    for df in sync_chunks(source_db, f"SELECT * FROM {table_sql}", {}, max(1, chunk_size or ANALYTICS_CHUNK_SIZE)):
+        if df.empty:
+            continue
+        # Keep the index global so generated default ids stay unique across chunks
+        df.index = range(row_count, row_count + len(df))
+        row_count += len(df)
+        mapped = validate_and_map_data(df, table_name)[columns]
+        batches.append(frame_to_arrow(mapped, table_name))
+    if not batches:
+        return warehouse_schema(table_name, columns).empty_table()
+    logger.info(f"Read {row_count} rows of {table_name} from {source_table}")
+    return pa.concat_tables(batches)
+
+def filter_transactions(
+    transactions,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    customer_ids: Optional[List[int]] = None
+):
+    """Transactions inside [start_date, end_date) and, optionally, for some customers"""
+    mask = None
+    date_type = transactions.schema.field("transaction_date").type
+    if start_date is not None:
+        mask = pc.greater_equal(transactions["transaction_date"], pa.scalar(start_date, date_type))
+    if end_date is not None:
+        before = pc.less(transactions["transaction_date"], pa.scalar(end_date, date_type))
+        mask = before if mask is None else pc.and_(mask, before)
+    if customer_ids:
+        wanted = pc.is_in(transactions["customer_id"], value_set=pa.array(customer_ids, pa.int64()))
+        mask = wanted if mask is None else pc.and_(mask, wanted)
+    return transactions if mask is None else transactions.filter(mask)
+
+def _lookup(keys, dimension, key_column: str, value_column: str):
+    """Dimension values for each key, matched without a join"""
+    positions = pc.index_in(keys, value_set=dimension[key_column])
+    return dimension[value_column].take(positions)
+
+def _score(values, descending: bool = False):
+    """1-5 quantile score; ties share the lower score"""
+    ranks = pc.rank(values, sort_keys="descending" if descending else "ascending", tiebreaker="min")
+    n = len(values)
+    return pc.add(pc.divide(pc.multiply(pc.subtract(ranks, 1), RFM_BINS), n), 1).cast(pa.int8())
+
+def rfm_scores(transactions, as_of: Optional[datetime] = None):
+    """Recency, frequency and monetary value per customer with 1-5 scores.
+
+    Recency is measured in days from ``as_of``, which defaults to the latest
+    transaction date so historical data scores the same on every run.
+    """
+    transactions = transactions.filter(
+        pc.and_(pc.is_valid(transactions["customer_id"]), pc.is_valid(transactions["transaction_date"]))
+    )
+    customers = transactions.group_by("customer_id", use_threads=True).aggregate([
+        ("transaction_date", "max"),
+        ("transaction_id", "count"),
+        ("total_amount", "sum")
+    ])
+    if customers.num_rows == 0:
+        return customers, as_of
+
+    date_type = transactions.schema.field("transaction_date").type
+    if as_of is None:
+        as_of = pc.max(transactions["transaction_date"]).as_py()
+    last_purchase = customers["transaction_date_max"]
+    recency = pc.days_between(last_purchase, pa.scalar(as_of, date_type))
+    frequency = customers["transaction_id_count"]
+    monetary = pc.fill_null(customers["total_amount_sum"], 0.0)
+
+    r_score = _score(recency, descending=True)
+    f_score = _score(frequency)
+    m_score = _score(monetary)
+    result = pa.table({
+        "customer_id": customers["customer_id"],
+        "last_purchase": last_purchase,
+        "recency_days": recency,
+        "frequency": frequency,
+        "monetary": monetary,
+        "r_score": r_score,
+        "f_score": f_score,
+        "m_score": m_score,
+        "rfm_score": pc.binary_join_element_wise(
+            r_score.cast(pa.string()), f_score.cast(pa.string()), m_score.cast(pa.string()), ""
+        )
+    })
+    return result, as_of
+
+def spend_by_store(transactions, stores, level: str = "store"):
+    """Revenue, transactions and distinct customers per store or per region"""
+    if level not in ("store", "region"):
+        raise AnalyticsError(f"Unknown level: {level}. Use store or region")
+
+    aggregates = [
+        ("transaction_id", "count"),
+        ("customer_id", "count_distinct"),
+        ("total_amount", "sum"),
+        ("quantity", "sum")
+    ]
+    if level == "store":
+        grouped = transactions.group_by("store_id", use_threads=True).aggregate(aggregates)
+        keys = {
+            "store_id": grouped["store_id"],
+            "store_name": _lookup(grouped["store_id"], stores, "store_id", "store_name"),
+            "city": _lookup(grouped["store_id"], stores, "store_id", "city"),
+            "region": _lookup(grouped["store_id"], stores, "store_id", "region")
+        }
+    else:
+        region = _lookup(transactions["store_id"], stores, "store_id", "region")
+        grouped = transactions.append_column("region", region).group_by("region", use_threads=True).aggregate(
+            [("store_id", "count_distinct")] + aggregates
+        )
+        keys = {"region": grouped["region"], "stores": grouped["store_id_count_distinct"]}
+
+    revenue = pc.fill_null(grouped["total_amount_sum"], 0.0)
+    transaction_count = grouped["transaction_id_count"]
+    total_revenue = pc.sum(revenue).as_py() or 0.0
+    result = pa.table({
+        **keys,
+        "transactions": transaction_count,
+        "customers": grouped["customer_id_count_distinct"],
+        "quantity": grouped["quantity_sum"],
+        "revenue": revenue,
+        "avg_basket": pc.divide(revenue, pc.cast(transaction_count, pa.float64())),
+        "revenue_share": pc.divide(revenue, total_revenue) if total_revenue else pa.nulls(len(revenue), pa.float64())
+    })
+    return result
+
+def product_mix(transactions, product_lines, level: str = "product_line"):
+    """Spend per customer and product line (or category) with its share of the customer's spend"""
+    if level not in ("product_line", "category"):
+        raise AnalyticsError(f"Unknown level: {level}. Use product_line or category")
+
+    transactions = transactions.filter(pc.is_valid(transactions["customer_id"]))
+    if level == "product_line":
+        key = "product_line_id"
+    else:
+        key = "category"
+        transactions = transactions.append_column(
+            "category", _lookup(transactions["product_line_id"], product_lines, "product_line_id", "category")
+        )
+
+    grouped = transactions.group_by(["customer_id", key], use_threads=True).aggregate([
+        ("transaction_id", "count"),
+        ("quantity", "sum"),
+        ("total_amount", "sum")
+    ])
+    spend = pc.fill_null(grouped["total_amount_sum"], 0.0)
+    totals = pa.table({"customer_id": grouped["customer_id"], "spend": spend}).group_by(
+        "customer_id", use_threads=True
+    ).aggregate([("spend", "sum")])
+    customer_total = _lookup(grouped["customer_id"], totals, "customer_id", "spend_sum")
+
+    columns = {"customer_id": grouped["customer_id"], key: grouped[key]}
+    if level == "product_line":
+        columns["name"] = _lookup(grouped[key], product_lines, "product_line_id", "name")
+        columns["category"] = _lookup(grouped[key], product_lines, "product_line_id", "category")
+    result = pa.table({
+        **columns,
+        "transactions": grouped["transaction_id_count"],
+        "quantity": grouped["quantity_sum"],
+        "spend": spend,
+        # null when the customer has no positive spend to share out
+        "share_of_spend": pc.divide(spend, pc.if_else(pc.greater(customer_total, 0), customer_total, None))
+    })
+    return result
+
+def clamp_rows(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return ANALYTICS_MAX_ROWS
+    return min(limit, ANALYTICS_MAX_ROWS)
+
+def top_rows(table, sort_keys, limit: int):
+    """The first ``limit`` rows in sort order, selected without sorting the whole table"""
+    if table.num_rows > limit:
+        table = table.take(pc.select_k_unstable(table, k=limit, sort_keys=sort_keys))
+    return table.sort_by(sort_keys)
+
+def score_distribution(rfm, column: str) -> Dict[str, int]:
+    counts = rfm.group_by(column).aggregate([([], "count_all")]).sort_by(column)
+    return {str(k): v for k, v in zip(counts[column].to_pylist(), counts["count_all"].to_pylist())}
@@ -0,0 +1,175 @@
+from typing import Any, Dict, List, Optional
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# How long a cached catalog may be served without touching the source at all
+CATALOG_CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_INTERVAL", "30"))
+# Maximum age of a cached catalog before it is reloaded even if the fingerprint matches
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "900"))
+CATALOG_MAX_SOURCES = int(os.getenv("CATALOG_MAX_SOURCES", "64"))
+
+# Relations listed by the catalog: tables, views, materialized views, partitioned and foreign tables
+_RELATION_FILTER = """
+    c.relkind IN ('r', 'v', 'm', 'p', 'f')
+    AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+    AND n.nspname NOT LIKE 'pg_toast%'
+    AND NOT c.relispartition
+"""
+
+# Joins pg_class to its namespace by oid, so tables with the same name in
+# different schemas no longer fan out
+_CATALOG_QUERY = """
+    SELECT
+        n.nspname AS schema_name,
+        c.relname AS table_name,
+        a.attname AS column_name,
+        pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type,
+        pg_catalog.obj_description(c.oid, 'pg_class') AS description
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE {relation_filter}
+        AND pg_catalog.has_table_privilege(c.oid, 'SELECT')
+        {table_filter}
+    ORDER BY n.nspname, c.relname, a.attnum
+"""
+
+# Cheap summary that changes when relations are created, dropped or gain columns
+_FINGERPRINT_QUERY = """
+    SELECT count(*), coalesce(sum(c.relnatts), 0), coalesce(max(c.oid::bigint), 0)
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE {relation_filter}
+"""
+
+def _introspect(source_db, table: Optional[str] = None, schema: Optional[str] = None) -> List[Dict[str, Any]]:
+    table_filter = ""
+    params = {}
+    if table:
+        table_filter += " AND c.relname = :table"
+        params["table"] = table
+    if schema:
+        table_filter += " AND n.nspname = :schema"
+        params["schema"] = schema
+
+    query = text(_CATALOG_QUERY.format(relation_filter=_RELATION_FILTER, table_filter=table_filter))
+    rows = source_db.execute(query, params).fetchall()
+    logger.info(f"Catalog query returned {len(rows)} columns")
+
+    tables = {}
+    for schema_name, table_name, column_name, data_type, description in rows:
+        table_key = f"{schema_name}.{table_name}"
+        if table_key not in tables:
+            tables[table_key] = {
+                "schema_name": schema_name,
+                "table_name": table_name,
+                "description": description or f"{table_name} table",
+                "columns": [],
+                "column_types": {}
+            }
+        tables[table_key]["columns"].append(column_name)
+        tables[table_key]["column_types"][column_name] = data_type
+    return list(tables.values())
+
+def _fingerprint(source_db) -> tuple:
+    row = source_db.execute(text(_FINGERPRINT_QUERY.format(relation_filter=_RELATION_FILTER))).fetchone()
+    return tuple(int(v) for v in row)
+
+def _filter(tables: List[Dict[str, Any]], table: Optional[str], schema: Optional[str]) -> List[Dict[str, Any]]:
+    return [
+        t for t in tables
+        if (table is None or t["table_name"] == table) and (schema is None or t["schema_name"] == schema)
+    ]
+
+class CatalogCache:
+    """Per-source cache of table and column metadata"""
+
+    def __init__(self, check_interval: float, ttl: float, max_sources: int):
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self.max_sources = max_sources
+        # source fingerprint -> {"tables", "fingerprint", "loaded_at", "checked_at"}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # (source fingerprint, table, schema) -> (tables, loaded_at) for single-table lookups
+        self._single_tables: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0}
+
+    def get_tables(
+        self,
+        source_db,
+        source_key: str,
+        table: Optional[str] = None,
+        schema: Optional[str] = None,
+        refresh: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Return catalog entries for a source, optionally for one table only"""
+        now = time.monotonic()
+        with self._lock:
+            entry = None if refresh else self._entries.get(source_key)
+
+        if entry is not None and now - entry["loaded_at"] < self.ttl:
+            if now - entry["checked_at"] < self.check_interval:
+                self.stats["hits"] += 1
+                return _filter(entry["tables"], table, schema)
+            if _fingerprint(source_db) == entry["fingerprint"]:
+                entry["checked_at"] = now
+                self.stats["revalidated"] += 1
+                return _filter(entry["tables"], table, schema)
+            logger.info("Catalog fingerprint changed, reloading")
+
+        if table and (entry is None or refresh):
+            # Single-table lookups without a cached catalog only read that table
+            single_key = (source_key, table, schema)
+            if refresh:
+                self.invalidate(source_key)
+            else:
+                cached = self._single_tables.get(single_key)
+                if cached is not None and now - cached[1] < self.check_interval:
+                    self.stats["hits"] += 1
+                    return cached[0]
+            self.stats["misses"] += 1
+            tables = _introspect(source_db, table=table, schema=schema)
+            with self._lock:
+                if len(self._single_tables) >= self.max_sources * 16:
+                    self._single_tables.clear()
+                self._single_tables[single_key] = (tables, now)
+            return tables
+
+        self.stats["misses"] += 1
+        fingerprint = _fingerprint(source_db)
+        tables = _introspect(source_db)
+        with self._lock:
+            self._entries[source_key] = {
+                "tables": tables,
+                "fingerprint": fingerprint,
+                "loaded_at": now,
+                "checked_at": now
+            }
+            while len(self._entries) > self.max_sources:
+                oldest = min(self._entries, key=lambda k: self._entries[k]["checked_at"])
+                del self._entries[oldest]
+        return _filter(tables, table, schema)
+
+    def invalidate(self, source_key: Optional[str] = None):
+        """Drop the cached catalog of one source, or of every source"""
+        with self._lock:
+            if source_key is None:
+                self._entries.clear()
+                self._single_tables.clear()
+            else:
+                self._entries.pop(source_key, None)
+                for key in [k for k in self._single_tables if k[0] == source_key]:
+                    del self._single_tables[key]
+
+catalog_cache = CatalogCache(
+    check_interval=CATALOG_CHECK_INTERVAL,
+    ttl=CATALOG_TTL,
+    max_sources=CATALOG_MAX_SOURCES
+)
@@ -0,0 +1,65 @@
+from typing import Any, AsyncIterator, Callable, Dict, Iterator
+import functools
+import logging
+import os
+
+import anyio
+import anyio.to_thread
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of worker threads each endpoint group may occupy at once
+ENDPOINT_CONCURRENCY = {
+    "query": int(os.getenv("QUERY_CONCURRENCY", "8")),
+    "upload": int(os.getenv("UPLOAD_CONCURRENCY", "4")),
+    "connection": int(os.getenv("CONNECTION_CONCURRENCY", "8")),
+    "metadata": int(os.getenv("METADATA_CONCURRENCY", "8")),
+}
+
+_limiters: Dict[str, anyio.CapacityLimiter] = {}
+
+def get_limiter(group: str) -> anyio.CapacityLimiter:
+    """Capacity limiter for an endpoint group, created on first use inside the event loop"""
+    limiter = _limiters.get(group)
+    if limiter is None:
+        limiter = anyio.CapacityLimiter(ENDPOINT_CONCURRENCY.get(group, 4))
+        _limiters[group] = limiter
+    return limiter
+
+async def run_blocking(group: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run blocking database, pandas or HTTP work on a worker thread.
+
+    The event loop stays free to serve other requests while ``func`` runs, and
+    at most ``ENDPOINT_CONCURRENCY[group]`` calls of the group run at once.
+    """
+    limiter = get_limiter(group)
+    if limiter.borrowed_tokens >= limiter.total_tokens:
+        logger.info(f"All {limiter.total_tokens} '{group}' workers busy, request queued")
+    return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=limiter)
+
+async def iterate_blocking(group: str, iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    """Pull items from a blocking iterator on the group's worker threads, one at a time.
+
+    The iterator is closed on a worker thread too when the consumer stops
+    early, e.g. because a streaming client disconnected.
+    """
+    done = object()
+    try:
+        while True:
+            item = await run_blocking(group, next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            # Shielded so a cancelled request still releases the source connection
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(close, limiter=get_limiter(group))
+
+def limiter_stats() -> Dict[str, Dict[str, float]]:
+    """Current utilisation of each endpoint group"""
+    return {
+        group: {"in_use": limiter.borrowed_tokens, "limit": limiter.total_tokens}
+        for group, limiter in _limiters.items()
+    }
@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, Optional
+import io
+import logging
+import random
+import time
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from .loader import BULK_BACKOFF_SECONDS, BULK_MAX_RETRIES, is_transient_sqlstate
+from .mapping import SCHEMA_MAPPINGS
+from .segments import quote_identifier
+from .serialization import DATETIME_FORMAT
+from .settings import get_settings
+from .staging import frame_to_arrow, warehouse_timestamps
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+# Marker for NULL in the pandas CSV fallback; Arrow writes NULL as an unquoted empty field
+_NULL = "\\N"
+
+def _csv_payload(data, table_name: str) -> bytes:
+    """CSV body for COPY: Arrow when installed, pandas otherwise"""
+    if pa is not None:
+        # The Arrow CSV writer is imported with the first COPY load
+        import pyarrow.csv as pa_csv
+
+        table = data if isinstance(data, pa.Table) else frame_to_arrow(data, table_name)
+        buffer = io.BytesIO()
+        pa_csv.write_csv(table, buffer, pa_csv.WriteOptions(include_header=False))
+        return buffer.getvalue()
+    return warehouse_timestamps(data).to_csv(index=False, header=False, na_rep=_NULL, date_format=DATETIME_FORMAT).encode()
+
+def _copy(dbapi_connection, sql: str, payload: bytes):
+    cursor = dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy"):
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(payload)
+        else:
+            # psycopg2
+            cursor.copy_expert(sql, io.BytesIO(payload))
+    finally:
+        cursor.close()
+
+def merge_sql(table_sql: str, stage_sql: str, columns: List[str], primary_key: Optional[str]) -> str:
+    """Move staged rows into the target, updating rows whose primary key already exists"""
+    column_list = ", ".join(quote_identifier(c) for c in columns)
+    if not primary_key:
+        return f"INSERT INTO {table_sql} ({column_list}) SELECT {column_list} FROM {stage_sql}"
+    key_sql = quote_identifier(primary_key)
+    updates = ", ".join(f"{quote_identifier(c)} = EXCLUDED.{quote_identifier(c)}" for c in columns if c != primary_key)
+    conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+    # The last staged row wins when a batch repeats a key; ON CONFLICT cannot touch a row twice
+    return (
+        f"INSERT INTO {table_sql} ({column_list}) "
+        f"SELECT DISTINCT ON ({key_sql}) {column_list} FROM {stage_sql} "
+        f"ORDER BY {key_sql}, _stage_row DESC "
+        f"ON CONFLICT ({key_sql}) {conflict}"
+    )
+
+def _is_transient(e: Exception) -> bool:
+    """Whether a failed COPY transaction is worth retrying; constraint and data errors are not"""
+    if isinstance(e, DBAPIError):
+        if e.connection_invalidated:
+            return True
+        sqlstate = getattr(e.orig, "sqlstate", None)
+        # Connection failures carry no SQLSTATE
+        if sqlstate is None:
+            return isinstance(e, OperationalError)
+        return is_transient_sqlstate(sqlstate)
+    return isinstance(e, (ConnectionError, TimeoutError))
+
+def _copy_batch(engine, table_name: str, batch_number: int, data, columns: List[str], upsert: bool, max_retries: int, backoff: float) -> Dict[str, Any]:
+    """COPY one batch into a temporary staging table and merge it, retrying the whole transaction on transient errors"""
+    rows = data.num_rows if pa is not None and isinstance(data, pa.Table) else len(data)
+    primary_key = SCHEMA_MAPPINGS[table_name]["primary_key"] if upsert else None
+    table_sql = f"{quote_identifier(get_settings().warehouse_schema)}.{quote_identifier(table_name)}"
+    stage_sql = quote_identifier(f"_stage_{table_name}")
+    column_list = ", ".join(quote_identifier(c) for c in columns)
+    null_option = "" if pa is not None else f", NULL '{_NULL}'"
+    payload = _csv_payload(data, table_name)
+
+    attempt = 0
+    started = time.perf_counter()
+    while True:
+        attempt += 1
+        try:
+            with engine.begin() as connection:
+                connection.exec_driver_sql(
+                    f"CREATE TEMP TABLE {stage_sql} (LIKE {table_sql} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {stage_sql} ADD COLUMN _stage_row bigint GENERATED ALWAYS AS IDENTITY"
+                )
+                _copy(
+                    connection.connection.driver_connection,
+                    f"COPY {stage_sql} ({column_list}) FROM STDIN WITH (FORMAT csv{null_option})",
+                    payload
+                )
+                result = connection.exec_driver_sql(merge_sql(table_sql, stage_sql, columns, primary_key))
+            return {
+                "batch": batch_number,
+                "rows": rows,
+                "bytes": len(payload),
+                "inserted": max(result.rowcount, 0),
+                "attempts": attempt,
+                "elapsed_seconds": round(time.perf_counter() - started, 3),
+                "error": None
+            }
+        except Exception as e:
+            if attempt > max_retries or not _is_transient(e):
+                logger.warning(f"COPY batch {batch_number} of {table_name} failed after {attempt} attempts: {str(e)}")
+                return {
+                    "batch": batch_number,
+                    "rows": rows,
+                    "bytes": len(payload),
+                    "inserted": 0,
+                    "attempts": attempt,
+                    "elapsed_seconds": round(time.perf_counter() - started, 3),
+                    "error": str(e)
+                }
+            delay = backoff * (2 ** (attempt - 1)) * (1 + random.random())
+            logger.info(f"COPY batch {batch_number} of {table_name} failed (attempt {attempt}), retrying in {delay:.2f}s: {str(e)}")
+            time.sleep(delay)
+
+def copy_load(
+    engine,
+    table_name: str,
+    data,
+    upsert: bool = False,
+    batch_size: Optional[int] = None,
+    max_retries: Optional[int] = None,
+    backoff: Optional[float] = None
+) -> Dict[str, Any]:
+    """Load a mapped DataFrame or Arrow table into the warehouse with COPY.
+
+    Rows are copied into a temporary table and merged into the target in the same
+    transaction, so a batch is applied completely or not at all. Returns the same
+    summary as loader.bulk_load.
+    """
+    batch_size = max(1, batch_size or get_settings().copy_batch_size)
+    max_retries = BULK_MAX_RETRIES if max_retries is None else max_retries
+    backoff = BULK_BACKOFF_SECONDS if backoff is None else backoff
+
+    is_arrow = pa is not None and isinstance(data, pa.Table)
+    total = data.num_rows if is_arrow else len(data)
+    columns = list(data.column_names if is_arrow else data.columns)
+    if total == 0:
+        return {"inserted_count": 0, "failed_count": 0, "batches": []}
+
+    results = []
+    for batch_number, start in enumerate(range(0, total, batch_size)):
+        batch = data.slice(start, batch_size) if is_arrow else data.iloc[start:start + batch_size]
+        results.append(_copy_batch(engine, table_name, batch_number, batch, columns, upsert, max_retries, backoff))
+
+    inserted_count = sum(r["inserted"] for r in results)
+    failed_count = sum(r["rows"] for r in results if r["error"])
+    if failed_count:
+        logger.warning(f"{failed_count} of {total} records failed to COPY into {table_name}")
+    return {
+        "inserted_count": inserted_count,
+        "failed_count": failed_count,
+        "batches": results
+    }
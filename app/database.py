@@ -1,56 +1,219 @@
+from __future__ import annotations
+
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from supabase import create_client, Client
-import os
-from dotenv import load_dotenv
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+import hashlib
+import threading
+import time
 import logging
 
+from .settings import get_settings
+
+if TYPE_CHECKING:
+    import httpx
+    from supabase import Client
+
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Resolved here, before the other app modules read their own environment variables
+settings = get_settings()
+
+def source_fingerprint(host: str, port: str, database: str, username: str, password: str) -> str:
+    """Stable hash of the connection details, used as the key for per-source caches"""
+    raw = "\x00".join([host, str(port), database, username, password])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class SourceEngineRegistry:
+    """Bounded LRU registry of pooled engines, one per source database"""
+
+    def __init__(self, max_engines: int, idle_ttl: float, pool_size: int, max_overflow: int):
+        self.max_engines = max_engines
+        self.idle_ttl = idle_ttl
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        # fingerprint -> [engine, sessionmaker, last_used]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_sessionmaker(self, host: str, port: str, database: str, username: str, password: str):
+        key = source_fingerprint(host, port, database, username, password)
+        now = time.monotonic()
+        evicted = []
+
+        with self._lock:
+            evicted.extend(self._pop_idle(now))
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[2] = now
+                self._entries.move_to_end(key)
+                factory = entry[1]
+            else:
+                logger.info(f"Creating pooled engine for source database at: {host}:{port}/{database}")
+                connection_string = f"postgresql://{username}:{password}@{host}:{port}/{database}"
+                engine = create_engine(
+                    connection_string,
+                    pool_size=self.pool_size,
+                    max_overflow=self.max_overflow,
+                    pool_timeout=settings.source_pool_timeout,
+                    pool_recycle=settings.source_pool_recycle,
+                    pool_pre_ping=True,
+                )
+                factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+                self._entries[key] = [engine, factory, now]
+                while len(self._entries) > self.max_engines:
+                    _, old = self._entries.popitem(last=False)
+                    evicted.append(old[0])
+
+        # Dispose outside the lock; checked-out connections are closed when returned
+        for engine in evicted:
+            engine.dispose()
+
+        return factory
+
+    def _pop_idle(self, now: float):
+        expired = [k for k, entry in self._entries.items() if now - entry[2] > self.idle_ttl]
+        return [self._entries.pop(k)[0] for k in expired]
+
+    def invalidate(self, fingerprint: str):
+        """Drop and dispose the engine for one source"""
+        with self._lock:
+            entry = self._entries.pop(fingerprint, None)
+        if entry is not None:
+            entry[0].dispose()
+
+    def dispose_all(self):
+        """Dispose every cached engine, e.g. on application shutdown"""
+        with self._lock:
+            engines = [entry[0] for entry in self._entries.values()]
+            self._entries.clear()
+        for engine in engines:
+            engine.dispose()
 
-# Supabase configuration (data warehouse)
-supabase_url = os.getenv("SUPABASE_URL")
-# Use service role key which bypasses RLS
-supabase_key = os.getenv("SUPABASE_SERVICE_KEY", os.getenv("SUPABASE_KEY"))
+    def stats(self):
+        """Pool utilisation per cached source"""
+        with self._lock:
+            entries = list(self._entries.items())
+        return [
+            {
+                "source": key[:12],
+                "checked_out": entry[0].pool.checkedout(),
+                "pool_size": entry[0].pool.size(),
+                "idle_seconds": round(time.monotonic() - entry[2], 1),
+            }
+            for key, entry in entries
+        ]
+
+source_engines = SourceEngineRegistry(
+    max_engines=settings.source_engine_max,
+    idle_ttl=settings.source_engine_idle_ttl,
+    pool_size=settings.source_pool_size,
+    max_overflow=settings.source_pool_max_overflow,
+)
 
 def create_source_connection(host: str, port: str, database: str, username: str, password: str):
-    """Create connection to source database using user-provided credentials"""
+    """Open a session on the pooled engine for the user-provided source database"""
     try:
-        connection_string = f"postgresql://{username}:{password}@{host}:{port}/{database}"
-        logger.info(f"Connecting to source database at: {host}:{port}/{database}")
-        
-        engine = create_engine(connection_string)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        db = SessionLocal()
-        
-        # Test the connection
-        db.execute(text("SELECT 1"))
-        logger.info("Source database connection successful")
-        
-        return db
+        SessionLocal = source_engines.get_sessionmaker(host, port, database, username, password)
+        # Connections are validated by pool_pre_ping when first used, so no eager SELECT 1
+        return SessionLocal()
     except Exception as e:
         logger.error(f"Error connecting to source database: {str(e)}")
         raise
 
-def get_supabase():
-    """Get connection to Supabase data warehouse with authentication"""
-    try:
-        logger.info(f"Connecting to Supabase at: {supabase_url}")
-        client = create_client(supabase_url, supabase_key)
-        
-        # Sign in with a service account or use a JWT token
-        # Option 1: Sign in with email/password
-        # auth_response = client.auth.sign_in_with_password({
-        #     "email": os.getenv("SUPABASE_USER_EMAIL"),
-        #     "password": os.getenv("SUPABASE_USER_PASSWORD")
-        # })
-        
-        # Option 2: Use service role key (preferred for backend services)
-        # Make sure to set SUPABASE_SERVICE_KEY in your .env file
-        
-        return client
-    except Exception as e:
-        logger.error(f"Error connecting to Supabase: {str(e)}")
-        raise 
\ No newline at end of file
+# Process-wide Supabase client, created lazily on first use
+_supabase_client: Optional[Client] = None
+_supabase_http: Optional[httpx.Client] = None
+_supabase_lock = threading.Lock()
+
+def get_supabase() -> Client:
+    """Get the shared Supabase data warehouse client, creating it on first use"""
+    global _supabase_client, _supabase_http
+    if _supabase_client is not None:
+        return _supabase_client
+
+    with _supabase_lock:
+        if _supabase_client is not None:
+            return _supabase_client
+        try:
+            # The Supabase SDK is only imported by processes that load through it
+            import httpx
+            from supabase import create_client
+            from supabase.lib.client_options import SyncClientOptions
+
+            logger.info(f"Connecting to Supabase at: {settings.supabase_url}")
+            # One keep-alive connection pool shared by every request and bulk-load worker
+            _supabase_http = httpx.Client(
+                timeout=httpx.Timeout(settings.supabase_http_timeout),
+                limits=httpx.Limits(
+                    max_connections=settings.supabase_http_max_connections,
+                    max_keepalive_connections=settings.supabase_http_max_connections,
+                    keepalive_expiry=settings.supabase_http_keepalive_expiry,
+                ),
+            )
+            client = create_client(
+                settings.supabase_url,
+                settings.supabase_key,
+                options=SyncClientOptions(httpx_client=_supabase_http),
+            )
+            # Build the PostgREST client now so concurrent callers never race on it
+            client.postgrest
+
+            # Sign in with a service account or use a JWT token
+            # Option 1: Sign in with email/password
+            # auth_response = client.auth.sign_in_with_password({
+            #     "email": os.getenv("SUPABASE_USER_EMAIL"),
+            #     "password": os.getenv("SUPABASE_USER_PASSWORD")
+            # })
+            
+            # Option 2: Use service role key (preferred for backend services)
+            # Make sure to set SUPABASE_SERVICE_KEY in your .env file
+
+            _supabase_client = client
+            return client
+        except Exception as e:
+            if _supabase_http is not None:
+                _supabase_http.close()
+                _supabase_http = None
+            logger.error(f"Error connecting to Supabase: {str(e)}")
+            raise
+
+def close_supabase():
+    """Close the shared Supabase client and its HTTP connection pool"""
+    global _supabase_client, _supabase_http
+    with _supabase_lock:
+        if _supabase_http is not None:
+            _supabase_http.close()
+        _supabase_client = None
+        _supabase_http = None
+
+_warehouse_engine = None
+_warehouse_lock = threading.Lock()
+
+def get_warehouse_engine():
+    """Pooled engine for the warehouse Postgres, created on first use"""
+    global _warehouse_engine
+    if _warehouse_engine is not None:
+        return _warehouse_engine
+
+    with _warehouse_lock:
+        if _warehouse_engine is None:
+            if not settings.warehouse_database_url:
+                raise ValueError("WAREHOUSE_DATABASE_URL is not configured")
+            logger.info("Creating pooled engine for the warehouse database")
+            _warehouse_engine = create_engine(
+                settings.warehouse_database_url,
+                pool_size=settings.warehouse_pool_size,
+                max_overflow=settings.warehouse_pool_size,
+                pool_recycle=settings.source_pool_recycle,
+                pool_pre_ping=True,
+            )
+        return _warehouse_engine
+
+def close_warehouse_engine():
+    global _warehouse_engine
+    with _warehouse_lock:
+        if _warehouse_engine is not None:
+            _warehouse_engine.dispose()
+        _warehouse_engine = None
@@ -1,10 +1,54 @@
-from .models import Base
-from .database import engine
+from typing import List, Optional
+import logging
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+from sqlalchemy import text
+
+# First, so .env is loaded before the modules below read their environment variables
+from .database import get_warehouse_engine, settings
+from .mapping import SCHEMA_MAPPINGS
+from .model_load import reference_columns
+from .segments import quote_identifier
+
+logger = logging.getLogger(__name__)
+
+# Postgres column type for each SCHEMA_MAPPINGS field type; mapped dates are timestamps
+COLUMN_TYPES = {"int": "BIGINT", "float": "DOUBLE PRECISION", "string": "TEXT", "date": "TIMESTAMP"}
+
+def table_ddl(table_name: str, schema: Optional[str] = None) -> List[str]:
+    """CREATE statements for one standard table and the indexes on its join keys.
+
+    The primary key backs the upserts of both loaders. Columns holding another
+    table's key get an index but no foreign key, since tables can be loaded
+    separately and in any order.
+    """
+    schema = schema or settings.warehouse_schema
+    mapping = SCHEMA_MAPPINGS[table_name]
+    table_sql = f"{quote_identifier(schema)}.{quote_identifier(table_name)}"
+    columns = [
+        f"{quote_identifier(field)} {COLUMN_TYPES[mapping['field_types'][field]]}"
+        + (" PRIMARY KEY" if field == mapping["primary_key"] else "")
+        for field in mapping["required_fields"]
+    ]
+    statements = [f"CREATE TABLE IF NOT EXISTS {table_sql} ({', '.join(columns)})"]
+    for column in reference_columns(table_name):
+        index_sql = quote_identifier(f"{table_name}_{column}_idx")
+        statements.append(f"CREATE INDEX IF NOT EXISTS {index_sql} ON {table_sql} ({quote_identifier(column)})")
+    return statements
+
+def init_db(engine=None, schema: Optional[str] = None) -> List[str]:
+    """Create the missing warehouse tables and indexes in one transaction; safe to run again"""
+    engine = engine or get_warehouse_engine()
+    schema = schema or settings.warehouse_schema
+    with engine.begin() as connection:
+        for table_name in SCHEMA_MAPPINGS:
+            for statement in table_ddl(table_name, schema):
+                connection.execute(text(statement))
+    logger.info(f"Warehouse schema {schema} has tables: {', '.join(SCHEMA_MAPPINGS)}")
+    return list(SCHEMA_MAPPINGS)
 
 if __name__ == "__main__":
-    print("Inserting database tables...")
+    # python -m app.init_db, against WAREHOUSE_DATABASE_URL and WAREHOUSE_SCHEMA
+    logging.basicConfig(level=logging.INFO)
+    print("Creating warehouse tables...")
     init_db()
-    print("Database tables inserted successfully!") 
\ No newline at end of file
+    print("Warehouse tables created successfully!")
@@ -0,0 +1,273 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from .metrics import route_context
+
+logger = logging.getLogger(__name__)
+
+# Local SQLite file holding job state; ":memory:" keeps it in-process
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+# Ingestion jobs processed at the same time; the rest wait in the queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    table_name TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    rows_read INTEGER NOT NULL DEFAULT 0,
+    rows_mapped INTEGER NOT NULL DEFAULT 0,
+    rows_inserted INTEGER NOT NULL DEFAULT 0,
+    rows_failed INTEGER NOT NULL DEFAULT 0,
+    total_rows INTEGER,
+    error TEXT,
+    result TEXT,
+    owner TEXT
+)
+"""
+
+_COUNTERS = ("rows_read", "rows_mapped", "rows_inserted", "rows_failed")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+def _boot_id() -> str:
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def process_owner() -> str:
+    """host:boot id:pid of this process, recorded on the jobs it runs"""
+    return f"{socket.gethostname()}:{_boot_id()}:{os.getpid()}"
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """Whether the process that owns a job may still be running it"""
+    if not owner:
+        return False
+    host, boot_id, pid = owner.rsplit(":", 2)
+    if host != socket.gethostname():
+        # Another machine sharing the file; its processes cannot be checked from here
+        return True
+    if boot_id != _boot_id():
+        return False
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobCancelled(BaseException):
+    """Raised from a progress report of a cancelled job.
+
+    Like asyncio.CancelledError it is not an Exception, so the broad
+    ``except Exception`` handlers around ingestion code let it through.
+    """
+
+class JobStore:
+    """Job rows in a local SQLite database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # One shared connection; SQLite calls are serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self.owner = process_owner()
+        with self._lock, self._conn:
+            self._conn.execute(_SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            # Jobs left queued or running by a process that has stopped will never
+            # finish; those of other live workers sharing the file are still running
+            unfinished = self._conn.execute(
+                "SELECT id, owner FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+            finished_at = datetime.now().isoformat()
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted by a server restart', finished_at = ? "
+                "WHERE id = ?",
+                [(finished_at, row["id"]) for row in unfinished if not _owner_alive(row["owner"])]
+            )
+
+    def create(self, kind: str, table_name: Optional[str]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, table_name, status, created_at, owner) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, table_name, datetime.now().isoformat(), self.owner)
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], default=str)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _job_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+
+    # Throughput and ETA are derived from the counters on every read
+    job["elapsed_seconds"] = None
+    job["rows_per_second"] = None
+    job["eta_seconds"] = None
+    if job["started_at"]:
+        end = datetime.fromisoformat(job["finished_at"]) if job["finished_at"] else datetime.now()
+        elapsed = (end - datetime.fromisoformat(job["started_at"])).total_seconds()
+        job["elapsed_seconds"] = round(elapsed, 3)
+        if elapsed > 0 and job["rows_read"]:
+            rate = job["rows_read"] / elapsed
+            job["rows_per_second"] = round(rate, 1)
+            if job["status"] == "running" and job["total_rows"]:
+                job["eta_seconds"] = round(max(job["total_rows"] - job["rows_read"], 0) / rate, 1)
+    return job
+
+class JobContext:
+    """Handed to a running job to report progress and observe cancellation"""
+
+    def __init__(self, store: JobStore, job_id: str, cancel_event: threading.Event):
+        self.store = store
+        self.job_id = job_id
+        self._cancel_event = cancel_event
+        self.counters = dict.fromkeys(_COUNTERS, 0)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def progress(self, total_rows: Optional[int] = None, **increments):
+        """Add to the row counters, then stop here if the job was cancelled"""
+        for name, value in increments.items():
+            self.counters[name] += value
+        fields = dict(self.counters)
+        if total_rows is not None:
+            fields["total_rows"] = total_rows
+        self.store.update(self.job_id, **fields)
+        self.check_cancelled()
+
+class JobManager:
+    """Bounded worker pool running queued ingestion jobs"""
+
+    def __init__(self, store: JobStore, workers: int):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job")
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        kind: str,
+        table_name: Optional[str],
+        func: Callable[[JobContext], Dict[str, Any]],
+        cleanup: Optional[Callable[[], None]] = None
+    ) -> str:
+        """Queue func(context) and return the job id"""
+        job_id = self.store.create(kind, table_name)
+        cancel_event = threading.Event()
+        with self._lock:
+            self._cancel_events[job_id] = cancel_event
+        self._executor.submit(self._run, job_id, kind, func, cancel_event, cleanup)
+        logger.info(f"Queued {kind} job {job_id} for {table_name}")
+        return job_id
+
+    def _run(self, job_id: str, kind: str, func, cancel_event: threading.Event, cleanup):
+        try:
+            if cancel_event.is_set():
+                self.store.update(job_id, status="cancelled", finished_at=datetime.now().isoformat())
+                return
+            self.store.update(job_id, status="running", started_at=datetime.now().isoformat())
+            context = JobContext(self.store, job_id, cancel_event)
+            started = time.perf_counter()
+            try:
+                # Stage timings of the job are labelled by job kind rather than by route
+                with route_context(f"job:{kind}"):
+                    result = func(context)
+            except JobCancelled:
+                logger.info(f"Job {job_id} cancelled")
+                self.store.update(job_id, status="cancelled", finished_at=datetime.now().isoformat())
+                return
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+                self.store.update(job_id, status="failed", error=str(e), finished_at=datetime.now().isoformat())
+                return
+            status = "completed" if (result or {}).get("success", True) else "failed"
+            self.store.update(job_id, status=status, result=result, finished_at=datetime.now().isoformat())
+            logger.info(f"Job {job_id} {status} in {time.perf_counter() - started:.2f}s")
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+            if cleanup:
+                cleanup()
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation; a running job stops at its next progress report"""
+        with self._lock:
+            cancel_event = self._cancel_events.get(job_id)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        return True
+
+    def shutdown(self):
+        with self._lock:
+            for cancel_event in self._cancel_events.values():
+                cancel_event.set()
+        self._executor.shutdown(wait=True)
+        self.store.close()
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    """Process-wide job manager, created on first use"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager(JobStore(JOBS_DB_PATH), JOB_WORKERS)
+    return _manager
+
+def shutdown_jobs():
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.shutdown()
+            _manager = None
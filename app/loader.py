@@ -0,0 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bulk loader defaults (overridable per call)
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", "4"))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "3"))
+BULK_BACKOFF_SECONDS = float(os.getenv("BULK_BACKOFF_SECONDS", "0.5"))
+
+# SQLSTATE classes worth retrying: connection failures, serialization failures and
+# deadlocks, insufficient resources, and server shutdowns; plus statement timeouts
+TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57P")
+TRANSIENT_SQLSTATES = {"57014"}
+# PostgREST codes for a database it could not reach or a pool it timed out on
+TRANSIENT_POSTGREST_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+
+def is_transient_sqlstate(code: Optional[str]) -> bool:
+    """Whether a Postgres error code describes a failure that may not happen again"""
+    if not code:
+        return False
+    return code in TRANSIENT_SQLSTATES or code.startswith(TRANSIENT_SQLSTATE_CLASSES)
+
+def is_transient_error(e: Exception) -> bool:
+    """Whether a failed PostgREST request is worth retrying.
+
+    Connection errors, timeouts, 5xx/408/429 responses and transient database
+    errors are; constraint violations, bad data and other 4xx responses fail
+    the same way every time and are not.
+    """
+    try:
+        import httpx
+
+        if isinstance(e, httpx.TransportError):
+            return True
+    except ImportError:  # pragma: no cover - httpx comes with the Supabase SDK
+        pass
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    # postgrest APIError: the error code of the JSON body, or the HTTP status without one
+    code = getattr(e, "code", None)
+    if code is None:
+        return False
+    code = str(code)
+    if len(code) == 3 and code.isdigit():
+        return int(code) >= 500 or code in ("408", "429")
+    return code in TRANSIENT_POSTGREST_CODES or is_transient_sqlstate(code)
+
+def _load_batch(
+    supabase,
+    table_name: str,
+    batch_number: int,
+    records: List[Dict[str, Any]],
+    on_conflict: Optional[str],
+    max_retries: int,
+    backoff: float
+) -> Dict[str, Any]:
+    """Send one batch, retrying transient failures with exponential backoff and jitter"""
+    attempt = 0
+    started = time.perf_counter()
+    while True:
+        attempt += 1
+        try:
+            if on_conflict:
+                # Upsert on the primary key so a retried batch cannot create duplicates
+                response = supabase.table(table_name).upsert(records, on_conflict=on_conflict).execute()
+            else:
+                response = supabase.table(table_name).insert(records).execute()
+            return {
+                "batch": batch_number,
+                "rows": len(records),
+                "inserted": len(response.data) if response.data else 0,
+                "attempts": attempt,
+                "elapsed_seconds": round(time.perf_counter() - started, 3),
+                "error": None
+            }
+        except Exception as e:
+            if attempt > max_retries or not is_transient_error(e):
+                logger.warning(f"Batch {batch_number} of {table_name} failed after {attempt} attempts: {str(e)}")
+                return {
+                    "batch": batch_number,
+                    "rows": len(records),
+                    "inserted": 0,
+                    "attempts": attempt,
+                    "elapsed_seconds": round(time.perf_counter() - started, 3),
+                    "error": str(e)
+                }
+            delay = backoff * (2 ** (attempt - 1)) * (1 + random.random())
+            logger.info(f"Batch {batch_number} of {table_name} failed (attempt {attempt}), retrying in {delay:.2f}s: {str(e)}")
+            time.sleep(delay)
+
+def bulk_load(
+    supabase,
+    table_name: str,
+    records: List[Dict[str, Any]],
+    on_conflict: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    max_retries: Optional[int] = None,
+    backoff: Optional[float] = None
+) -> Dict[str, Any]:
+    """Load records into a Supabase table in batches with bounded concurrency.
+
+    Each batch is retried independently, so one failing batch no longer discards
+    the whole load; only transient failures are retried. Pass ``on_conflict``
+    (the primary key column) to upsert instead of insert. With the default
+    ``on_conflict=None`` rows are plain inserts, so retrying a batch that timed
+    out after the server committed it can insert duplicate rows.
+    """
+    batch_size = max(1, batch_size or BULK_BATCH_SIZE)
+    max_in_flight = max(1, max_in_flight or BULK_MAX_IN_FLIGHT)
+    max_retries = BULK_MAX_RETRIES if max_retries is None else max_retries
+    backoff = BULK_BACKOFF_SECONDS if backoff is None else backoff
+
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    if not batches:
+        return {"inserted_count": 0, "failed_count": 0, "batches": []}
+
+    logger.info(f"Loading {len(records)} records into {table_name} in {len(batches)} batches ({max_in_flight} in flight)")
+
+    if len(batches) == 1 or max_in_flight == 1:
+        results = [
+            _load_batch(supabase, table_name, n, batch, on_conflict, max_retries, backoff)
+            for n, batch in enumerate(batches)
+        ]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_in_flight, len(batches))) as pool:
+            futures = [
+                pool.submit(_load_batch, supabase, table_name, n, batch, on_conflict, max_retries, backoff)
+                for n, batch in enumerate(batches)
+            ]
+            results = [future.result() for future in futures]
+
+    inserted_count = sum(r["inserted"] for r in results)
+    failed_count = sum(r["rows"] for r in results if r["error"])
+    if failed_count:
+        logger.warning(f"{failed_count} of {len(records)} records failed to load into {table_name}")
+
+    return {
+        "inserted_count": inserted_count,
+        "failed_count": failed_count,
+        "batches": results
+    }
@@ -1,19 +1,89 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Callable, Dict, Generator, Iterable, List, Optional, Tuple
 import pandas as pd
+import io
 import json
 import logging
-from datetime import datetime, date
-import numpy as np
+from datetime import datetime
 from sqlalchemy import text
 import re
 import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
 
-from .database import get_supabase, create_source_connection
+from .database import (
+    get_supabase, close_supabase, create_source_connection, source_engines, source_fingerprint, settings,
+    get_warehouse_engine, close_warehouse_engine
+)
+from .loader import bulk_load
+from .serialization import frame_to_records, records_response
+from .concurrency import iterate_blocking, limiter_stats, run_blocking
+from .readers import iter_upload_chunks
+from .mapping import SCHEMA_MAPPINGS, get_mapping_plan, plan_cache_stats, validate_and_map_data
+from .catalog import catalog_cache
+from .segments import SegmentCondition, SegmentCompileError, compile_segment, execute_segment, quote_identifier
+from .preview import (
+    PreviewError, choose_key, clamp_page_size, decode_cursor, estimate_rows,
+    exact_count, next_cursor, normalize_select, preview_query, unique_key_columns
+)
+from .result_cache import result_cache, result_key
+from .sync import SyncError, resolve_column, run_sync, sync_state
+from .jobs import FINISHED_STATUSES, JobContext, get_job_manager, shutdown_jobs
+from .staging import (
+    StagingError, StagingWriter, arrow_to_records, describe_staging_file, iter_staged_tables,
+    list_staging_files, mapped_records, staging_path
+)
+from .copy_loader import copy_load
+from .membership import (
+    MembershipError, clamp_members, close_segment_store, evaluate_expression, get_segment_store, overlap_counts,
+    public_segment, refresh_members
+)
+from .analytics import (
+    PRODUCT_MIX_ORDER, RFM_ORDER, STORE_SPEND_ORDER, AnalyticsError, clamp_rows, filter_transactions,
+    product_mix, read_source_table, read_staged_table, rfm_scores, score_distribution, spend_by_store, top_rows
+)
+from .metrics import MetricsMiddleware, metrics, timed_chunks, timed_stage
+from .model_load import ModelLoadError, load_order, run_model_load
+from .partition import PARTITION_COUNT, export_snapshot, extract_partitions, partition_bounds, partition_queries
+from .quality import QualityError, QuarantineWriter, check_quality, list_quarantine_files, quarantine_path
+from .result_stream import encode_result_stream, negotiate_encoding, negotiate_format, result_schema
+
+# Warehouse load backends: PostgREST JSON batches, or COPY over a direct Postgres connection
+LOADERS = ("supabase", "copy")
 
-app = FastAPI(title="Retail Analytics Platform")
+# Response header telling whether a result came from the result cache
+CACHE_HEADER = "X-Cache"
+
+def warm_supabase():
+    """Create the shared Supabase client so the first load reuses its connection pool"""
+    try:
+        get_supabase()
+    except Exception as e:
+        logger.warning(f"Supabase client not initialised at startup: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warmed in the background: the app serves requests without waiting for the SDK
+    # import, and a load arriving first waits on the client lock instead
+    if settings.supabase_url:
+        threading.Thread(target=warm_supabase, name="supabase-warmup", daemon=True).start()
+    yield
+    # Release pooled source database and warehouse connections
+    shutdown_jobs()
+    close_segment_store()
+    result_cache.invalidate()
+    source_engines.dispose_all()
+    close_warehouse_engine()
+    close_supabase()
+
+app = FastAPI(title="Retail Analytics Platform", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -22,70 +92,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser clients read the cache status and the per-stage timings
+    expose_headers=["X-Cache", "Server-Timing"],
 )
 
+# Per-route latency histograms and Server-Timing stage breakdowns
+app.add_middleware(MetricsMiddleware, router=app.router)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
 )
 
+# Patterns masked by SensitiveFilter; connection_url=postgresql://... values match the URL pattern
+_URL_PASSWORD = re.compile(r'postgresql:\/\/([^:]+):([^@]+)@')
+_PASSWORD_PARAM = re.compile(r'password=([^&\s]+)')
+
 # Add this class to filter sensitive information from logs
 class SensitiveFilter(logging.Filter):
     def filter(self, record):
-        if isinstance(record.msg, str):
+        msg = record.msg
+        # Substring checks first: most records hold neither pattern and skip the regexes
+        if isinstance(msg, str):
             # Mask PostgreSQL connection URLs in logs
-            record.msg = re.sub(
-                r'postgresql:\/\/([^:]+):([^@]+)@', 
-                r'postgresql://\1:********@', 
-                record.msg
-            )
-            
-            # Mask connection_url query parameters
-            record.msg = re.sub(
-                r'connection_url=postgresql:\/\/([^:]+):([^@]+)@', 
-                r'connection_url=postgresql://\1:********@', 
-                record.msg
-            )
-            
+            if "postgresql://" in msg:
+                msg = _URL_PASSWORD.sub(r'postgresql://\1:********@', msg)
             # Mask password parameters
-            record.msg = re.sub(r'password=([^&\s]+)', r'password=********', record.msg)
+            if "password=" in msg:
+                msg = _PASSWORD_PARAM.sub(r'password=********', msg)
+            record.msg = msg
         return True
 
 # Configure logging with the sensitive filter
 logger = logging.getLogger(__name__)
 logger.addFilter(SensitiveFilter())
 
-# Schema mappings for each table
-SCHEMA_MAPPINGS = {
-    "customers": {
-        "required_fields": [
-            "customer_id", "first_name", "last_name", "email", 
-            "phone", "gender", "birth_date", "registration_date", 
-            "address", "city"
-        ]
-    },
-    "transactions": {
-        "required_fields": [
-            "transaction_id", "customer_id", "store_id", 
-            "transaction_date", "total_amount", "payment_method",
-            "product_line_id", "quantity", "unit_price"
-        ]
-    },
-    "stores": {
-        "required_fields": [
-            "store_id", "store_name", "address", "city",
-            "store_type", "opening_date", "region"
-        ]
-    },
-    "product_lines": {
-        "required_fields": [
-            "product_line_id", "name", "category", "subcategory",
-            "brand", "unit_cost"
-        ]
-    }
-}
-
 class ConnectionDetails(BaseModel):
     host: str
     port: str
@@ -97,86 +139,454 @@ class QueryRequest(BaseModel):
     table: str
     query: str
     connection_details: ConnectionDetails
+    # Streaming mode: read through a server-side cursor and load chunk by chunk
+    stream: bool = False
+    chunk_size: int = 10000
+    preview_rows: int = 100
+    # Bulk loader options; upsert on the table's primary key keeps retries idempotent,
+    # and is refused when the source has no primary key column to upsert on
+    batch_size: Optional[int] = None
+    max_in_flight: Optional[int] = None
+    upsert: bool = False
+    # Reuse a cached read of the same query instead of re-running it on the source
+    use_cache: bool = False
+    # Keep the mapped rows in a Parquet staging file that can be replayed later
+    stage: bool = False
+    # Warehouse load backend: "supabase" (PostgREST) or "copy" (direct Postgres COPY)
+    loader: str = "supabase"
+    # Partitioned mode: split the query into key ranges on this numeric or date column
+    # and read them in parallel over pooled connections
+    partition_column: Optional[str] = None
+    partitions: Optional[int] = None
+    partition_workers: Optional[int] = None
+    # Reject rows that break the table's data-quality rules to a quarantine file
+    # instead of failing the load; off restores all-or-nothing mapping
+    quality_checks: bool = True
 
-# Helper function to convert data to JSON-serializable format
-def convert_to_json_serializable(obj):
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    elif isinstance(obj, (np.integer, np.int64)):
-        return int(obj)
-    elif isinstance(obj, (np.floating, np.float64)):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, dict):
-        return {k: convert_to_json_serializable(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_to_json_serializable(i) for i in obj]
-    elif pd.isna(obj):
-        return None
-    return obj
-
-def validate_and_map_data(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
-    """Validate and map data to the standard schema"""
-    try:
-        required_fields = SCHEMA_MAPPINGS[table_name]["required_fields"]
-        
-        # Create a mapping of source columns to target columns
-        column_mapping = {}
-        for req_field in required_fields:
-            # Try exact match first
-            if req_field in df.columns:
-                column_mapping[req_field] = req_field
-                continue
-                
-            # Try case-insensitive match
-            for col in df.columns:
-                if col.lower() == req_field.lower():
-                    column_mapping[col] = req_field
-                    break
-        
-        # Check for missing required fields
-        mapped_fields = set(column_mapping.values())
-        missing_fields = set(required_fields) - mapped_fields
-        if missing_fields:
-            logger.warning(f"Missing fields will be filled with defaults: {missing_fields}")
-            for field in missing_fields:
-                if "date" in field.lower():
-                    df[field] = pd.Timestamp.now()
-                elif "id" in field.lower():
-                    df[field] = df.index + 1
-                elif "amount" in field.lower() or "cost" in field.lower() or "price" in field.lower():
-                    df[field] = 0.0
-                elif "quantity" in field.lower():
-                    df[field] = 1
-                else:
-                    df[field] = "Unknown"
-        
-        # Select required fields
-        result_df = pd.DataFrame()
-        for field in required_fields:
-            if field in df.columns:
-                result_df[field] = df[field]
+class ModelLoadRequest(BaseModel):
+    connection_details: ConnectionDetails
+    # Standard table -> query reading it from the source
+    queries: Dict[str, str]
+    chunk_size: int = 10000
+    batch_size: Optional[int] = None
+    max_in_flight: Optional[int] = None
+    upsert: bool = False
+    stage: bool = False
+    loader: str = "supabase"
+    quality_checks: bool = True
+    # Tables loaded at the same time; defaults to MODEL_LOAD_WORKERS
+    workers: Optional[int] = None
+
+class SegmentPreviewRequest(BaseModel):
+    table: str
+    schema_name: Optional[str] = None
+    root_operator: str = "AND"
+    # Top-level conditions and condition groups from SegmentBuilder
+    conditions: List[SegmentCondition] = []
+    connection_details: ConnectionDetails
+    # Page size; the server caps it at PREVIEW_MAX_PAGE_SIZE
+    limit: int = 100
+    cursor: Optional[str] = None
+    include_exact_count: bool = False
+    # Bypass the result cache and replace the cached page
+    refresh: bool = False
+
+class PreviewRequest(BaseModel):
+    query: str
+    connection_details: ConnectionDetails
+    # Unique column of the query's output to paginate on; OFFSET pages without one
+    key_column: Optional[str] = None
+    cursor: Optional[str] = None
+    page_size: Optional[int] = None
+    include_exact_count: bool = False
+    refresh: bool = False
+
+class SyncRequest(BaseModel):
+    connection_details: ConnectionDetails
+    # Source table to read; defaults to the standard table name
+    source_table: Optional[str] = None
+    source_schema: Optional[str] = None
+    # Overrides the table's watermark from SCHEMA_MAPPINGS (e.g. an updated_at column)
+    watermark_column: Optional[str] = None
+    chunk_size: Optional[int] = None
+    batch_size: Optional[int] = None
+    max_in_flight: Optional[int] = None
+    # Forget the stored watermark and sync the whole table again
+    full_refresh: bool = False
+    stage: bool = False
+    loader: str = "supabase"
+    quality_checks: bool = True
+    # Add members from the new rows to materialized segments over the synced table
+    refresh_segments: bool = True
+
+class ReplayRequest(BaseModel):
+    staging_id: str
+    batch_size: Optional[int] = None
+    max_in_flight: Optional[int] = None
+    upsert: bool = False
+    loader: str = "supabase"
+
+class SegmentDefinition(BaseModel):
+    name: Optional[str] = None
+    table: str
+    schema_name: Optional[str] = None
+    root_operator: str = "AND"
+    conditions: List[SegmentCondition] = []
+    connection_details: ConnectionDetails
+    # Column identifying members; defaults to customer_id, then the table's primary key
+    member_column: Optional[str] = None
+
+class SegmentRefreshRequest(BaseModel):
+    connection_details: ConnectionDetails
+    # Recompute membership from scratch instead of adding rows past the watermark
+    full: bool = False
+
+class SegmentExpression(BaseModel):
+    # A stored segment, or an AND/OR/NOT over operands
+    segment_id: Optional[str] = None
+    operator: Optional[str] = None
+    operands: Optional[List["SegmentExpression"]] = None
+
+class SegmentCombineRequest(BaseModel):
+    expression: SegmentExpression
+    # Member ids returned with the count
+    limit: int = 1000
+
+class SegmentOverlapRequest(BaseModel):
+    segment_ids: List[str]
+
+class AnalyticsRequest(BaseModel):
+    # Read the standard tables from this database; staged Parquet files are used otherwise
+    connection_details: Optional[ConnectionDetails] = None
+    # Standard table -> source table, for source tables not named after the standard schema
+    source_tables: Dict[str, str] = {}
+    source_schema: Optional[str] = None
+    # Standard table -> staging ids to read instead of every staged file of the table
+    staging_ids: Dict[str, List[str]] = {}
+    # Transactions in [start_date, end_date)
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    customer_ids: Optional[List[int]] = None
+    # Rows returned; the server caps it at ANALYTICS_MAX_ROWS
+    limit: int = 1000
+    refresh: bool = False
+
+class RFMRequest(AnalyticsRequest):
+    # Reference date for recency; defaults to the latest transaction
+    as_of: Optional[datetime] = None
+
+class StoreSpendRequest(AnalyticsRequest):
+    # "store" or "region"
+    level: str = "store"
+
+class ProductMixRequest(AnalyticsRequest):
+    # "product_line" or "category"
+    level: str = "product_line"
+
+class CacheInvalidateRequest(BaseModel):
+    # Without connection details every cached result is dropped
+    connection_details: Optional[ConnectionDetails] = None
+
+def to_warehouse_records(mapped_df: pd.DataFrame, table_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Convert a mapped DataFrame to JSON-serializable records for Supabase"""
+    # Timestamps become ISO strings and NaN/NaT become null, column by column.
+    # Mapped frames go through Arrow, typed by the table's schema, when it is installed.
+    if table_name:
+        return mapped_records(mapped_df, table_name)
+    return frame_to_records(mapped_df)
+
+def insert_records(
+    supabase,
+    table_name: str,
+    records: List[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    upsert: bool = False
+) -> Dict[str, Any]:
+    """Load records into Supabase through the batched bulk loader"""
+    logger.info(f"Inserting {len(records)} records into Supabase")
+    on_conflict = SCHEMA_MAPPINGS.get(table_name, {}).get("primary_key") if upsert else None
+    return bulk_load(
+        supabase,
+        table_name,
+        records,
+        on_conflict=on_conflict,
+        batch_size=batch_size,
+        max_in_flight=max_in_flight
+    )
+
+def load_mapped(
+    table_name: str,
+    mapped,
+    loader: str = "supabase",
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    upsert: bool = False
+) -> Dict[str, Any]:
+    """Load a mapped DataFrame (or staged Arrow table) through the selected backend"""
+    if loader not in LOADERS:
+        raise ValueError(f"Unknown loader: {loader}. Use one of: {', '.join(LOADERS)}")
+    with timed_stage("insert") as timer:
+        if loader == "copy":
+            # batch_size here is rows per COPY transaction; the default suits COPY, not PostgREST
+            load = copy_load(get_warehouse_engine(), table_name, mapped, upsert=upsert, batch_size=batch_size)
+        else:
+            if isinstance(mapped, pd.DataFrame):
+                records = to_warehouse_records(mapped, table_name)
             else:
-                result_df[field] = None
-        
-        # Convert date columns
-        date_columns = {
-            "customers": ["birth_date", "registration_date"],
-            "transactions": ["transaction_date"],
-            "stores": ["opening_date"],
-            "product_lines": []
-        }
-        
-        for date_col in date_columns.get(table_name, []):
-            if date_col in result_df.columns:
-                result_df[date_col] = pd.to_datetime(result_df[date_col])
-        
-        return result_df
-        
-    except Exception as e:
-        logger.error(f"Error in data validation and mapping: {str(e)}")
-        raise ValueError(f"Data validation failed: {str(e)}")
+                records = arrow_to_records(mapped)
+            load = insert_records(
+                get_supabase(),
+                table_name,
+                records,
+                batch_size=batch_size,
+                max_in_flight=max_in_flight,
+                upsert=upsert
+            )
+        timer.rows = load["inserted_count"]
+        # Only COPY batches report their payload size
+        timer.bytes = sum(b.get("bytes", 0) for b in load["batches"])
+    return load
+
+def check_generated_key(df: pd.DataFrame, table_name: str, upsert: bool) -> bool:
+    """Whether the mapping makes up the primary key of ``df``; refuses to upsert such keys.
+
+    Without a source key column the mapping numbers the rows, and those ids
+    would overwrite unrelated warehouse rows on conflict.
+    """
+    primary_key = SCHEMA_MAPPINGS.get(table_name, {}).get("primary_key")
+    key_generated = primary_key is not None and primary_key not in get_mapping_plan(df, table_name).sources
+    if upsert and key_generated:
+        raise ValueError(f"Cannot upsert into {table_name}: the source has no {primary_key} column")
+    return key_generated
+
+def iter_load_chunks(
+    chunks: Iterable[pd.DataFrame],
+    table_name: str,
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    upsert: bool = False,
+    preview_rows: int = 0,
+    progress: Optional[Callable[..., None]] = None,
+    stage: Optional[StagingWriter] = None,
+    loader: str = "supabase",
+    premapped: bool = False,
+    quarantine: Optional[QuarantineWriter] = None
+) -> Generator[pd.DataFrame, None, Dict[str, Any]]:
+    """Map and load DataFrame chunks one at a time, so memory is bounded by the chunk size.
+
+    Each source chunk is yielded once it is loaded, and the load summary is
+    the generator's return value; see load_chunks to simply run the load.
+
+    ``progress`` is called after each chunk with the rows read, mapped, inserted
+    and failed in that chunk; background jobs use it to report and cancel.
+    Mapped chunks are also appended to ``stage`` so the load can be replayed.
+    With ``premapped`` the chunks are (raw, mapped) pairs already mapped by the
+    reader, as partitioned extracts produce them.
+    With ``quarantine`` rows breaking the table's quality rules are written
+    there with their reasons and the rest of the chunk still loads.
+    """
+    preview = []
+    columns = []
+    row_count = 0
+    inserted_count = 0
+    failed_count = 0
+    rejected_count = 0
+    failed_batches = []
+    started = time.perf_counter()
+
+    for item in (chunks if premapped else timed_chunks(chunks)):
+        df, mapped_df = item if premapped else (item, None)
+        if df.empty:
+            continue
+        if not premapped:
+            # Keep the index global so generated default ids stay unique across chunks
+            df.index = range(row_count, row_count + len(df))
+        row_count += len(df)
+        if not columns:
+            columns = list(df.columns)
+
+        if len(preview) < preview_rows:
+            preview.extend(to_warehouse_records(df.head(preview_rows - len(preview))))
+
+        key_generated = check_generated_key(df, table_name, upsert)
+
+        if mapped_df is None:
+            with timed_stage("map", rows=len(df)):
+                mapped_df = validate_and_map_data(df, table_name, errors="coerce" if quarantine else "raise")
+        if quarantine:
+            mapped_df = validate_chunk(df, mapped_df, table_name, quarantine)
+            rejected_count += len(df) - len(mapped_df)
+        if stage:
+            stage.write(mapped_df, key_generated=key_generated)
+        load = load_mapped(
+            table_name,
+            mapped_df,
+            loader=loader,
+            batch_size=batch_size,
+            max_in_flight=max_in_flight,
+            upsert=upsert
+        )
+        inserted_count += load["inserted_count"]
+        failed_count += load["failed_count"]
+        failed_batches.extend(b for b in load["batches"] if b["error"])
+        if progress:
+            progress(
+                rows_read=len(df),
+                rows_mapped=len(mapped_df),
+                rows_inserted=load["inserted_count"],
+                rows_failed=load["failed_count"]
+            )
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Loaded {row_count} rows into {table_name} ({row_count / elapsed:.0f} rows/sec), inserted {inserted_count}")
+        yield df
+
+    elapsed = time.perf_counter() - started
+    return {
+        "preview": preview,
+        "columns": columns,
+        "row_count": row_count,
+        "inserted_count": inserted_count,
+        "failed_count": failed_count,
+        "failed_batches": failed_batches,
+        "rejected_count": rejected_count,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(row_count / elapsed, 1) if elapsed > 0 else None
+    }
+
+def load_chunks(chunks: Iterable[pd.DataFrame], table_name: str, **options) -> Dict[str, Any]:
+    """Run iter_load_chunks to the end and return its load summary"""
+    loading = iter_load_chunks(chunks, table_name, **options)
+    while True:
+        try:
+            next(loading)
+        except StopIteration as done:
+            return done.value
+
+def validate_chunk(df: pd.DataFrame, mapped_df: pd.DataFrame, table_name: str, quarantine: QuarantineWriter) -> pd.DataFrame:
+    """Drop rows breaking the quality rules from a mapped chunk, quarantining their source values"""
+    with timed_stage("validate", rows=len(df)):
+        mapped_df, rejects = check_quality(df, mapped_df, table_name)
+    if rejects is not None:
+        quarantine.write(rejects)
+    return mapped_df
+
+def stream_query(source_db, request: QueryRequest, progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    """Run the query through a server-side cursor, mapping and loading one chunk at a time"""
+    chunk_size = max(1, request.chunk_size)
+    with timed_stage("query"):
+        result = source_db.execute(
+            text(request.query),
+            execution_options={"stream_results": True, "yield_per": chunk_size}
+        )
+    columns = list(result.keys())
+    chunks = (pd.DataFrame(rows, columns=columns) for rows in result.partitions(chunk_size))
+
+    stage = StagingWriter(request.table, source=request.query) if request.stage else None
+    quarantine = QuarantineWriter(request.table, source=request.query) if request.quality_checks else None
+    try:
+        load = load_chunks(
+            chunks,
+            request.table,
+            batch_size=request.batch_size,
+            max_in_flight=request.max_in_flight,
+            upsert=request.upsert,
+            preview_rows=request.preview_rows,
+            progress=progress,
+            stage=stage,
+            loader=request.loader,
+            quarantine=quarantine
+        )
+    finally:
+        # Rows staged before a failure stay replayable
+        staging = stage.close() if stage else None
+        rejected = quarantine.close() if quarantine else None
+    return {
+        "success": True,
+        "data": load["preview"],
+        "row_count": load["row_count"],
+        "columns": columns,
+        "inserted_count": load["inserted_count"],
+        "failed_count": load["failed_count"],
+        "failed_batches": load["failed_batches"],
+        "rejected_count": load["rejected_count"],
+        "elapsed_seconds": load["elapsed_seconds"],
+        "rows_per_second": load["rows_per_second"],
+        "staging": staging,
+        "quarantine": rejected
+    }
+
+def partitioned_query(source_db, request: QueryRequest, progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    """Split the query into key ranges read and mapped in parallel, loading chunks as they arrive"""
+    details = request.connection_details
+    # source_db holds the exported snapshot open until the load is done
+    snapshot = export_snapshot(source_db)
+    cuts = partition_bounds(source_db, request.query, request.partition_column, request.partitions or PARTITION_COUNT)
+    queries = partition_queries(request.query, request.partition_column, cuts)
+    logger.info(f"Extracting {request.table} in {len(queries)} partitions on {request.partition_column}")
+    chunks = extract_partitions(
+        lambda: create_source_connection(
+            host=details.host,
+            port=details.port,
+            database=details.database,
+            username=details.username,
+            password=details.password
+        ),
+        queries,
+        request.table,
+        max(1, request.chunk_size),
+        workers=request.partition_workers,
+        errors="coerce" if request.quality_checks else "raise",
+        snapshot=snapshot
+    )
+
+    stage = StagingWriter(request.table, source=request.query) if request.stage else None
+    quarantine = QuarantineWriter(request.table, source=request.query) if request.quality_checks else None
+    try:
+        load = load_chunks(
+            chunks,
+            request.table,
+            batch_size=request.batch_size,
+            max_in_flight=request.max_in_flight,
+            upsert=request.upsert,
+            preview_rows=request.preview_rows,
+            progress=progress,
+            stage=stage,
+            loader=request.loader,
+            premapped=True,
+            quarantine=quarantine
+        )
+    finally:
+        # Stops the partition readers if the load failed part way
+        chunks.close()
+        staging = stage.close() if stage else None
+        rejected = quarantine.close() if quarantine else None
+    return {
+        "success": True,
+        "data": load["preview"],
+        "row_count": load["row_count"],
+        "columns": load["columns"],
+        "partitions": len(queries),
+        "inserted_count": load["inserted_count"],
+        "failed_count": load["failed_count"],
+        "failed_batches": load["failed_batches"],
+        "rejected_count": load["rejected_count"],
+        "elapsed_seconds": load["elapsed_seconds"],
+        "rows_per_second": load["rows_per_second"],
+        "staging": staging,
+        "quarantine": rejected
+    }
+
+def cached_records(key: str, source_key: str, refresh: bool, build) -> Response:
+    """Serve a records response from the result cache, or build it with build() and cache it"""
+    cached = None if refresh else result_cache.get(key)
+    if cached is not None:
+        df, payload = cached
+        return records_response(payload, df, headers={CACHE_HEADER: "HIT"})
+    payload, df = build()
+    result_cache.put(key, source_key, df, payload)
+    return records_response(payload, df, headers={CACHE_HEADER: "MISS"})
 
 @app.get("/api/tables")
 async def get_tables():
@@ -205,29 +615,173 @@ async def get_tables():
     }
 
 @app.post("/api/query")
-async def execute_query(request: QueryRequest):
+async def execute_query(request: QueryRequest, http_request: Request):
+    # Clients that rank NDJSON or Arrow IPC above JSON get the rows streamed as they load
+    result_format = negotiate_format(http_request.headers.get("accept"))
+    if result_format is None:
+        return await run_blocking("query", run_query, request)
+    frames, schema = await run_blocking("query", open_result_stream, request)
+    body, headers = encode_result_stream(
+        frames, result_format, negotiate_encoding(http_request.headers.get("accept-encoding")), schema=schema
+    )
+    return StreamingResponse(iterate_blocking("query", body), headers=headers)
+
+def open_result_stream(request: QueryRequest) -> Tuple[Generator[pd.DataFrame, None, Dict[str, Any]], Any]:
+    """Start a query whose rows are streamed back to the client while they load.
+
+    Connecting and starting the query happen here, so their errors are still a
+    400. Returns a generator and the Arrow schema of the query's columns. The
+    generator reads, maps and loads one chunk at a time, yields each loaded
+    chunk's source rows and returns the load summary; a failure after the first
+    chunk ends the stream with the error in the summary.
+    """
+    logger.info(f"Streaming query results for table: {request.table}")
+    source_db = None
+    try:
+        with timed_stage("connect"):
+            source_db = create_source_connection(
+                host=request.connection_details.host,
+                port=request.connection_details.port,
+                database=request.connection_details.database,
+                username=request.connection_details.username,
+                password=request.connection_details.password
+            )
+            source_db.connection()
+        chunk_size = max(1, request.chunk_size)
+        if request.partition_column:
+            details = request.connection_details
+            snapshot = export_snapshot(source_db)
+            cuts = partition_bounds(source_db, request.query, request.partition_column, request.partitions or PARTITION_COUNT)
+            description = source_db.execute(
+                text(f"SELECT * FROM ({normalize_select(request.query)}) AS source LIMIT 0")
+            ).cursor.description
+            chunks = extract_partitions(
+                lambda: create_source_connection(
+                    host=details.host,
+                    port=details.port,
+                    database=details.database,
+                    username=details.username,
+                    password=details.password
+                ),
+                partition_queries(request.query, request.partition_column, cuts),
+                request.table,
+                chunk_size,
+                workers=request.partition_workers,
+                errors="coerce" if request.quality_checks else "raise",
+                snapshot=snapshot
+            )
+            columns = []
+        else:
+            with timed_stage("query"):
+                result = source_db.execute(
+                    text(request.query),
+                    execution_options={"stream_results": True, "yield_per": chunk_size}
+                )
+            columns = list(result.keys())
+            description = result.cursor.description
+            chunks = (pd.DataFrame(rows, columns=columns) for rows in result.partitions(chunk_size))
+        schema = result_schema(description)
+    except Exception as e:
+        if source_db:
+            source_db.close()
+        logger.error(f"Error in query execution: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error executing query: {str(e)}"
+        )
+
+    def frames():
+        stage = StagingWriter(request.table, source=request.query) if request.stage else None
+        quarantine = QuarantineWriter(request.table, source=request.query) if request.quality_checks else None
+        summary = {"success": True}
+        try:
+            load = yield from iter_load_chunks(
+                chunks,
+                request.table,
+                batch_size=request.batch_size,
+                max_in_flight=request.max_in_flight,
+                upsert=request.upsert,
+                stage=stage,
+                loader=request.loader,
+                premapped=bool(request.partition_column),
+                quarantine=quarantine
+            )
+            summary.update({key: value for key, value in load.items() if key != "preview"})
+            summary["columns"] = load["columns"] or columns
+            logger.info(f"Successfully streamed {load['row_count']} rows and inserted {load['inserted_count']} rows")
+        except Exception as e:
+            logger.error(f"Error in streamed query execution: {str(e)}", exc_info=True)
+            summary.update(success=False, error=f"Error executing query: {str(e)}")
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            source_db.close()
+            summary["staging"] = stage.close() if stage else None
+            summary["quarantine"] = quarantine.close() if quarantine else None
+        return summary
+
+    return frames(), schema
+
+def run_query(request: QueryRequest, progress: Optional[Callable[..., None]] = None):
+    """Blocking body of /api/query, executed on the query worker pool"""
     logger.info(f"Executing query for table: {request.table}")
     source_db = None
     
     try:
         # Step 1: Create connection to source database
-        source_db = create_source_connection(
-            host=request.connection_details.host,
-            port=request.connection_details.port,
-            database=request.connection_details.database,
-            username=request.connection_details.username,
-            password=request.connection_details.password
-        )
-        
-        # Step 2: Execute query on source database
-        logger.info(f"Executing query on source database: {request.query}")
-        result = source_db.execute(text(request.query))
-        columns = result.keys()
-        rows = result.fetchall()
+        with timed_stage("connect"):
+            source_db = create_source_connection(
+                host=request.connection_details.host,
+                port=request.connection_details.port,
+                database=request.connection_details.database,
+                username=request.connection_details.username,
+                password=request.connection_details.password
+            )
+            # Check out (and pre-ping) the pooled connection here so its cost is not billed to the query
+            source_db.connection()
         
-        # Convert to DataFrame for processing
-        df = pd.DataFrame(rows, columns=columns)
-        logger.info(f"Query returned {len(df)} rows from source database")
+        if request.partition_column:
+            if progress:
+                progress(total_rows=estimate_rows(source_db, request.query))
+            result = partitioned_query(source_db, request, progress)
+            logger.info(f"Successfully extracted {result['row_count']} rows and inserted {result['inserted_count']} rows")
+            return result
+
+        if request.stream:
+            logger.info(f"Streaming query on source database in chunks of {request.chunk_size}: {request.query}")
+            if progress:
+                progress(total_rows=estimate_rows(source_db, request.query))
+            result = stream_query(source_db, request, progress)
+            logger.info(f"Successfully streamed {result['row_count']} rows and inserted {result['inserted_count']} rows")
+            return result
+
+        # Step 2: Execute query on source database (or reuse a cached read)
+        cache_status = None
+        cached = None
+        if request.use_cache:
+            details = request.connection_details
+            source_key = source_fingerprint(details.host, details.port, details.database, details.username, details.password)
+            cache_key = result_key(source_key, request.query)
+            cached = result_cache.get(cache_key)
+            cache_status = "HIT" if cached is not None else "MISS"
+
+        if cached is not None:
+            df = cached[0]
+            logger.info(f"Reusing {len(df)} cached rows for query: {request.query}")
+        else:
+            logger.info(f"Executing query on source database: {request.query}")
+            with timed_stage("query"):
+                result = source_db.execute(text(request.query))
+                columns = result.keys()
+            with timed_stage("fetch") as timer:
+                rows = result.fetchall()
+
+                # Convert to DataFrame for processing
+                df = pd.DataFrame(rows, columns=columns)
+                timer.rows = len(df)
+            logger.info(f"Query returned {len(df)} rows from source database")
+            if request.use_cache:
+                result_cache.put(cache_key, source_key, df, {"columns": list(df.columns)})
         
         if df.empty:
             return {
@@ -237,48 +791,50 @@ async def execute_query(request: QueryRequest):
                 "columns": []
             }
 
-        # Step 3: Map data to standard schema
-        mapped_df = validate_and_map_data(df, request.table)
+        # Step 3: Map data to standard schema, quarantining rows that break the quality rules
+        key_generated = check_generated_key(df, request.table, request.upsert)
+        with timed_stage("map", rows=len(df)):
+            mapped_df = validate_and_map_data(df, request.table, errors="coerce" if request.quality_checks else "raise")
         logger.info("Data mapped to standard schema")
+        rejected = None
+        if request.quality_checks:
+            quarantine = QuarantineWriter(request.table, source=request.query)
+            mapped_df = validate_chunk(df, mapped_df, request.table, quarantine)
+            rejected = quarantine.close()
 
-        # Step 4: Convert DataFrame to records with proper date handling
-        # Convert timestamps to ISO format strings
-        for col in mapped_df.select_dtypes(include=['datetime64']).columns:
-            mapped_df[col] = mapped_df[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
-        
-        # Convert to JSON-serializable records
-        records = convert_to_json_serializable(mapped_df.to_dict('records'))
-        
-        # Step 5: Insert into Supabase
-        supabase = get_supabase()
-        logger.info(f"Inserting {len(records)} records into Supabase")
-        
-        try:
-            # Try to insert data
-            insert_response = supabase.table(request.table).insert(records).execute()
-            inserted_count = len(insert_response.data) if insert_response.data else 0
-        except Exception as e:
-            logger.warning(f"Insert failed: {str(e)}")
-            inserted_count = 0
+        staging = None
+        if request.stage:
+            stage = StagingWriter(request.table, source=request.query)
+            stage.write(mapped_df, key_generated=key_generated)
+            staging = stage.close()
+
+        # Step 4-5: Convert to warehouse records and insert (or COPY) them
+        load = load_mapped(
+            request.table,
+            mapped_df,
+            loader=request.loader,
+            batch_size=request.batch_size,
+            max_in_flight=request.max_in_flight,
+            upsert=request.upsert
+        )
+        inserted_count = load["inserted_count"]
         
         # Step 6: Prepare response data
-        # Also handle timestamps in the original data
-        for col in df.select_dtypes(include=['datetime64']).columns:
-            df[col] = df[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
-        
-        # Convert to JSON-serializable format
-        data = convert_to_json_serializable(df.to_dict('records'))
-        
+        # The raw rows are encoded column-wise straight to JSON bytes
         result = {
             "success": True,
-            "data": data,
             "row_count": len(df),
             "columns": list(df.columns),
-            "inserted_count": inserted_count
+            "inserted_count": inserted_count,
+            "failed_count": load["failed_count"],
+            "batches": load["batches"],
+            "rejected_count": len(df) - len(mapped_df),
+            "staging": staging,
+            "quarantine": rejected
         }
         
         logger.info(f"Successfully processed {result['row_count']} rows and inserted {inserted_count} rows")
-        return result
+        return records_response(result, df, headers={CACHE_HEADER: cache_status} if cache_status else None)
 
     except Exception as e:
         logger.error(f"Error in query execution: {str(e)}", exc_info=True)
@@ -293,53 +849,86 @@ async def execute_query(request: QueryRequest):
 @app.post("/api/upload/{table_name}")
 async def upload_file(
     table_name: str,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    upsert: bool = False,
+    chunk_size: Optional[int] = None,
+    stage: bool = False,
+    loader: str = "supabase",
+    quality_checks: bool = True
 ):
     logger.info(f"Received file upload request for table: {table_name}")
-    
+    # Starlette has already spooled the upload to a temporary file; parse it from there
+    return await run_blocking(
+        "upload",
+        process_upload,
+        table_name,
+        file.filename,
+        file.file,
+        batch_size=batch_size,
+        max_in_flight=max_in_flight,
+        upsert=upsert,
+        chunk_size=chunk_size,
+        stage=stage,
+        loader=loader,
+        quality_checks=quality_checks
+    )
+
+def process_upload(
+    table_name: str,
+    filename: str,
+    fileobj: BinaryIO,
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    upsert: bool = False,
+    chunk_size: Optional[int] = None,
+    progress: Optional[Callable[..., None]] = None,
+    stage: bool = False,
+    loader: str = "supabase",
+    quality_checks: bool = True
+):
+    """Blocking body of /api/upload, executed on the upload worker pool"""
     try:
-        content = await file.read()
-        
-        # Read file into DataFrame
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(content)
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(content)
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file format. Please upload CSV or Excel files."
-            )
-        
-        logger.info(f"File read successfully. Found {len(df)} rows")
-        
-        # Map data to standard schema
-        mapped_df = validate_and_map_data(df, table_name)
-        
-        # Convert timestamps to ISO format strings
-        for col in mapped_df.select_dtypes(include=['datetime64']).columns:
-            mapped_df[col] = mapped_df[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
-        
-        # Convert to JSON-serializable records
-        records = convert_to_json_serializable(mapped_df.to_dict('records'))
-        
-        # Insert into Supabase
-        supabase = get_supabase()
-        logger.info(f"Inserting {len(records)} records into Supabase")
-        
+        if table_name not in SCHEMA_MAPPINGS:
+            raise ValueError(f"Unknown table: {table_name}")
+
+        # Read the file in chunks and map/load each one in turn
         try:
-            # Try to insert data
-            insert_response = supabase.table(table_name).insert(records).execute()
-            inserted_count = len(insert_response.data) if insert_response.data else 0
-        except Exception as e:
-            logger.warning(f"Insert failed: {str(e)}")
-            inserted_count = 0
+            chunks = iter_upload_chunks(filename, fileobj, SCHEMA_MAPPINGS[table_name]["field_types"], chunk_size)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        writer = StagingWriter(table_name, source=filename) if stage else None
+        quarantine = QuarantineWriter(table_name, source=filename) if quality_checks else None
+        try:
+            load = load_chunks(
+                chunks,
+                table_name,
+                batch_size=batch_size,
+                max_in_flight=max_in_flight,
+                upsert=upsert,
+                progress=progress,
+                stage=writer,
+                loader=loader,
+                quarantine=quarantine
+            )
+        finally:
+            staging = writer.close() if writer else None
+            rejected = quarantine.close() if quarantine else None
+        logger.info(f"File processed in {load['elapsed_seconds']}s. Found {load['row_count']} rows")
         
         return {
             "success": True,
-            "message": f"Successfully processed {len(records)} rows and inserted {inserted_count} rows",
-            "rows_processed": len(records),
-            "rows_inserted": inserted_count
+            "message": f"Successfully processed {load['row_count']} rows and inserted {load['inserted_count']} rows",
+            "rows_processed": load["row_count"],
+            "rows_inserted": load["inserted_count"],
+            "rows_failed": load["failed_count"],
+            "rows_rejected": load["rejected_count"],
+            "failed_batches": load["failed_batches"],
+            "rows_per_second": load["rows_per_second"],
+            "staging": staging,
+            "quarantine": rejected
         }
         
     except Exception as e:
@@ -349,8 +938,98 @@ async def upload_file(
             detail=f"Error processing file: {str(e)}"
         )
 
+def loaded(result: Dict[str, Any]) -> Dict[str, Any]:
+    """A table load result that only counts as loaded when every row reached the warehouse"""
+    failed = result.get("failed_count", result.get("rows_failed", 0))
+    return {**result, "success": result.get("success", True) and not failed}
+
+@app.post("/api/load-model")
+async def load_model(request: ModelLoadRequest):
+    """Load several tables from one source, referenced tables first and independent tables concurrently"""
+    return await run_blocking("query", run_model_query_load, request)
+
+def run_model_query_load(request: ModelLoadRequest):
+    """Blocking body of /api/load-model"""
+    try:
+        load_order(list(request.queries))
+    except ModelLoadError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid model load: {str(e)}")
+
+    def query_load(table: str, query: str):
+        # Each table streams through its own pooled source session
+        table_request = QueryRequest(
+            table=table,
+            query=query,
+            connection_details=request.connection_details,
+            stream=True,
+            chunk_size=request.chunk_size,
+            preview_rows=0,
+            batch_size=request.batch_size,
+            max_in_flight=request.max_in_flight,
+            upsert=request.upsert,
+            stage=request.stage,
+            loader=request.loader,
+            quality_checks=request.quality_checks
+        )
+        return lambda: loaded(run_query(table_request))
+
+    return run_model_load(
+        {table: query_load(table, query) for table, query in request.queries.items()},
+        workers=request.workers
+    )
+
+@app.post("/api/load-model/upload")
+async def load_model_upload(
+    files: List[UploadFile] = File(...),
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    upsert: bool = False,
+    chunk_size: Optional[int] = None,
+    stage: bool = False,
+    loader: str = "supabase",
+    quality_checks: bool = True,
+    workers: Optional[int] = None
+):
+    """Load one file per table, named after the table (e.g. stores.csv), in reference order"""
+    tables = {}
+    for file in files:
+        table_name = os.path.splitext(os.path.basename(file.filename or ""))[0]
+        if table_name in tables:
+            raise HTTPException(status_code=400, detail=f"More than one file for table: {table_name}")
+        tables[table_name] = file
+    try:
+        load_order(list(tables))
+    except ModelLoadError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid model load: {str(e)}")
+
+    def file_load(table: str, file: UploadFile):
+        return lambda: loaded(process_upload(
+            table,
+            file.filename,
+            file.file,
+            batch_size=batch_size,
+            max_in_flight=max_in_flight,
+            upsert=upsert,
+            chunk_size=chunk_size,
+            stage=stage,
+            loader=loader,
+            quality_checks=quality_checks
+        ))
+
+    return await run_blocking(
+        "upload",
+        run_model_load,
+        {table: file_load(table, file) for table, file in tables.items()},
+        workers=workers
+    )
+
 @app.post("/api/test-connection")
 async def test_connection(request: ConnectionDetails):
+    return await run_blocking("connection", check_connection, request)
+
+def check_connection(request: ConnectionDetails):
+    """Blocking body of /api/test-connection"""
+    db = None
     try:
         # Try to create a connection
         db = create_source_connection(
@@ -363,7 +1042,6 @@ async def test_connection(request: ConnectionDetails):
         
         # Test the connection with a simple query
         db.execute(text("SELECT 1"))
-        db.close()
         
         return {
             "success": True,
@@ -375,6 +1053,9 @@ async def test_connection(request: ConnectionDetails):
             status_code=400,
             detail=f"Connection failed: {str(e)}"
         )
+    finally:
+        if db:
+            db.close()
 
 @app.get("/api/datasources/postgres/tables")
 async def get_postgres_tables(
@@ -383,9 +1064,38 @@ async def get_postgres_tables(
     port: Optional[str] = None,
     database: Optional[str] = None,
     username: Optional[str] = None,
-    password: Optional[str] = None
+    password: Optional[str] = None,
+    table: Optional[str] = None,
+    schema: Optional[str] = None,
+    refresh: bool = False
 ):
     """Get available tables from the connected Postgres data source"""
+    return await run_blocking(
+        "metadata",
+        fetch_postgres_tables,
+        connection_url=connection_url,
+        host=host,
+        port=port,
+        database=database,
+        username=username,
+        password=password,
+        table=table,
+        schema=schema,
+        refresh=refresh
+    )
+
+def fetch_postgres_tables(
+    connection_url: Optional[str] = None,
+    host: Optional[str] = None,
+    port: Optional[str] = None,
+    database: Optional[str] = None,
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+    table: Optional[str] = None,
+    schema: Optional[str] = None,
+    refresh: bool = False
+):
+    """Blocking body of /api/datasources/postgres/tables"""
     source_db = None
     try:
         logger.info("Starting get_postgres_tables endpoint")
@@ -434,7 +1144,7 @@ async def get_postgres_tables(
                 logger.info(f"Parsing connection URL (masked): postgresql://****:****@{masked_url.split('@')[1] if '@' in masked_url else 'invalid-url'}")
                 
                 # Handle both standard and pooler connection URLs
-                url = masked_url.replace("postgresql://", "")
+                url = connection_url.replace("postgresql://", "")
                 
                 # Split into credentials and host_info
                 if "@" in url:
@@ -500,52 +1210,13 @@ async def get_postgres_tables(
                 detail="No connection details provided. Please provide either a PostgreSQL connection URL or individual connection parameters."
             )
         
-        # Query to get all tables and columns
+        # Serve tables and columns from the per-source catalog cache
         try:
-            logger.info("Executing query to fetch tables and columns")
-            query = text("""
-                SELECT 
-                    t.table_schema as schema_name,
-                    t.table_name,
-                    c.column_name,
-                    pg_catalog.obj_description(pgc.oid, 'pg_class') as description
-                FROM 
-                    information_schema.tables t
-                JOIN 
-                    information_schema.columns c ON t.table_name = c.table_name AND t.table_schema = c.table_schema
-                JOIN 
-                    pg_catalog.pg_class pgc ON pgc.relname = t.table_name
-                WHERE 
-                    t.table_schema NOT IN ('pg_catalog', 'information_schema')
-                ORDER BY 
-                    t.table_schema, t.table_name, c.ordinal_position
-            """)
-            
-            result = source_db.execute(query)
-            columns = result.keys()
-            rows = result.fetchall()
-            logger.info(f"Query returned {len(rows)} rows")
-            
-            # Process results into a structured format
-            tables = {}
-            for row in rows:
-                schema_name, table_name, column_name, description = row
-                
-                table_key = f"{schema_name}.{table_name}"
-                
-                if table_key not in tables:
-                    tables[table_key] = {
-                        "schema_name": schema_name,
-                        "table_name": table_name,
-                        "description": description or f"{table_name} table",
-                        "columns": []
-                    }
-                
-                tables[table_key]["columns"].append(column_name)
-            
+            source_key = source_fingerprint(host, port, database, username, password)
+            tables = catalog_cache.get_tables(source_db, source_key, table=table, schema=schema, refresh=refresh)
             logger.info(f"Successfully processed {len(tables)} tables")
             # Simply return the results - don't try to insert into Supabase
-            return list(tables.values())
+            return tables
             
         except Exception as e:
             logger.error(f"Error executing table query: {str(e)}")
@@ -562,4 +1233,802 @@ async def get_postgres_tables(
     finally:
         if source_db:
             logger.info("Closing database connection")
-            source_db.close() 
\ No newline at end of file
+            source_db.close() 
+
+@app.post("/api/segments/preview")
+async def preview_segment(request: SegmentPreviewRequest):
+    """Compile a segment condition tree to parameterized SQL and return matching rows (read-only)"""
+    return await run_blocking("query", run_segment_preview, request)
+
+def run_segment_preview(request: SegmentPreviewRequest):
+    """Blocking body of /api/segments/preview"""
+    details = request.connection_details
+    source_db = None
+    try:
+        source_db = create_source_connection(
+            host=details.host,
+            port=details.port,
+            database=details.database,
+            username=details.username,
+            password=details.password
+        )
+        source_key = source_fingerprint(details.host, details.port, details.database, details.username, details.password)
+
+        # The catalog validates the table and column names used in the tree
+        tables = catalog_cache.get_tables(source_db, source_key, table=request.table, schema=request.schema_name)
+        if not tables:
+            raise HTTPException(status_code=404, detail=f"Table not found: {request.table}")
+        table_info = next((t for t in tables if t["schema_name"] == "public"), tables[0])
+
+        # Keyset pagination on the table's primary key (or another unique key) when it has one
+        page_size = clamp_page_size(request.limit)
+        position = decode_cursor(request.cursor)
+        key = choose_key(
+            table_info["columns"],
+            unique_key_columns(source_db, table_info["table_name"], table_info["schema_name"])
+        )
+        after = position.get("v") if key and position.get("k") == key else None
+        offset = int(position.get("o") or 0) if key is None else 0
+
+        compiled, params = compile_segment(
+            table_info["table_name"],
+            table_info["schema_name"],
+            request.root_operator,
+            request.conditions,
+            columns=table_info["columns"],
+            limit=page_size + 1,
+            order_key=key,
+            after=after,
+            offset=offset
+        )
+
+        def build():
+            logger.info(f"Executing segment preview: {compiled.sql}")
+            result = execute_segment(source_db, compiled, params)
+            columns = list(result.keys())
+            rows = result.fetchall()
+            df = pd.DataFrame(rows[:page_size], columns=columns)
+
+            base_params = {f"p{i}": params[f"p{i}"] for i in range(compiled.base_param_count)}
+            return {
+                "success": True,
+                "row_count": len(df),
+                "columns": columns,
+                "next_cursor": next_cursor(rows, columns, key, position, page_size),
+                "approximate_total": estimate_rows(source_db, compiled.base_sql, base_params),
+                "exact_total": exact_count(source_db, compiled.base_sql, base_params) if request.include_exact_count else None,
+                "sql": compiled.sql,
+                "params": params
+            }, df
+
+        cache_key = result_key(source_key, compiled.sql, {**params, "exact_total": request.include_exact_count})
+        return cached_records(cache_key, source_key, request.refresh, build)
+
+    except HTTPException:
+        raise
+    except (SegmentCompileError, PreviewError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid segment: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error in segment preview: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error previewing segment: {str(e)}"
+        )
+    finally:
+        if source_db:
+            source_db.close()
+
+@app.post("/api/preview")
+async def preview(request: PreviewRequest):
+    """Return one page of a source query without loading anything into the warehouse"""
+    return await run_blocking("query", run_preview, request)
+
+def run_preview(request: PreviewRequest):
+    """Blocking body of /api/preview"""
+    details = request.connection_details
+    source_db = None
+    try:
+        source_db = create_source_connection(
+            host=details.host,
+            port=details.port,
+            database=details.database,
+            username=details.username,
+            password=details.password
+        )
+        source_key = source_fingerprint(details.host, details.port, details.database, details.username, details.password)
+
+        def build():
+            logger.info(f"Previewing query on source database: {request.query}")
+            page = preview_query(
+                source_db,
+                request.query,
+                key_column=request.key_column,
+                cursor=request.cursor,
+                page_size=request.page_size,
+                include_exact_count=request.include_exact_count
+            )
+            df = pd.DataFrame(page["rows"], columns=page["columns"])
+            return {
+                "success": True,
+                "row_count": len(df),
+                "columns": page["columns"],
+                "key_column": page["key_column"],
+                "next_cursor": page["next_cursor"],
+                "approximate_total": page["approximate_total"],
+                "exact_total": page["exact_total"]
+            }, df
+
+        cache_key = result_key(source_key, request.query, {
+            "key_column": request.key_column,
+            "cursor": request.cursor,
+            "page_size": request.page_size,
+            "include_exact_count": request.include_exact_count
+        })
+        return cached_records(cache_key, source_key, request.refresh, build)
+
+    except PreviewError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid preview: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error in query preview: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error previewing query: {str(e)}"
+        )
+    finally:
+        if source_db:
+            source_db.close()
+
+def segment_table(source_db, source_key: str, table: str, schema: Optional[str]) -> Dict[str, Any]:
+    tables = catalog_cache.get_tables(source_db, source_key, table=table, schema=schema)
+    if not tables:
+        raise HTTPException(status_code=404, detail=f"Table not found: {table}")
+    return next((t for t in tables if t["schema_name"] == "public"), tables[0])
+
+def refresh_segment(source_db, source_key: str, segment: Dict[str, Any], table_info: Dict[str, Any], full: bool = False) -> Dict[str, Any]:
+    """Compile a stored segment against its table and materialize its members"""
+    compiled, params = compile_segment(
+        table_info["table_name"],
+        table_info["schema_name"],
+        segment["root_operator"],
+        [SegmentCondition(**c) for c in segment["conditions"]],
+        columns=table_info["columns"]
+    )
+    table_sql = f"{quote_identifier(table_info['schema_name'])}.{quote_identifier(table_info['table_name'])}"
+    base_params = {f"p{i}": params[f"p{i}"] for i in range(compiled.base_param_count)}
+    return refresh_members(
+        source_db,
+        get_segment_store(),
+        segment,
+        table_sql,
+        compiled.base_sql,
+        base_params,
+        source_key,
+        full=full
+    )
+
+def refresh_table_segments(source_db, source_key: str, table_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Incrementally refresh the materialized segments over a table that just received rows"""
+    refreshed = []
+    for segment in get_segment_store().list():
+        if (segment["source_key"], segment["schema_name"], segment["table_name"]) != (
+            source_key, table_info["schema_name"], table_info["table_name"]
+        ):
+            continue
+        try:
+            refreshed.append({"id": segment["id"], **refresh_segment(source_db, source_key, segment, table_info)})
+        except Exception as e:
+            logger.warning(f"Could not refresh segment {segment['id']}: {str(e)}")
+            refreshed.append({"id": segment["id"], "error": str(e)})
+    return refreshed
+
+@app.get("/api/segments")
+async def list_segments():
+    """Stored segments with their member counts and last refresh"""
+    segments = await run_blocking("metadata", get_segment_store().list)
+    return {"success": True, "segments": [public_segment(segment) for segment in segments]}
+
+@app.post("/api/segments/combine")
+async def combine_segments(request: SegmentCombineRequest):
+    """Count (and list) the members of an AND/OR/NOT expression over stored segments"""
+    try:
+        started = time.perf_counter()
+        members = await run_blocking("metadata", evaluate_expression, get_segment_store(), request.expression.model_dump())
+        return {
+            "success": True,
+            "count": len(members),
+            "members": members.ids(clamp_members(request.limit)),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+    except MembershipError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid segment expression: {str(e)}")
+
+@app.post("/api/segments/overlap")
+async def segment_overlap(request: SegmentOverlapRequest):
+    """Member count of each segment and of every pairwise intersection"""
+    try:
+        started = time.perf_counter()
+        result = await run_blocking("metadata", overlap_counts, get_segment_store(), request.segment_ids)
+        return {"success": True, **result, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
+    except MembershipError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid overlap request: {str(e)}")
+
+@app.get("/api/segments/{segment_id}")
+async def get_segment(segment_id: str, limit: int = 100):
+    """A stored segment and its first member ids"""
+    store = get_segment_store()
+    segment = await run_blocking("metadata", store.get, segment_id)
+    if segment is None:
+        raise HTTPException(status_code=404, detail=f"Segment not found: {segment_id}")
+    members = await run_blocking("metadata", store.members, segment_id)
+    return {"success": True, "segment": public_segment(segment), "members": members.ids(clamp_members(limit))}
+
+@app.delete("/api/segments/{segment_id}")
+async def delete_segment(segment_id: str):
+    if not await run_blocking("metadata", get_segment_store().delete, segment_id):
+        raise HTTPException(status_code=404, detail=f"Segment not found: {segment_id}")
+    return {"success": True, "segment_id": segment_id}
+
+@app.put("/api/segments/{segment_id}")
+async def save_segment(segment_id: str, request: SegmentDefinition):
+    """Store a segment definition and materialize its membership"""
+    return await run_blocking("query", run_save_segment, segment_id, request)
+
+def run_save_segment(segment_id: str, request: SegmentDefinition):
+    """Blocking body of PUT /api/segments/{segment_id}"""
+    details = request.connection_details
+    source_db = None
+    try:
+        source_db = create_source_connection(
+            host=details.host,
+            port=details.port,
+            database=details.database,
+            username=details.username,
+            password=details.password
+        )
+        source_key = source_fingerprint(details.host, details.port, details.database, details.username, details.password)
+        table_info = segment_table(source_db, source_key, request.table, request.schema_name)
+        columns = table_info["columns"]
+        mapping = SCHEMA_MAPPINGS.get(request.table, {})
+
+        # Validate the tree before storing it
+        compile_segment(table_info["table_name"], table_info["schema_name"], request.root_operator, request.conditions, columns=columns)
+
+        candidates = [request.member_column] if request.member_column else ["customer_id", mapping.get("primary_key")]
+        member_column = next((c for name in candidates if name for c in columns if c.lower() == name.lower()), None)
+        if member_column is None:
+            raise MembershipError(f"No member column found in {request.table}; set member_column")
+
+        # Incremental refresh follows the table's sync watermark when the table has one
+        watermark_column = key_column = None
+        if mapping:
+            try:
+                watermark_column = resolve_column(columns, mapping["watermark"])
+                key_column = resolve_column(columns, mapping["primary_key"])
+            except SyncError:
+                logger.info(f"{request.table} has no watermark columns; segment {segment_id} will refresh in full")
+
+        store = get_segment_store()
+        segment = store.save(
+            segment_id,
+            name=request.name,
+            table_name=table_info["table_name"],
+            schema_name=table_info["schema_name"],
+            root_operator=request.root_operator,
+            conditions=[c.model_dump() for c in request.conditions],
+            member_column=member_column,
+            watermark_column=watermark_column,
+            key_column=key_column
+        )
+        refresh = refresh_segment(source_db, source_key, segment, table_info, full=True)
+        return {"success": True, "segment": public_segment(store.get(segment_id)), "refresh": refresh}
+
+    except HTTPException:
+        raise
+    except (SegmentCompileError, MembershipError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid segment: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error saving segment {segment_id}: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error saving segment: {str(e)}"
+        )
+    finally:
+        if source_db:
+            source_db.close()
+
+@app.post("/api/segments/{segment_id}/refresh")
+async def refresh_stored_segment(segment_id: str, request: SegmentRefreshRequest):
+    """Add members from rows past the segment's watermark, or recompute it with full=true"""
+    return await run_blocking("query", run_refresh_segment, segment_id, request)
+
+def run_refresh_segment(segment_id: str, request: SegmentRefreshRequest):
+    """Blocking body of /api/segments/{segment_id}/refresh"""
+    segment = get_segment_store().get(segment_id)
+    if segment is None:
+        raise HTTPException(status_code=404, detail=f"Segment not found: {segment_id}")
+    details = request.connection_details
+    source_db = None
+    try:
+        source_db = create_source_connection(
+            host=details.host,
+            port=details.port,
+            database=details.database,
+            username=details.username,
+            password=details.password
+        )
+        source_key = source_fingerprint(details.host, details.port, details.database, details.username, details.password)
+        table_info = segment_table(source_db, source_key, segment["table_name"], segment["schema_name"])
+        refresh = refresh_segment(source_db, source_key, segment, table_info, full=request.full)
+        return {"success": True, "segment": public_segment(get_segment_store().get(segment_id)), "refresh": refresh}
+
+    except HTTPException:
+        raise
+    except (SegmentCompileError, MembershipError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid segment: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error refreshing segment {segment_id}: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error refreshing segment: {str(e)}"
+        )
+    finally:
+        if source_db:
+            source_db.close()
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(request: CacheInvalidateRequest):
+    """Drop cached query results for one source database, or for all of them"""
+    details = request.connection_details
+    source_key = None
+    if details:
+        source_key = source_fingerprint(details.host, details.port, details.database, details.username, details.password)
+    dropped = result_cache.invalidate(source_key)
+    logger.info(f"Invalidated {dropped} cached results")
+    return {"success": True, "invalidated": dropped}
+
+@app.post("/api/sync/{table_name}")
+async def sync_table(table_name: str, request: SyncRequest):
+    """Upsert source rows past the table's stored watermark into the warehouse"""
+    return await run_blocking("query", run_table_sync, table_name, request)
+
+def run_table_sync(table_name: str, request: SyncRequest, progress: Optional[Callable[..., None]] = None):
+    """Blocking body of /api/sync/{table_name}"""
+    if table_name not in SCHEMA_MAPPINGS:
+        raise HTTPException(status_code=400, detail=f"Unknown table: {table_name}")
+    mapping = SCHEMA_MAPPINGS[table_name]
+    details = request.connection_details
+    source_table = request.source_table or table_name
+    source_db = None
+    try:
+        source_db = create_source_connection(
+            host=details.host,
+            port=details.port,
+            database=details.database,
+            username=details.username,
+            password=details.password
+        )
+        source_key = source_fingerprint(details.host, details.port, details.database, details.username, details.password)
+        tables = catalog_cache.get_tables(source_db, source_key, table=source_table, schema=request.source_schema)
+        if not tables:
+            raise HTTPException(status_code=404, detail=f"Source table not found: {source_table}")
+        table_info = next((t for t in tables if t["schema_name"] == "public"), tables[0])
+
+        state_key = f"{source_key}:{table_info['schema_name']}.{table_info['table_name']}:{table_name}"
+        source_name = f"sync {table_info['schema_name']}.{table_info['table_name']}"
+        stage = StagingWriter(table_name, source=source_name) if request.stage else None
+        quarantine = QuarantineWriter(table_name, source=source_name) if request.quality_checks else None
+        try:
+            result = run_sync(
+                source_db,
+                sync_state,
+                state_key,
+                table_name,
+                table_info["table_name"],
+                table_info["schema_name"],
+                table_info["columns"],
+                primary_key=mapping["primary_key"],
+                watermark=request.watermark_column or mapping["watermark"],
+                load_chunk=lambda df: load_chunks(
+                    [df],
+                    table_name,
+                    batch_size=request.batch_size,
+                    max_in_flight=request.max_in_flight,
+                    upsert=True,
+                    progress=progress,
+                    stage=stage,
+                    loader=request.loader,
+                    quarantine=quarantine
+                ),
+                chunk_size=request.chunk_size,
+                full_refresh=request.full_refresh,
+                progress=progress
+            )
+        finally:
+            staging = stage.close() if stage else None
+            rejected = quarantine.close() if quarantine else None
+
+        segments = []
+        if request.refresh_segments and result["row_count"]:
+            segments = refresh_table_segments(source_db, source_key, table_info)
+        return {
+            "success": result["status"] == "completed",
+            **result,
+            "staging": staging,
+            "quarantine": rejected,
+            "segments": segments
+        }
+
+    except HTTPException:
+        raise
+    except SyncError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid sync: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error syncing {table_name}: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error syncing table: {str(e)}"
+        )
+    finally:
+        if source_db:
+            source_db.close()
+
+@app.get("/api/sync/state")
+async def get_sync_state():
+    """Stored watermarks and last-run results of every incremental sync"""
+    return {"success": True, "syncs": sync_state.all()}
+
+@app.post("/api/jobs/query")
+async def submit_query_job(request: QueryRequest):
+    """Queue a streaming /api/query load and return its job id"""
+    # Jobs always stream, so memory stays bounded by the chunk size
+    request.stream = True
+    job_id = get_job_manager().submit(
+        "query",
+        request.table,
+        lambda context: run_query(request, progress=context.progress)
+    )
+    return {"success": True, "job_id": job_id}
+
+@app.post("/api/jobs/upload/{table_name}")
+async def submit_upload_job(
+    table_name: str,
+    file: UploadFile = File(...),
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    upsert: bool = False,
+    chunk_size: Optional[int] = None,
+    stage: bool = False,
+    loader: str = "supabase",
+    quality_checks: bool = True
+):
+    """Queue a file load and return its job id"""
+    if table_name not in SCHEMA_MAPPINGS:
+        raise HTTPException(status_code=400, detail=f"Unknown table: {table_name}")
+    # The request's spooled file is gone once it returns, so keep a copy for the job
+    path = await run_blocking("upload", save_upload, file)
+
+    def run(context: JobContext):
+        size = os.path.getsize(path)
+        with open(path, "rb") as fileobj:
+            def report(**counts):
+                # Extrapolate the total row count from how far into the file the reader is
+                position = fileobj.tell()
+                rows_read = context.counters["rows_read"] + counts.get("rows_read", 0)
+                total = int(rows_read * size / position) if position else None
+                context.progress(total_rows=total, **counts)
+
+            return process_upload(
+                table_name,
+                file.filename,
+                fileobj,
+                batch_size=batch_size,
+                max_in_flight=max_in_flight,
+                upsert=upsert,
+                chunk_size=chunk_size,
+                progress=report,
+                stage=stage,
+                loader=loader,
+                quality_checks=quality_checks
+            )
+
+    job_id = get_job_manager().submit("upload", table_name, run, cleanup=lambda: os.remove(path))
+    return {"success": True, "job_id": job_id}
+
+def save_upload(file: UploadFile) -> str:
+    suffix = os.path.splitext(file.filename or "")[1]
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix="upload-job-") as target:
+        shutil.copyfileobj(file.file, target)
+    return target.name
+
+@app.post("/api/jobs/sync/{table_name}")
+async def submit_sync_job(table_name: str, request: SyncRequest):
+    """Queue an incremental sync and return its job id"""
+    if table_name not in SCHEMA_MAPPINGS:
+        raise HTTPException(status_code=400, detail=f"Unknown table: {table_name}")
+    job_id = get_job_manager().submit(
+        "sync",
+        table_name,
+        lambda context: run_table_sync(table_name, request, progress=context.progress)
+    )
+    return {"success": True, "job_id": job_id}
+
+@app.get("/api/jobs")
+async def list_jobs(limit: int = 50):
+    return {"success": True, "jobs": await run_blocking("metadata", get_job_manager().store.list, limit)}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of a job: rows read, mapped, inserted and failed, throughput and ETA"""
+    job = await run_blocking("metadata", get_job_manager().store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return {"success": True, "job": job}
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued job, or stop a running one after its current chunk"""
+    manager = get_job_manager()
+    job = await run_blocking("metadata", manager.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job["status"] in FINISHED_STATUSES or not manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return {"success": True, "job_id": job_id, "status": "cancelling"}
+
+@app.get("/api/staging")
+async def get_staging_files(table: Optional[str] = None):
+    """Parquet staging files available for replay"""
+    try:
+        files = await run_blocking("metadata", list_staging_files, table)
+    except StagingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "files": files}
+
+@app.post("/api/staging/replay")
+async def replay_staging(request: ReplayRequest):
+    """Load a staging file into the warehouse again without reading the source"""
+    return await run_blocking("upload", run_replay, request)
+
+@app.post("/api/jobs/replay")
+async def submit_replay_job(request: ReplayRequest):
+    """Queue a staging file replay and return its job id"""
+    job_id = get_job_manager().submit(
+        "replay",
+        request.staging_id.split("/")[0],
+        lambda context: run_replay(request, progress=context.progress)
+    )
+    return {"success": True, "job_id": job_id}
+
+def run_replay(request: ReplayRequest, progress: Optional[Callable[..., None]] = None):
+    """Blocking body of /api/staging/replay"""
+    try:
+        path = staging_path(request.staging_id)
+        table_name = request.staging_id.split("/")[0]
+        if table_name not in SCHEMA_MAPPINGS:
+            raise StagingError(f"Unknown table: {table_name}")
+
+        row_count = 0
+        inserted_count = 0
+        failed_count = 0
+        if request.upsert and describe_staging_file(path).get("key_generated"):
+            raise StagingError(f"Cannot upsert {request.staging_id}: its {SCHEMA_MAPPINGS[table_name]['primary_key']} values were generated")
+        started = time.perf_counter()
+        # Staged rows are already mapped, so batches go straight to the loader
+        for table in iter_staged_tables(path):
+            load = load_mapped(
+                table_name,
+                table,
+                loader=request.loader,
+                batch_size=request.batch_size,
+                max_in_flight=request.max_in_flight,
+                upsert=request.upsert
+            )
+            row_count += table.num_rows
+            inserted_count += load["inserted_count"]
+            failed_count += load["failed_count"]
+            if progress:
+                progress(
+                    rows_read=table.num_rows,
+                    rows_mapped=table.num_rows,
+                    rows_inserted=load["inserted_count"],
+                    rows_failed=load["failed_count"]
+                )
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Replayed {row_count} staged rows into {table_name} in {elapsed:.2f}s")
+        return {
+            "success": failed_count == 0,
+            "staging_id": request.staging_id,
+            "row_count": row_count,
+            "inserted_count": inserted_count,
+            "failed_count": failed_count,
+            "elapsed_seconds": round(elapsed, 3)
+        }
+
+    except StagingError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid replay: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error replaying {request.staging_id}: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error replaying staging file: {str(e)}"
+        )
+
+@app.get("/api/quarantine")
+async def get_quarantine_files(table: Optional[str] = None):
+    """Quarantine files of rows rejected by the data-quality rules"""
+    try:
+        files = await run_blocking("metadata", list_quarantine_files, table)
+    except QualityError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "files": files}
+
+@app.get("/api/quarantine/{table_name}/{name}")
+async def download_quarantine_file(table_name: str, name: str):
+    """Rejected rows of one load as CSV, with the reasons each row failed"""
+    try:
+        path = quarantine_path(f"{table_name}/{name}")
+    except QualityError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return FileResponse(path, media_type="text/csv", filename=f"{table_name}-{name}.csv")
+
+# Transaction columns read by the analytics endpoints
+ANALYTICS_TRANSACTION_COLUMNS = [
+    "transaction_id", "customer_id", "store_id", "transaction_date", "total_amount", "product_line_id", "quantity"
+]
+
+@app.post("/api/analytics/rfm")
+async def analytics_rfm(request: RFMRequest):
+    """Recency, frequency and monetary scores per customer"""
+    def compute(tables):
+        transactions = filter_transactions(tables["transactions"], request.start_date, request.end_date, request.customer_ids)
+        rfm, as_of = rfm_scores(transactions, request.as_of)
+        return {
+            "as_of": as_of.isoformat() if as_of else None,
+            "transactions": transactions.num_rows,
+            "distribution": {
+                score: score_distribution(rfm, score) for score in ("r_score", "f_score", "m_score")
+            } if rfm.num_rows else {}
+        }, rfm, RFM_ORDER
+
+    return await run_blocking("query", run_analytics, request, "rfm", {"transactions": ANALYTICS_TRANSACTION_COLUMNS}, compute)
+
+@app.post("/api/analytics/store-spend")
+async def analytics_store_spend(request: StoreSpendRequest):
+    """Revenue, transactions and customers per store or region"""
+    def compute(tables):
+        transactions = filter_transactions(tables["transactions"], request.start_date, request.end_date, request.customer_ids)
+        result = spend_by_store(transactions, tables["stores"], request.level)
+        return {"level": request.level, "transactions": transactions.num_rows}, result, STORE_SPEND_ORDER
+
+    return await run_blocking(
+        "query",
+        run_analytics,
+        request,
+        "store-spend",
+        {"transactions": ANALYTICS_TRANSACTION_COLUMNS, "stores": ["store_id", "store_name", "city", "region"]},
+        compute
+    )
+
+@app.post("/api/analytics/product-mix")
+async def analytics_product_mix(request: ProductMixRequest):
+    """Spend per customer and product line or category, with each line's share of the customer's spend"""
+    def compute(tables):
+        transactions = filter_transactions(tables["transactions"], request.start_date, request.end_date, request.customer_ids)
+        result = product_mix(transactions, tables["product_lines"], request.level)
+        return {"level": request.level, "transactions": transactions.num_rows}, result, PRODUCT_MIX_ORDER
+
+    return await run_blocking(
+        "query",
+        run_analytics,
+        request,
+        "product-mix",
+        {"transactions": ANALYTICS_TRANSACTION_COLUMNS, "product_lines": ["product_line_id", "name", "category"]},
+        compute
+    )
+
+def run_analytics(request: AnalyticsRequest, kind: str, columns: Dict[str, List[str]], compute):
+    """Blocking body of the analytics endpoints.
+
+    Reads the standard tables ``compute`` needs, from the source database or the
+    staging files. ``compute`` returns (payload, Arrow table, sort keys); the
+    response holds the first rows of the table up to the row limit.
+    """
+    details = request.connection_details
+    source_db = None
+    try:
+        if details:
+            source_db = create_source_connection(
+                host=details.host,
+                port=details.port,
+                database=details.database,
+                username=details.username,
+                password=details.password
+            )
+            source_key = source_fingerprint(details.host, details.port, details.database, details.username, details.password)
+            sources = {table: request.source_tables.get(table, table) for table in columns}
+
+            def read(table):
+                return read_source_table(source_db, table, sources[table], request.source_schema, columns[table])
+        else:
+            # Staging files are immutable, so the file list identifies the data
+            source_key = "staging"
+            sources = {
+                table: request.staging_ids.get(table) or [f["staging_id"] for f in list_staging_files(table)]
+                for table in columns
+            }
+
+            def read(table):
+                return read_staged_table(table, sources[table], columns[table])
+
+        def build():
+            started = time.perf_counter()
+            payload, result, order = compute({table: read(table) for table in columns})
+            rows = top_rows(result, order, clamp_rows(request.limit))
+            elapsed = time.perf_counter() - started
+            logger.info(f"Computed {kind} analytics over {payload.get('transactions')} transactions in {elapsed:.2f}s")
+            return {
+                "success": True,
+                "row_count": result.num_rows,
+                **payload,
+                "elapsed_seconds": round(elapsed, 3)
+            }, rows.to_pandas()
+
+        cache_key = result_key(source_key, f"analytics {kind}", {
+            "sources": sources,
+            "source_schema": request.source_schema,
+            "start_date": request.start_date,
+            "end_date": request.end_date,
+            "customer_ids": request.customer_ids,
+            "limit": request.limit,
+            "as_of": getattr(request, "as_of", None),
+            "level": getattr(request, "level", None)
+        })
+        return cached_records(cache_key, source_key, request.refresh, build)
+
+    except (AnalyticsError, StagingError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid analytics request: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error computing {kind} analytics: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error computing analytics: {str(e)}"
+        )
+    finally:
+        if source_db:
+            source_db.close()
+
+def pool_metrics():
+    """Gauges and counters read from the connection pools, worker groups and caches at scrape time"""
+    engines = source_engines.stats()
+    workers = limiter_stats()
+    cache = result_cache.summary()
+    return [
+        ("source_pool_checked_out", "gauge", "Source database connections in use",
+         [({"source": e["source"]}, e["checked_out"]) for e in engines]),
+        ("source_pool_size", "gauge", "Source database pool size",
+         [({"source": e["source"]}, e["pool_size"]) for e in engines]),
+        ("worker_group_in_use", "gauge", "Worker threads busy per endpoint group",
+         [({"group": group}, s["in_use"]) for group, s in workers.items()]),
+        ("worker_group_limit", "gauge", "Worker thread limit per endpoint group",
+         [({"group": group}, s["limit"]) for group, s in workers.items()]),
+        ("result_cache_requests_total", "counter", "Result cache lookups by outcome",
+         [({"result": k}, cache[k]) for k in ("hits", "disk_hits", "misses")]),
+        ("result_cache_evictions_total", "counter", "Result cache entries evicted or spilled",
+         [({"kind": k}, cache[k]) for k in ("evictions", "spills")]),
+        ("result_cache_entries", "gauge", "Result cache entries",
+         [({"tier": "memory"}, cache["entries"]), ({"tier": "disk"}, cache["spilled_entries"])]),
+        ("result_cache_bytes", "gauge", "Result cache size in bytes",
+         [({"tier": "memory"}, cache["bytes"]), ({"tier": "disk"}, cache["spilled_bytes"])]),
+        ("catalog_cache_requests_total", "counter", "Catalog cache lookups by outcome",
+         [({"result": k}, v) for k, v in catalog_cache.stats.items()]),
+        ("mapping_plan_cache_requests_total", "counter", "Mapping plan cache lookups by outcome",
+         [({"result": k}, v) for k, v in plan_cache_stats.items()]),
+    ]
+
+metrics.register_collector(pool_metrics)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,254 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Schema mappings for each table. "watermark" is the column incremental syncs
+# advance on; it should only grow for new or changed rows.
+SCHEMA_MAPPINGS = {
+    "customers": {
+        "primary_key": "customer_id",
+        "watermark": "customer_id",
+        "required_fields": [
+            "customer_id", "first_name", "last_name", "email", 
+            "phone", "gender", "birth_date", "registration_date", 
+            "address", "city"
+        ],
+        "field_types": {
+            "customer_id": "int", "first_name": "string", "last_name": "string",
+            "email": "string", "phone": "string", "gender": "string",
+            "birth_date": "date", "registration_date": "date",
+            "address": "string", "city": "string"
+        }
+    },
+    "transactions": {
+        "primary_key": "transaction_id",
+        "watermark": "transaction_date",
+        "required_fields": [
+            "transaction_id", "customer_id", "store_id", 
+            "transaction_date", "total_amount", "payment_method",
+            "product_line_id", "quantity", "unit_price"
+        ],
+        "field_types": {
+            "transaction_id": "int", "customer_id": "int", "store_id": "int",
+            "transaction_date": "date", "total_amount": "float", "payment_method": "string",
+            "product_line_id": "int", "quantity": "int", "unit_price": "float"
+        }
+    },
+    "stores": {
+        "primary_key": "store_id",
+        "watermark": "store_id",
+        "required_fields": [
+            "store_id", "store_name", "address", "city",
+            "store_type", "opening_date", "region"
+        ],
+        "field_types": {
+            "store_id": "int", "store_name": "string", "address": "string", "city": "string",
+            "store_type": "string", "opening_date": "date", "region": "string"
+        }
+    },
+    "product_lines": {
+        "primary_key": "product_line_id",
+        "watermark": "product_line_id",
+        "required_fields": [
+            "product_line_id", "name", "category", "subcategory",
+            "brand", "unit_cost"
+        ],
+        "field_types": {
+            "product_line_id": "int", "name": "string", "category": "string",
+            "subcategory": "string", "brand": "string", "unit_cost": "float"
+        }
+    }
+}
+
+# Candidate formats tried, in order, on a sample of each text date column
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%Y/%m/%d",
+]
+
+MAPPING_PLAN_CACHE_SIZE = int(os.getenv("MAPPING_PLAN_CACHE_SIZE", "256"))
+
+class MappingPlan:
+    """Compiled mapping from one source column signature to a standard table"""
+
+    def __init__(
+        self,
+        table_name: str,
+        sources: Dict[str, str],
+        defaults: Dict[str, str],
+        casts: Dict[str, str],
+        date_fields: List[str]
+    ):
+        self.table_name = table_name
+        # target field -> source column
+        self.sources = sources
+        # target field -> default kind for fields missing from the source
+        self.defaults = defaults
+        # target field -> pandas dtype for numeric fields
+        self.casts = casts
+        # date fields; the format of a text source depends on the data, not the
+        # column signature, so it is detected again for every frame
+        self.date_fields = date_fields
+
+    def apply(self, df: pd.DataFrame, errors: str = "raise") -> pd.DataFrame:
+        """Build the mapped frame in a single pass, without per-column inserts.
+
+        With ``errors="coerce"`` values that cannot be converted become null
+        instead of failing the whole frame, for the quality checks to reject.
+        """
+        columns = {}
+        for field in SCHEMA_MAPPINGS[self.table_name]["required_fields"]:
+            if field in self.sources:
+                col = df[self.sources[field]]
+            else:
+                col = _default_column(self.defaults[field], df.index)
+
+            if field in self.date_fields:
+                fmt = None
+                if field in self.sources and not pd.api.types.is_datetime64_any_dtype(col.dtype):
+                    fmt = _detect_date_format(col)
+                col = _parse_dates(col, fmt, field, errors)
+            elif field in self.casts:
+                col = _cast(col, self.casts[field], errors)
+            columns[field] = col
+
+        return pd.DataFrame(columns, index=df.index)
+
+def _default_kind(field: str) -> str:
+    name = field.lower()
+    if "date" in name:
+        return "now"
+    if "id" in name:
+        return "row_number"
+    if "amount" in name or "cost" in name or "price" in name:
+        return "zero"
+    if "quantity" in name:
+        return "one"
+    return "unknown"
+
+def _default_column(kind: str, index: pd.Index) -> pd.Series:
+    if kind == "now":
+        return pd.Series(pd.Timestamp.now(), index=index)
+    if kind == "row_number":
+        return pd.Series(index + 1, index=index)
+    if kind == "zero":
+        return pd.Series(0.0, index=index)
+    if kind == "one":
+        return pd.Series(1, index=index)
+    return pd.Series("Unknown", index=index)
+
+def _detect_date_format(col: pd.Series) -> Optional[str]:
+    sample = col.dropna().astype(str).head(100)
+    if sample.empty:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            pd.to_datetime(sample, format=fmt)
+            return fmt
+        except (ValueError, TypeError):
+            continue
+    return None
+
+def _parse_dates(col: pd.Series, fmt: Optional[str], field: str, errors: str = "raise") -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(col.dtype):
+        return col
+    if errors == "coerce":
+        parsed = pd.to_datetime(col, format=fmt, errors="coerce") if fmt else pd.to_datetime(col, errors="coerce")
+        # Values not in the detected format get a second, per-value pass; only those rows pay for it
+        retry = parsed.isna() & col.notna()
+        if retry.any():
+            parsed[retry] = pd.to_datetime(col[retry], format="mixed", errors="coerce")
+        return parsed
+    if fmt:
+        try:
+            return pd.to_datetime(col, format=fmt)
+        except (ValueError, TypeError):
+            logger.warning(f"Values in {field} do not all match {fmt}, falling back to inferred parsing")
+    return pd.to_datetime(col)
+
+def _cast(col: pd.Series, dtype: str, errors: str = "raise") -> pd.Series:
+    if errors != "coerce":
+        return col.astype(dtype)
+    try:
+        return col.astype(dtype)
+    except (ValueError, TypeError):
+        # e.g. 2.5 in an integer field: null it rather than truncate it
+        values = pd.to_numeric(col, errors="coerce")
+        if dtype == "Int64":
+            values = values.where(values.isna() | (values % 1 == 0))
+        return values.astype(dtype)
+
+def _compile_plan(df: pd.DataFrame, table_name: str) -> MappingPlan:
+    schema = SCHEMA_MAPPINGS[table_name]
+    by_lower = {}
+    for col in df.columns:
+        by_lower.setdefault(str(col).lower(), col)
+
+    sources = {}
+    for field in schema["required_fields"]:
+        # Exact match first, then case-insensitive
+        if field in df.columns:
+            sources[field] = field
+        elif field.lower() in by_lower:
+            sources[field] = by_lower[field.lower()]
+
+    defaults = {f: _default_kind(f) for f in schema["required_fields"] if f not in sources}
+    if defaults:
+        logger.warning(f"Missing fields will be filled with defaults: {set(defaults)}")
+
+    casts = {}
+    date_fields = []
+    for field, type_name in schema["field_types"].items():
+        source = sources.get(field)
+        if type_name == "date":
+            date_fields.append(field)
+        elif source is not None and pd.api.types.is_numeric_dtype(df[source].dtype):
+            # Only numeric sources are cast; text ids are passed through untouched
+            casts[field] = "Int64" if type_name == "int" else "float64"
+
+    return MappingPlan(table_name, sources, defaults, casts, date_fields)
+
+_plan_cache: "OrderedDict[Tuple, MappingPlan]" = OrderedDict()
+_plan_lock = threading.Lock()
+plan_cache_stats = {"hits": 0, "misses": 0}
+
+def get_mapping_plan(df: pd.DataFrame, table_name: str) -> MappingPlan:
+    """Return the cached plan for this source shape, compiling it on first sight"""
+    signature = (table_name, tuple((str(col), str(dtype)) for col, dtype in df.dtypes.items()))
+    with _plan_lock:
+        plan = _plan_cache.get(signature)
+        if plan is not None:
+            _plan_cache.move_to_end(signature)
+            plan_cache_stats["hits"] += 1
+            return plan
+        plan_cache_stats["misses"] += 1
+
+    plan = _compile_plan(df, table_name)
+    with _plan_lock:
+        _plan_cache[signature] = plan
+        while len(_plan_cache) > MAPPING_PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+def validate_and_map_data(df: pd.DataFrame, table_name: str, errors: str = "raise") -> pd.DataFrame:
+    """Validate and map data to the standard schema"""
+    try:
+        if table_name not in SCHEMA_MAPPINGS:
+            raise KeyError(table_name)
+        return get_mapping_plan(df, table_name).apply(df, errors)
+    except Exception as e:
+        logger.error(f"Error in data validation and mapping: {str(e)}")
+        raise ValueError(f"Data validation failed: {str(e)}")
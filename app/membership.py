@@ -0,0 +1,432 @@
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from .segments import quote_identifier
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # pragma: no cover - pyroaring is optional
+    BitMap = None
+
+# Local SQLite file holding segment definitions and their materialized members
+SEGMENTS_DB_PATH = os.getenv("SEGMENTS_DB_PATH", "segments.db")
+# Member ids fetched per round trip while materializing a segment
+SEGMENT_FETCH_SIZE = int(os.getenv("SEGMENT_FETCH_SIZE", "100000"))
+# Upper bound on member ids returned by one request; counts are always exact
+SEGMENT_MAX_MEMBERS = int(os.getenv("SEGMENT_MAX_MEMBERS", "100000"))
+
+# Operators whose result moves with the clock; their segments are always refreshed in full
+TIME_RELATIVE_OPERATORS = {"relative_days_ago"}
+
+_MAX_MEMBER_ID = 2 ** 32 - 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    table_name TEXT NOT NULL,
+    schema_name TEXT,
+    root_operator TEXT NOT NULL,
+    conditions TEXT NOT NULL,
+    member_column TEXT NOT NULL,
+    watermark_column TEXT,
+    key_column TEXT,
+    source_key TEXT,
+    watermark TEXT,
+    key TEXT,
+    member_count INTEGER NOT NULL DEFAULT 0,
+    members_format TEXT,
+    members BLOB,
+    created_at TEXT NOT NULL,
+    refreshed_at TEXT,
+    refresh_mode TEXT,
+    refresh_seconds REAL
+)
+"""
+
+class MembershipError(ValueError):
+    pass
+
+def _member_ids(values) -> np.ndarray:
+    ids = np.asarray(values, dtype=np.int64)
+    if ids.size and (ids.min() < 0 or ids.max() > _MAX_MEMBER_ID):
+        raise MembershipError("Member ids must be integers between 0 and 2^32 - 1")
+    return ids.astype(np.uint32)
+
+def _sorted_unique(ids: np.ndarray) -> np.ndarray:
+    # Sort and mask; much faster than np.unique for large id arrays
+    ids = np.sort(ids)
+    if ids.size:
+        ids = ids[np.concatenate(([True], ids[1:] != ids[:-1]))]
+    return ids
+
+class MemberSet:
+    """Immutable set of member ids: a roaring bitmap, or a sorted array without pyroaring"""
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, ids: Iterable[int] = ()):
+        if BitMap is not None and isinstance(ids, BitMap):
+            self._ids = ids
+        elif isinstance(ids, MemberSet):
+            self._ids = ids._ids
+        else:
+            array = _member_ids(list(ids) if not isinstance(ids, np.ndarray) else ids)
+            self._ids = BitMap(array) if BitMap is not None else _sorted_unique(array)
+
+    @classmethod
+    def _wrap(cls, ids) -> "MemberSet":
+        member_set = cls.__new__(cls)
+        member_set._ids = ids
+        return member_set
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __or__(self, other: "MemberSet") -> "MemberSet":
+        if BitMap is not None:
+            return MemberSet._wrap(self._ids | other._ids)
+        return MemberSet._wrap(_sorted_unique(np.concatenate((self._ids, other._ids))))
+
+    def __and__(self, other: "MemberSet") -> "MemberSet":
+        if BitMap is not None:
+            return MemberSet._wrap(self._ids & other._ids)
+        return MemberSet._wrap(np.intersect1d(self._ids, other._ids, assume_unique=True))
+
+    def __sub__(self, other: "MemberSet") -> "MemberSet":
+        if BitMap is not None:
+            return MemberSet._wrap(self._ids - other._ids)
+        return MemberSet._wrap(np.setdiff1d(self._ids, other._ids, assume_unique=True))
+
+    def intersection_count(self, other: "MemberSet") -> int:
+        if BitMap is not None:
+            return self._ids.intersection_cardinality(other._ids)
+        return len(np.intersect1d(self._ids, other._ids, assume_unique=True))
+
+    def ids(self, limit: Optional[int] = None) -> List[int]:
+        """Member ids in ascending order"""
+        if BitMap is not None:
+            return list(islice(self._ids, limit))
+        return self._ids[:limit].tolist()
+
+    def to_bytes(self) -> Tuple[str, bytes]:
+        """(format, payload) for storage"""
+        if BitMap is not None:
+            return "roaring", self._ids.serialize()
+        return "array", self._ids.astype("<u4").tobytes()
+
+    @classmethod
+    def from_bytes(cls, fmt: Optional[str], payload: Optional[bytes]) -> "MemberSet":
+        if not payload:
+            return cls()
+        if fmt == "roaring":
+            if BitMap is None:
+                raise MembershipError("This segment was stored as a roaring bitmap; install pyroaring to read it")
+            return cls._wrap(BitMap.deserialize(payload))
+        # Stored arrays are already sorted and unique
+        return cls._wrap(np.frombuffer(payload, dtype="<u4").astype(np.uint32))
+
+def clamp_members(limit: int) -> int:
+    return max(0, min(limit, SEGMENT_MAX_MEMBERS))
+
+def _json_dumps(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    return json.dumps(value, default=str)
+
+def _segment_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    segment = {k: row[k] for k in row.keys() if k not in ("members", "members_format")}
+    segment["conditions"] = json.loads(segment["conditions"])
+    segment["watermark"] = json.loads(segment["watermark"]) if segment["watermark"] else None
+    segment["key"] = json.loads(segment["key"]) if segment["key"] else None
+    return segment
+
+# Internal fields of a stored segment left out of API responses: source_key is an
+# unsalted hash of the connection details, password included
+_PRIVATE_FIELDS = ("source_key",)
+
+def public_segment(segment: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """A stored segment as returned by the API"""
+    if segment is None:
+        return None
+    return {k: v for k, v in segment.items() if k not in _PRIVATE_FIELDS}
+
+class SegmentStore:
+    """Segment definitions and member bitmaps in a local SQLite database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(_SCHEMA)
+        # id -> MemberSet, so set operations skip deserializing
+        self._members: Dict[str, MemberSet] = {}
+
+    def save(self, segment_id: str, **definition) -> Dict[str, Any]:
+        """Create or replace a definition; any previous membership is discarded"""
+        definition["conditions"] = json.dumps(definition["conditions"], default=str)
+        columns = ["id", "created_at", *definition]
+        values = [segment_id, datetime.now().isoformat(), *definition.values()]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM segments WHERE id = ?", (segment_id,))
+            self._conn.execute(
+                f"INSERT INTO segments ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                values
+            )
+            self._members.pop(segment_id, None)
+        return self.get(segment_id)
+
+    def get(self, segment_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM segments WHERE id = ?", (segment_id,)).fetchone()
+        return _segment_dict(row) if row else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM segments ORDER BY created_at DESC").fetchall()
+        return [_segment_dict(row) for row in rows]
+
+    def delete(self, segment_id: str) -> bool:
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM segments WHERE id = ?", (segment_id,)).rowcount
+            self._members.pop(segment_id, None)
+        return bool(deleted)
+
+    def members(self, segment_id: str) -> MemberSet:
+        with self._lock:
+            members = self._members.get(segment_id)
+            if members is not None:
+                return members
+            row = self._conn.execute(
+                "SELECT members_format, members FROM segments WHERE id = ?", (segment_id,)
+            ).fetchone()
+            if row is None:
+                raise MembershipError(f"Segment not found: {segment_id}")
+            members = MemberSet.from_bytes(row["members_format"], row["members"])
+            self._members[segment_id] = members
+            return members
+
+    def set_members(self, segment_id: str, members: MemberSet, watermark: Any = None, key: Any = None, **fields):
+        fmt, payload = members.to_bytes()
+        fields.update(
+            members_format=fmt,
+            members=payload,
+            member_count=len(members),
+            watermark=_json_dumps(watermark),
+            key=_json_dumps(key),
+            refreshed_at=datetime.now().isoformat()
+        )
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE segments SET {assignments} WHERE id = ?", (*fields.values(), segment_id))
+            self._members[segment_id] = members
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _position(columns: Tuple[str, ...], prefix: str) -> Tuple[str, str]:
+    """Row-value SQL for the watermark position and its bind placeholders"""
+    if len(columns) == 1:
+        return columns[0], f":{prefix}_key"
+    return f"({', '.join(columns)})", f"(:{prefix}_watermark, :{prefix}_key)"
+
+def membership_sql(
+    base_sql: str,
+    member_column: str,
+    watermark_column: Optional[str],
+    key_column: Optional[str],
+    after: bool
+) -> str:
+    """Distinct member ids of a compiled segment, optionally only from rows past a watermark"""
+    member_sql = quote_identifier(member_column)
+    conditions = [f"{member_sql} IS NOT NULL"]
+    if watermark_column:
+        columns = tuple(dict.fromkeys(quote_identifier(c) for c in (watermark_column, key_column)))
+        position, high = _position(columns, "high")
+        conditions.append(f"{position} <= {high}")
+        if after:
+            conditions.append(f"{position} > {_position(columns, 'after')[1]}")
+    return f"SELECT DISTINCT {member_sql} FROM ({base_sql}) AS segment WHERE {' AND '.join(conditions)}"
+
+def high_water_mark(source_db, table_sql: str, watermark_column: str, key_column: str) -> Optional[Tuple[Any, Any]]:
+    """Largest (watermark, key) position currently in the table"""
+    watermark_sql = quote_identifier(watermark_column)
+    key_sql = quote_identifier(key_column)
+    row = source_db.execute(text(
+        f"SELECT {watermark_sql}, {key_sql} FROM {table_sql} WHERE {watermark_sql} IS NOT NULL "
+        f"ORDER BY {watermark_sql} DESC, {key_sql} DESC LIMIT 1"
+    )).fetchone()
+    return (row[0], row[1]) if row else None
+
+def fetch_members(source_db, sql: str, params: Dict[str, Any]) -> MemberSet:
+    result = source_db.execute(
+        text(sql),
+        params,
+        execution_options={"stream_results": True, "yield_per": SEGMENT_FETCH_SIZE}
+    )
+    chunks = [
+        np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        for rows in result.partitions(SEGMENT_FETCH_SIZE)
+    ]
+    return MemberSet(np.concatenate(chunks) if chunks else ())
+
+def refresh_members(
+    source_db,
+    store: SegmentStore,
+    segment: Dict[str, Any],
+    table_sql: str,
+    base_sql: str,
+    params: Dict[str, Any],
+    source_key: str,
+    full: bool = False
+) -> Dict[str, Any]:
+    """Materialize a segment's members, adding only rows past its watermark when possible.
+
+    An incremental refresh unions in members from rows newer than the stored
+    (watermark, key) position, which is right for append-only tables. Rows that
+    changed in place, or that stopped matching, are picked up by a full refresh.
+    """
+    segment_id = segment["id"]
+    watermark_column = segment["watermark_column"]
+    key_column = segment["key_column"]
+    incremental = (
+        not full
+        and watermark_column is not None
+        and segment["refreshed_at"] is not None
+        and segment["source_key"] == source_key
+        and segment["key"] is not None
+        and not _uses_time_relative_operator(segment["conditions"])
+    )
+
+    started = time.perf_counter()
+    # One snapshot for the high-water mark and the members, so no row is counted twice or missed
+    source_db.rollback()
+    source_db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"))
+    try:
+        params = dict(params)
+        high = None
+        if watermark_column:
+            high = high_water_mark(source_db, table_sql, watermark_column, key_column)
+            if high is None:
+                # No positioned rows yet; only rows with a NULL watermark can match
+                incremental = False
+            else:
+                params["high_watermark"], params["high_key"] = high
+                if incremental:
+                    params["after_watermark"], params["after_key"] = segment["watermark"], segment["key"]
+        sql = membership_sql(base_sql, segment["member_column"], watermark_column if high else None, key_column, incremental)
+        found = fetch_members(source_db, sql, params)
+    finally:
+        source_db.rollback()
+
+    previous = store.members(segment_id) if incremental else MemberSet()
+    members = previous | found
+    elapsed = time.perf_counter() - started
+    mode = "incremental" if incremental else "full"
+    store.set_members(
+        segment_id,
+        members,
+        watermark=high[0] if high else None,
+        key=high[1] if high else None,
+        source_key=source_key,
+        refresh_mode=mode,
+        refresh_seconds=round(elapsed, 3)
+    )
+    logger.info(f"Refreshed segment {segment_id} ({mode}): {len(members)} members, {len(members) - len(previous)} added in {elapsed:.2f}s")
+    return {
+        "mode": mode,
+        "member_count": len(members),
+        "added_count": len(members) - len(previous),
+        "elapsed_seconds": round(elapsed, 3)
+    }
+
+def _uses_time_relative_operator(conditions: List[Dict[str, Any]]) -> bool:
+    for condition in conditions:
+        if condition.get("operator") in TIME_RELATIVE_OPERATORS:
+            return True
+        if _uses_time_relative_operator(condition.get("conditions") or []):
+            return True
+    return False
+
+def evaluate_expression(store: SegmentStore, expression: Dict[str, Any]) -> MemberSet:
+    """Members of a set expression over stored segments.
+
+    An expression is {"segment_id": ...} or {"operator": "AND" | "OR" | "NOT",
+    "operands": [...]}. NOT takes one operand and is only valid inside an AND,
+    where it subtracts from the other operands, as the builder's exclusions do.
+    """
+    if expression.get("segment_id"):
+        return store.members(expression["segment_id"])
+
+    operator = (expression.get("operator") or "").upper()
+    operands = expression.get("operands") or []
+    if not operands:
+        raise MembershipError("A set expression needs a segment_id or operands")
+    if operator == "OR":
+        result = MemberSet()
+        for operand in operands:
+            result = result | evaluate_expression(store, operand)
+        return result
+    if operator == "AND":
+        included = [o for o in operands if (o.get("operator") or "").upper() != "NOT"]
+        excluded = [o for o in operands if (o.get("operator") or "").upper() == "NOT"]
+        if not included:
+            raise MembershipError("AND needs at least one operand that is not a NOT")
+        # Smallest sets first keeps the intermediate results small
+        sets = sorted((evaluate_expression(store, o) for o in included), key=len)
+        result = sets[0]
+        for member_set in sets[1:]:
+            result = result & member_set
+        for operand in excluded:
+            if len(operand.get("operands") or []) != 1:
+                raise MembershipError("NOT takes exactly one operand")
+            result = result - evaluate_expression(store, operand["operands"][0])
+        return result
+    if operator == "NOT":
+        raise MembershipError("NOT is only supported inside an AND")
+    raise MembershipError(f"Unsupported set operator: {operator}")
+
+def overlap_counts(store: SegmentStore, segment_ids: List[str]) -> Dict[str, Any]:
+    """Member count of each segment and of every pair's intersection"""
+    members = {segment_id: store.members(segment_id) for segment_id in segment_ids}
+    pairs = []
+    for i, a in enumerate(segment_ids):
+        for b in segment_ids[i + 1:]:
+            pairs.append({"a": a, "b": b, "count": members[a].intersection_count(members[b])})
+    return {"counts": {segment_id: len(m) for segment_id, m in members.items()}, "overlaps": pairs}
+
+_store: Optional[SegmentStore] = None
+_store_lock = threading.Lock()
+
+def get_segment_store() -> SegmentStore:
+    """Process-wide segment store, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SegmentStore(SEGMENTS_DB_PATH)
+    return _store
+
+def close_segment_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
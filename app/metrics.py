@@ -0,0 +1,253 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Requests slower than this log their per-stage timings; 0 logs every request
+METRICS_SLOW_REQUEST_SECONDS = float(os.getenv("METRICS_SLOW_REQUEST_SECONDS", "1.0"))
+
+_HELP = {
+    "http_request_duration_seconds": ("histogram", "Request latency by route"),
+    "stage_duration_seconds": ("histogram", "Time spent in each processing stage"),
+    "stage_rows_total": ("counter", "Rows handled by each processing stage"),
+    "stage_bytes_total": ("counter", "Bytes handled by each processing stage"),
+}
+
+# Route template of the current request, e.g. /api/jobs/{job_id}; jobs set their own
+_route: ContextVar[str] = ContextVar("metrics_route", default="background")
+# (stage, seconds) pairs of the current request, reported in the Server-Timing header
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("metrics_timings", default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+# A collected metric family: (name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _label_text(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _le(bound) -> str:
+    return f'le="{bound}"'
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """Counters and histograms kept in process and rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Add a function returning metric families read at scrape time, e.g. pool gauges"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = [(k, list(h.counts), h.sum, h.count) for k, h in self._histograms.items()]
+            counters = list(self._counters.items())
+
+        lines = []
+        seen = set()
+
+        def header(name: str, kind: str, help_text: str):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), counts, total, count in sorted(histograms):
+            header(name, *_HELP.get(name, ("histogram", name)))
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_label_text(labels, _le(bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_label_text(labels, _le('+Inf'))} {count}")
+            lines.append(f"{name}_sum{_label_text(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+
+        for (name, labels), value in sorted(counters):
+            header(name, *_HELP.get(name, ("counter", name)))
+            lines.append(f"{name}{_label_text(labels)} {_number(value)}")
+
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, help_text, samples in families:
+                header(name, kind, help_text)
+                for labels, value in samples:
+                    lines.append(f"{name}{_label_text(tuple(sorted(labels.items())))} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+class StageTimer:
+    """Handed to the body of a timed_stage to report the rows and bytes it handled"""
+
+    __slots__ = ("rows", "bytes")
+
+    def __init__(self, rows: int = 0, bytes: int = 0):
+        self.rows = rows
+        self.bytes = bytes
+
+def record_stage(name: str, seconds: float, rows: int = 0, bytes: int = 0):
+    route = _route.get()
+    metrics.observe("stage_duration_seconds", seconds, route=route, stage=name)
+    if rows:
+        metrics.inc("stage_rows_total", rows, route=route, stage=name)
+    if bytes:
+        metrics.inc("stage_bytes_total", bytes, route=route, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+@contextmanager
+def timed_stage(name: str, rows: int = 0, bytes: int = 0) -> Iterator[StageTimer]:
+    """Time a processing stage (connect, query, fetch, map, serialize, insert) of the current request"""
+    timer = StageTimer(rows, bytes)
+    started = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        record_stage(name, time.perf_counter() - started, timer.rows, timer.bytes)
+
+def timed_chunks(chunks: Iterable, name: str = "fetch") -> Iterator:
+    """Yield from a chunk iterator, timing each read as a stage and counting its rows"""
+    iterator = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        record_stage(name, time.perf_counter() - started, rows=len(chunk))
+        yield chunk
+
+@contextmanager
+def route_context(route: str):
+    """Label stages recorded outside a request, e.g. in a background job"""
+    token = _route.set(route)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+def _route_template(router, scope) -> str:
+    for route in router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+def _stage_totals(timings: List[Tuple[str, float]]) -> Dict[str, List[float]]:
+    """stage -> [seconds, calls]; chunked stages are recorded once per chunk"""
+    totals: Dict[str, List[float]] = {}
+    for name, seconds in timings:
+        total = totals.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+    return totals
+
+def _server_timing(timings: List[Tuple[str, float]]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, (seconds, _) in _stage_totals(timings).items())
+
+class MetricsMiddleware:
+    """Record per-route latency and report stage timings in a Server-Timing header.
+
+    A plain ASGI middleware, so it adds no extra task per request.
+    """
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = _route_template(self.router, scope)
+        route_token = _route.set(route)
+        timings: List[Tuple[str, float]] = []
+        timings_token = _timings.set(timings)
+        status = [500]
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if timings:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timings).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe(
+                "http_request_duration_seconds", elapsed, method=scope["method"], route=route, status=str(status[0])
+            )
+            if timings and elapsed >= METRICS_SLOW_REQUEST_SECONDS:
+                logger.info("Request timing " + json.dumps({
+                    "method": scope["method"],
+                    "route": route,
+                    "status": status[0],
+                    "seconds": round(elapsed, 4),
+                    "stages": {
+                        name: {"seconds": round(seconds, 4), "calls": calls}
+                        for name, (seconds, calls) in _stage_totals(timings).items()
+                    }
+                }))
+            _timings.reset(timings_token)
+            _route.reset(route_token)
@@ -0,0 +1,220 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import contextvars
+import logging
+import math
+import os
+import queue
+import re
+import threading
+
+import pandas as pd
+from sqlalchemy import text
+
+from .mapping import validate_and_map_data
+from .metrics import timed_chunks, timed_stage
+from .preview import normalize_select
+from .segments import quote_identifier
+
+logger = logging.getLogger(__name__)
+
+# Key ranges a partitioned extract is split into; more ranges than workers evens out skew
+PARTITION_COUNT = int(os.getenv("PARTITION_COUNT", "8"))
+# Partitions read at the same time, each over its own pooled source connection
+PARTITION_WORKERS = int(os.getenv("PARTITION_WORKERS", "4"))
+# Mapped chunks buffered per worker before readers wait for the loader
+PARTITION_QUEUE_CHUNKS = int(os.getenv("PARTITION_QUEUE_CHUNKS", "2"))
+
+_SNAPSHOT_ID = re.compile(r"^[0-9A-Fa-f-]+$")
+
+class PartitionError(ValueError):
+    pass
+
+def export_snapshot(source_db) -> Optional[str]:
+    """Start a REPEATABLE READ transaction on the coordinating session and export its snapshot.
+
+    Partition readers import the snapshot, so all ranges (and the bounds, read
+    on this session afterwards) see the same committed rows. The session must
+    keep this transaction open until the readers have started; without an
+    exported snapshot (e.g. on a hot standby) each range sees its own state.
+    """
+    try:
+        source_db.rollback()
+        source_db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+        return source_db.execute(text("SELECT pg_export_snapshot()")).scalar()
+    except Exception as e:
+        logger.warning(f"Could not export a snapshot, partitions will read independently: {str(e)}")
+        source_db.rollback()
+        return None
+
+def import_snapshot(session, snapshot: str):
+    """Make the session's new transaction read from an exported snapshot"""
+    if not _SNAPSHOT_ID.match(snapshot):
+        raise PartitionError(f"Invalid snapshot id: {snapshot}")
+    session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+    # SET TRANSACTION SNAPSHOT takes no bind parameters; the id is validated above
+    session.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot}'"))
+
+def _cuts(low: Any, high: Any, partitions: int) -> List[Any]:
+    """Inner boundaries splitting [low, high] into equal-width ranges"""
+    if partitions < 2 or low == high:
+        return []
+    if isinstance(low, int) and isinstance(high, int):
+        step = max(1, math.ceil((high - low + 1) / partitions))
+        cuts = [low + step * i for i in range(1, partitions)]
+    elif isinstance(low, (float, Decimal)) or isinstance(high, (float, Decimal)):
+        step = (high - low) / partitions
+        cuts = [low + step * i for i in range(1, partitions)]
+    elif isinstance(low, datetime):
+        step = (high - low) / partitions
+        cuts = [low + step * i for i in range(1, partitions)]
+    elif isinstance(low, date):
+        step = max(1, math.ceil(((high - low).days + 1) / partitions))
+        cuts = [date.fromordinal(low.toordinal() + step * i) for i in range(1, partitions)]
+    else:
+        raise PartitionError(f"Cannot partition on values of type {type(low).__name__}; use a numeric or date column")
+    return sorted({c for c in cuts if low < c <= high})
+
+def partition_bounds(source_db, query: str, column: str, partitions: int) -> List[Any]:
+    """Boundaries splitting the query's rows into key ranges, from the column's min and max"""
+    sql = normalize_select(query)
+    column_sql = quote_identifier(column)
+    low, high = source_db.execute(
+        text(f"SELECT min({column_sql}), max({column_sql}) FROM ({sql}) AS source")
+    ).one()
+    if low is None:
+        return []
+    return _cuts(low, high, partitions)
+
+def partition_queries(query: str, column: str, cuts: List[Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """One range query per partition.
+
+    The first range is open below and also takes null keys, and the last is
+    open above, so rows outside the sampled min/max are still read once.
+    """
+    sql = normalize_select(query)
+    if not cuts:
+        return [(sql, {})]
+    column_sql = quote_identifier(column)
+    queries = []
+    for i in range(len(cuts) + 1):
+        if i == 0:
+            where = f"{column_sql} < :part_high OR {column_sql} IS NULL"
+            params = {"part_high": cuts[0]}
+        elif i == len(cuts):
+            where = f"{column_sql} >= :part_low"
+            params = {"part_low": cuts[-1]}
+        else:
+            where = f"{column_sql} >= :part_low AND {column_sql} < :part_high"
+            params = {"part_low": cuts[i - 1], "part_high": cuts[i]}
+        queries.append((f"SELECT * FROM ({sql}) AS source WHERE {where}", params))
+    return queries
+
+class _Finished:
+    def __init__(self, partition: int, rows: int, error: Optional[Exception] = None):
+        self.partition = partition
+        self.rows = rows
+        self.error = error
+
+def extract_partitions(
+    open_session: Callable[[], Any],
+    queries: List[Tuple[str, Dict[str, Any]]],
+    table_name: str,
+    chunk_size: int,
+    workers: Optional[int] = None,
+    errors: str = "raise",
+    snapshot: Optional[str] = None
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """Read the partition queries in parallel, mapping each chunk on the thread that read it.
+
+    Yields (raw, mapped) chunk pairs as they become ready, in no fixed order.
+    Each partition streams through its own session from ``open_session``,
+    reading from ``snapshot`` (see export_snapshot) when one is given.
+    Generated default ids stay unique because every chunk claims its own
+    index range before mapping.
+    """
+    workers = max(1, min(workers or PARTITION_WORKERS, len(queries)))
+    chunks: "queue.Queue" = queue.Queue(maxsize=max(1, workers * PARTITION_QUEUE_CHUNKS))
+    pending = queue.Queue()
+    for item in enumerate(queries):
+        pending.put(item)
+    stop = threading.Event()
+    index_lock = threading.Lock()
+    next_index = [0]
+
+    def claim(rows: int) -> range:
+        with index_lock:
+            start = next_index[0]
+            next_index[0] += rows
+        return range(start, start + rows)
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read_partitions():
+        while not stop.is_set():
+            try:
+                partition, (sql, params) = pending.get_nowait()
+            except queue.Empty:
+                return
+            rows = 0
+            session = None
+            try:
+                session = open_session()
+                if snapshot:
+                    import_snapshot(session, snapshot)
+                with timed_stage("query"):
+                    result = session.execute(
+                        text(sql), params, execution_options={"stream_results": True, "yield_per": chunk_size}
+                    )
+                    columns = list(result.keys())
+                for batch in timed_chunks(result.partitions(chunk_size)):
+                    if stop.is_set():
+                        break
+                    df = pd.DataFrame(batch, columns=columns)
+                    df.index = claim(len(df))
+                    with timed_stage("map", rows=len(df)):
+                        mapped = validate_and_map_data(df, table_name, errors)
+                    rows += len(df)
+                    if not put((df, mapped)):
+                        break
+                put(_Finished(partition, rows))
+            except Exception as e:
+                put(_Finished(partition, rows, e))
+                return
+            finally:
+                if session is not None:
+                    session.close()
+
+    threads = []
+    for i in range(workers):
+        # Each reader gets its own copy of the request context, so stage timings reach the caller
+        thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(read_partitions,), name=f"partition-{i}", daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+
+    finished = 0
+    try:
+        while finished < len(queries):
+            item = chunks.get()
+            if isinstance(item, _Finished):
+                if item.error is not None:
+                    raise item.error
+                finished += 1
+                logger.info(f"Partition {item.partition + 1}/{len(queries)} of {table_name} read: {item.rows} rows")
+                continue
+            yield item
+    finally:
+        # Stop the readers, whether the extract finished, failed or was abandoned by the caller
+        stop.set()
+        for thread in threads:
+            thread.join()
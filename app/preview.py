@@ -0,0 +1,164 @@
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import json
+import logging
+import os
+import re
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DEFAULT_PAGE_SIZE = int(os.getenv("PREVIEW_DEFAULT_PAGE_SIZE", "100"))
+PREVIEW_MAX_PAGE_SIZE = int(os.getenv("PREVIEW_MAX_PAGE_SIZE", "1000"))
+# Upper bound for any single preview statement, including exact counts
+PREVIEW_STATEMENT_TIMEOUT_MS = int(os.getenv("PREVIEW_STATEMENT_TIMEOUT_MS", "15000"))
+
+class PreviewError(ValueError):
+    pass
+
+def clamp_page_size(page_size: Optional[int]) -> int:
+    return max(1, min(page_size or PREVIEW_DEFAULT_PAGE_SIZE, PREVIEW_MAX_PAGE_SIZE))
+
+def encode_cursor(key: Optional[str], value: Any = None, offset: Optional[int] = None) -> str:
+    """Opaque page cursor: the last key value seen, or an offset when there is no key"""
+    payload = {"k": key, "v": value} if key else {"o": offset}
+    return base64.urlsafe_b64encode(json.dumps(payload, default=str).encode()).decode()
+
+def decode_cursor(cursor: Optional[str]) -> Dict[str, Any]:
+    if not cursor:
+        return {}
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise PreviewError("Invalid pagination cursor")
+
+# Single-column, non-partial unique indexes on NOT NULL columns, primary key first:
+# the only keys a "key > last value" page condition can walk without skipping rows
+_UNIQUE_KEYS_QUERY = """
+    SELECT a.attname
+    FROM pg_catalog.pg_index i
+    JOIN pg_catalog.pg_class c ON c.oid = i.indrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum = i.indkey[0]
+    WHERE n.nspname = :schema AND c.relname = :table
+        AND i.indisunique AND i.indnkeyatts = 1
+        AND i.indpred IS NULL AND i.indexprs IS NULL
+        AND a.attnotnull
+    ORDER BY i.indisprimary DESC, a.attnum
+"""
+
+def unique_key_columns(source_db, table: str, schema: str) -> List[str]:
+    """Columns of a source table that are guaranteed unique and non-null"""
+    return list(source_db.execute(text(_UNIQUE_KEYS_QUERY), {"table": table, "schema": schema}).scalars())
+
+def choose_key(columns: List[str], unique_keys: Optional[List[str]] = None, requested: Optional[str] = None) -> Optional[str]:
+    """Pick a column to paginate on: the requested one or a known unique key, else None for OFFSET.
+
+    Keyset pages on a column with repeated values would skip the rows that
+    share a value across a page boundary, so a column is never chosen just
+    for looking like an id.
+    """
+    if requested:
+        if requested not in columns:
+            raise PreviewError(f"Unknown key column: {requested}")
+        return requested
+    for col in unique_keys or []:
+        if col in columns:
+            return col
+    return None
+
+def begin_read_only(source_db):
+    """Start a read-only transaction with the preview statement timeout"""
+    source_db.execute(text("SET TRANSACTION READ ONLY"))
+    source_db.execute(text(f"SET LOCAL statement_timeout = {PREVIEW_STATEMENT_TIMEOUT_MS}"))
+
+def estimate_rows(source_db, sql: str, params: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """Planner row estimate for a statement, without running it"""
+    try:
+        # Savepoint, so a failed EXPLAIN does not abort the surrounding transaction
+        with source_db.begin_nested():
+            plan = source_db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params or {}).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        node = plan[0]["Plan"]
+        # Look through a top-level Limit so the estimate covers the whole result
+        while node.get("Node Type") == "Limit" and node.get("Plans"):
+            node = node["Plans"][0]
+        return int(node["Plan Rows"])
+    except Exception as e:
+        logger.warning(f"Could not estimate row count: {str(e)}")
+        return None
+
+def exact_count(source_db, sql: str, params: Optional[Dict[str, Any]] = None) -> int:
+    return int(source_db.execute(text(f"SELECT count(*) FROM ({sql}) AS preview_count"), params or {}).scalar())
+
+def normalize_select(query: str) -> str:
+    """Accept a single SELECT/WITH statement so it can be wrapped as a subquery"""
+    sql = query.strip().rstrip(";").strip()
+    if ";" in sql:
+        raise PreviewError("Only a single statement can be previewed")
+    if not re.match(r"^(select|with)\b", sql, re.IGNORECASE):
+        raise PreviewError("Only SELECT queries can be previewed")
+    return sql
+
+def page_query(
+    base_sql: str,
+    key: Optional[str],
+    cursor: Dict[str, Any],
+    page_size: int
+) -> Tuple[str, Dict[str, Any]]:
+    """Wrap a query so it returns one page (plus one row to detect more) after the cursor"""
+    params: Dict[str, Any] = {"preview_limit": page_size + 1}
+    if key:
+        quoted = '"' + key.replace('"', '""') + '"'
+        where = ""
+        if cursor.get("k") == key and cursor.get("v") is not None:
+            where = f" WHERE {quoted} > :preview_after"
+            params["preview_after"] = cursor["v"]
+        sql = f"SELECT * FROM ({base_sql}) AS preview_src{where} ORDER BY {quoted} LIMIT :preview_limit"
+    else:
+        params["preview_offset"] = int(cursor.get("o") or 0)
+        sql = f"SELECT * FROM ({base_sql}) AS preview_src LIMIT :preview_limit OFFSET :preview_offset"
+    return sql, params
+
+def next_cursor(rows: List[Any], columns: List[str], key: Optional[str], cursor: Dict[str, Any], page_size: int) -> Optional[str]:
+    if len(rows) <= page_size:
+        return None
+    if key:
+        return encode_cursor(key, rows[page_size - 1][columns.index(key)])
+    return encode_cursor(None, offset=int(cursor.get("o") or 0) + page_size)
+
+def preview_query(
+    source_db,
+    query: str,
+    key_column: Optional[str] = None,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None,
+    include_exact_count: bool = False
+) -> Dict[str, Any]:
+    """Return one page of a user query with row-count estimates.
+
+    Pages are keyset-paginated on ``key_column``, which the caller vouches is
+    unique; without one, the query's output has no known key and OFFSET is used.
+    """
+    base_sql = normalize_select(query)
+    page_size = clamp_page_size(page_size)
+    position = decode_cursor(cursor)
+
+    begin_read_only(source_db)
+    columns = list(source_db.execute(text(f"SELECT * FROM ({base_sql}) AS preview_src LIMIT 0")).keys())
+    key = choose_key(columns, requested=key_column)
+
+    sql, params = page_query(base_sql, key, position, page_size)
+    result = source_db.execute(text(sql), params)
+    rows = result.fetchall()
+
+    return {
+        "columns": columns,
+        "rows": rows[:page_size],
+        "key_column": key,
+        "next_cursor": next_cursor(rows, columns, key, position, page_size),
+        "approximate_total": estimate_rows(source_db, base_sql),
+        "exact_total": exact_count(source_db, base_sql) if include_exact_count else None
+    }
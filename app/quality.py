@@ -0,0 +1,204 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import re
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from .mapping import SCHEMA_MAPPINGS, get_mapping_plan
+
+logger = logging.getLogger(__name__)
+
+# Root directory for quarantine files of rejected rows, one subdirectory per table
+QUARANTINE_DIR = os.getenv("QUARANTINE_DIR", "quarantine")
+# Largest accepted gap between total_amount and quantity x unit_price
+QUALITY_AMOUNT_TOLERANCE = float(os.getenv("QUALITY_AMOUNT_TOLERANCE", "0.01"))
+
+# Fields that must be set on every row, besides the primary key
+REQUIRED_FIELDS = {
+    "customers": [],
+    "transactions": ["customer_id", "store_id", "product_line_id", "transaction_date"],
+    "stores": [],
+    "product_lines": []
+}
+
+# Inclusive (min, max) bounds for numeric fields; None leaves a side open
+FIELD_RANGES = {
+    "transactions": {"total_amount": (0, None), "quantity": (1, None), "unit_price": (0, None)},
+    "product_lines": {"unit_cost": (0, None)}
+}
+
+_QUARANTINE_ID = re.compile(r"^[A-Za-z0-9_]+/[A-Za-z0-9_.-]+$")
+
+class QualityError(ValueError):
+    pass
+
+def _numeric(col: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(col.dtype):
+        return col
+    return pd.to_numeric(col, errors="coerce")
+
+def _amount_mismatch(mapped: pd.DataFrame) -> pd.Series:
+    total = _numeric(mapped["total_amount"])
+    expected = _numeric(mapped["quantity"]) * _numeric(mapped["unit_price"])
+    # Rows missing any of the three are left to the null and range rules
+    return ((total - expected).abs() > QUALITY_AMOUNT_TOLERANCE).fillna(False)
+
+# Rules comparing fields of the same row: table -> [(reason, input fields, check)]
+CROSS_FIELD_RULES = {
+    "transactions": [
+        ("total_amount does not match quantity x unit_price", ["total_amount", "quantity", "unit_price"], _amount_mismatch)
+    ]
+}
+
+def quality_masks(raw: pd.DataFrame, mapped: pd.DataFrame, table_name: str) -> List[Tuple[str, np.ndarray]]:
+    """(reason, rejected-row mask) for every rule a chunk breaks; each rule is one vectorized pass"""
+    schema = SCHEMA_MAPPINGS[table_name]
+    sources = get_mapping_plan(raw, table_name).sources
+    failures = []
+
+    def add(reason: str, mask: pd.Series):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            failures.append((reason, mask))
+
+    # Types: a source value that did not survive conversion
+    for field, source in sources.items():
+        if field in mapped.columns:
+            add(f"{field} is not a valid {schema['field_types'][field]}", raw[source].notna() & mapped[field].isna())
+
+    # Nullability; a field with no source column at all would only hold a
+    # mapping default (row numbers, now()), so every row is rejected for it
+    for field in [schema["primary_key"]] + REQUIRED_FIELDS.get(table_name, []):
+        if field in sources:
+            add(f"{field} is missing", raw[sources[field]].isna())
+        else:
+            add(f"{field} is missing", np.ones(len(mapped), dtype=bool))
+
+    # Value rules only judge fields the source supplied, never mapping defaults
+    for field, (low, high) in FIELD_RANGES.get(table_name, {}).items():
+        if field not in sources:
+            continue
+        values = _numeric(mapped[field])
+        if low is not None:
+            add(f"{field} is below {low}", (values < low).fillna(False))
+        if high is not None:
+            add(f"{field} is above {high}", (values > high).fillna(False))
+
+    for reason, fields, check in CROSS_FIELD_RULES.get(table_name, []):
+        if all(field in sources for field in fields):
+            add(reason, check(mapped))
+
+    # Uniqueness last, among rows that pass every other rule, so an invalid
+    # later duplicate never knocks out a valid earlier one
+    key = schema["primary_key"]
+    rejected = np.zeros(len(mapped), dtype=bool)
+    for _, mask in failures:
+        rejected |= mask
+    keys = mapped[key][~rejected]
+    duplicated = keys.duplicated(keep="last") & keys.notna()
+    if duplicated.any():
+        mask = np.zeros(len(mapped), dtype=bool)
+        mask[np.flatnonzero(~rejected)[duplicated.to_numpy()]] = True
+        add(f"duplicate {key} in the same chunk (the last row is kept)", mask)
+    return failures
+
+def check_quality(raw: pd.DataFrame, mapped: pd.DataFrame, table_name: str) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """Split a mapped chunk into rows that pass the table's rules and rejected raw rows with reasons"""
+    failures = quality_masks(raw, mapped, table_name)
+    if not failures:
+        return mapped, None
+
+    rejected = np.zeros(len(mapped), dtype=bool)
+    for _, mask in failures:
+        rejected |= mask
+    # Reasons are only assembled for the rejected rows
+    reasons = np.full(int(rejected.sum()), "", dtype=object)
+    for reason, mask in failures:
+        hit = mask[rejected]
+        reasons[hit] = reasons[hit] + np.where(reasons[hit] == "", "", "; ") + reason
+
+    rejects = raw[rejected].copy()
+    rejects.insert(0, "_reasons", reasons)
+    rejects.insert(0, "_source_row", raw.index[rejected])
+    return mapped[~rejected], rejects
+
+class QuarantineWriter:
+    """Append rejected rows and their reasons to one CSV file for a table"""
+
+    def __init__(self, table_name: str, source: Optional[str] = None, quarantine_dir: str = QUARANTINE_DIR):
+        self.table_name = table_name
+        self.source = source
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.quarantine_id = f"{table_name}/{name}"
+        self.directory = os.path.join(quarantine_dir, table_name)
+        self.path = os.path.join(self.directory, f"{name}.csv")
+        # Written under a temporary name until closed
+        self._tmp_path = f"{self.path}.tmp"
+        self._columns: Optional[List[str]] = None
+        self.row_count = 0
+        self.reasons: Dict[str, int] = {}
+
+    def write(self, rejects: pd.DataFrame):
+        if rejects is None or rejects.empty:
+            return
+        if self._columns is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._columns = list(rejects.columns)
+            rejects.to_csv(self._tmp_path, index=False, date_format="%Y-%m-%dT%H:%M:%S")
+        else:
+            # Later chunks can bring new source columns; keep the first chunk's layout
+            rejects.reindex(columns=self._columns).to_csv(
+                self._tmp_path, mode="a", header=False, index=False, date_format="%Y-%m-%dT%H:%M:%S"
+            )
+        self.row_count += len(rejects)
+        for reason in rejects["_reasons"]:
+            for part in reason.split("; "):
+                self.reasons[part] = self.reasons.get(part, 0) + 1
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """Finish the file and return its summary, or None if no row was rejected"""
+        if self._columns is None:
+            return None
+        os.replace(self._tmp_path, self.path)
+        logger.warning(f"Quarantined {self.row_count} rejected {self.table_name} rows at {self.path}: {self.reasons}")
+        return {
+            "quarantine_id": self.quarantine_id,
+            "rows": self.row_count,
+            "reasons": self.reasons,
+            "source": self.source
+        }
+
+def quarantine_path(quarantine_id: str, quarantine_dir: str = QUARANTINE_DIR) -> str:
+    if not _QUARANTINE_ID.match(quarantine_id):
+        raise QualityError(f"Invalid quarantine id: {quarantine_id}")
+    path = os.path.join(quarantine_dir, f"{quarantine_id}.csv")
+    if not os.path.exists(path):
+        raise QualityError(f"Quarantine file not found: {quarantine_id}")
+    return path
+
+def list_quarantine_files(table_name: Optional[str] = None, quarantine_dir: str = QUARANTINE_DIR) -> List[Dict[str, Any]]:
+    # Only standard table names are joined into the path, never arbitrary input
+    if table_name and table_name not in SCHEMA_MAPPINGS:
+        raise QualityError(f"Unknown table: {table_name}")
+    if not os.path.isdir(quarantine_dir):
+        return []
+    tables = [table_name] if table_name else sorted(os.listdir(quarantine_dir))
+    files = []
+    for table in tables:
+        directory = os.path.join(quarantine_dir, table)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".csv"):
+                path = os.path.join(directory, name)
+                files.append({
+                    "quarantine_id": f"{table}/{name[:-len('.csv')]}",
+                    "table": table,
+                    "bytes": os.path.getsize(path),
+                    "modified_at": datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+                })
+    return files
@@ -0,0 +1,130 @@
+from typing import BinaryIO, Dict, Iterator, List, Optional
+import logging
+import os
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+# Rows per chunk when parsing uploads
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "50000"))
+# Bytes per block for the pyarrow streaming CSV reader
+UPLOAD_CSV_BLOCK_SIZE = int(os.getenv("UPLOAD_CSV_BLOCK_SIZE", str(8 * 1024 * 1024)))
+
+# Field type names used in SCHEMA_MAPPINGS -> pandas dtypes for parsing.
+# Dates stay strings here and are parsed during mapping.
+PANDAS_DTYPES = {"int": "Int64", "float": "float64", "string": "string", "date": "string"}
+
+def _pyarrow_types():
+    return {"int": pa.int64(), "float": pa.float64(), "string": pa.string(), "date": pa.string()}
+
+def resolve_dtypes(columns: List[str], field_types: Dict[str, str]) -> Dict[str, str]:
+    """Match file header columns to schema fields case-insensitively and return their type names"""
+    by_lower = {field.lower(): type_name for field, type_name in field_types.items()}
+    return {col: by_lower[col.lower()] for col in columns if col.lower() in by_lower}
+
+def _read_csv_header(fileobj: BinaryIO) -> List[str]:
+    start = fileobj.tell()
+    header = pd.read_csv(fileobj, nrows=0).columns.tolist()
+    fileobj.seek(start)
+    return header
+
+def iter_csv_chunks(fileobj: BinaryIO, field_types: Dict[str, str], chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Parse a CSV file incrementally with explicit dtypes for the known schema fields"""
+    header = _read_csv_header(fileobj)
+    types = resolve_dtypes(header, field_types)
+
+    if pa is not None:
+        # The Arrow CSV reader is imported with the first CSV upload
+        import pyarrow.csv as pa_csv
+
+        arrow_types = _pyarrow_types()
+        # Unknown columns are read as strings so every block gets the same schema
+        column_types = {col: arrow_types[types.get(col, "string")] for col in header}
+        reader = pa_csv.open_csv(
+            fileobj,
+            read_options=pa_csv.ReadOptions(block_size=UPLOAD_CSV_BLOCK_SIZE),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=column_types,
+                strings_can_be_null=True
+            )
+        )
+        # Blocks are sized in bytes; re-slice them so every frame but the last has chunk_size rows
+        pending: List["pa.RecordBatch"] = []
+        pending_rows = 0
+        for batch in reader:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= chunk_size:
+                table = pa.Table.from_batches(pending, schema=reader.schema)
+                yield table.slice(0, chunk_size).to_pandas()
+                rest = table.slice(chunk_size)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+        if pending_rows:
+            yield pa.Table.from_batches(pending, schema=reader.schema).to_pandas()
+        return
+
+    yield from pd.read_csv(
+        fileobj,
+        chunksize=chunk_size,
+        dtype={col: PANDAS_DTYPES[t] for col, t in types.items()}
+    )
+
+def iter_xlsx_chunks(fileobj: BinaryIO, field_types: Dict[str, str], chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Stream rows from the first worksheet of an .xlsx file without loading the workbook"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(col) for col in header]
+        types = resolve_dtypes(columns, field_types)
+
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield _typed_frame(chunk, columns, types)
+                chunk = []
+        if chunk:
+            yield _typed_frame(chunk, columns, types)
+    finally:
+        workbook.close()
+
+def _typed_frame(rows: list, columns: List[str], types: Dict[str, str]) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=columns)
+    for col, type_name in types.items():
+        if type_name == "date":
+            # Excel already hands back datetimes for date cells
+            continue
+        if type_name in ("int", "float"):
+            df[col] = pd.to_numeric(df[col]).astype(PANDAS_DTYPES[type_name])
+        else:
+            df[col] = df[col].astype(PANDAS_DTYPES[type_name])
+    return df
+
+def iter_upload_chunks(
+    filename: str,
+    fileobj: BinaryIO,
+    field_types: Dict[str, str],
+    chunk_size: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
+    """Pick a chunked reader for the uploaded file based on its extension"""
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return iter_csv_chunks(fileobj, field_types, chunk_size)
+    if name.endswith('.xlsx'):
+        return iter_xlsx_chunks(fileobj, field_types, chunk_size)
+    if name.endswith('.xls'):
+        # Legacy binary workbooks cannot be streamed; read them in one go
+        return iter([pd.read_excel(fileobj)])
+    raise ValueError("Unsupported file format. Please upload CSV or Excel files.")
@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401 - needed by DataFrame.to_parquet
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pyarrow = None
+
+# In-memory budget for cached result frames
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+# Directory for Parquet spill files; spilling is disabled when unset
+RESULT_CACHE_SPILL_DIR = os.getenv("RESULT_CACHE_SPILL_DIR", "")
+RESULT_CACHE_SPILL_MAX_BYTES = int(os.getenv("RESULT_CACHE_SPILL_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Quoted literals and identifiers are kept verbatim; other whitespace runs collapse
+_SQL_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+")
+
+def normalize_sql(sql: str) -> str:
+    """Canonical form of a statement for cache keys"""
+    sql = _SQL_TOKENS.sub(lambda m: " " if m.group(0).isspace() else m.group(0), sql)
+    return sql.strip().rstrip(";").strip()
+
+def result_key(source_key: str, sql: str, params: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps([source_key, normalize_sql(sql), params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _frame_size(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class ResultCache:
+    """LRU cache of query results with a memory budget and optional Parquet spill"""
+
+    def __init__(self, max_bytes: int, ttl: float, spill_dir: str = "", spill_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir if spill_dir and pyarrow is not None else ""
+        self.spill_max_bytes = spill_max_bytes
+        # key -> {"source_key", "df", "meta", "size", "expires_at"}
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # key -> {"source_key", "path", "meta", "size", "expires_at"}
+        self._disk: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "spills": 0}
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            # The spill index lives in memory, so files from a previous process are orphans
+            for name in os.listdir(self.spill_dir):
+                if name.endswith(".parquet"):
+                    self._remove_file(os.path.join(self.spill_dir, name))
+
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        """Cached (frame, metadata) for a key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry["df"], entry["meta"]
+                self._drop_memory(key)
+
+            spilled = self._disk.pop(key, None)
+            if spilled is None:
+                self.stats["misses"] += 1
+                return None
+            self._disk_bytes -= spilled["size"]
+
+        if spilled["expires_at"] <= now:
+            self._remove_file(spilled["path"])
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        try:
+            df = pd.read_parquet(spilled["path"])
+        except Exception as e:
+            logger.warning(f"Could not read spilled result {key[:12]}: {str(e)}")
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        finally:
+            self._remove_file(spilled["path"])
+
+        # Promote back into memory for the rest of its lifetime
+        self._store(key, spilled["source_key"], df, spilled["meta"], spilled["expires_at"])
+        with self._lock:
+            self.stats["disk_hits"] += 1
+        return df, spilled["meta"]
+
+    def put(self, key: str, source_key: str, df: pd.DataFrame, meta: Dict[str, Any], ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._store(key, source_key, df, meta, expires_at)
+
+    def _store(self, key: str, source_key: str, df: pd.DataFrame, meta: Dict[str, Any], expires_at: float):
+        entry = {"source_key": source_key, "df": df, "meta": meta, "size": _frame_size(df), "expires_at": expires_at}
+        evicted = []
+        with self._lock:
+            self._drop_memory(key)
+            self._memory[key] = entry
+            self._memory_bytes += entry["size"]
+            while self._memory_bytes > self.max_bytes and self._memory:
+                old_key, old = self._memory.popitem(last=False)
+                self._memory_bytes -= old["size"]
+                self.stats["evictions"] += 1
+                evicted.append((old_key, old))
+        # Spill outside the lock; Parquet writes can take a while
+        for old_key, old in evicted:
+            if self.spill_dir and old["expires_at"] > time.monotonic():
+                self._spill(old_key, old)
+
+    def _spill(self, key: str, entry: Dict[str, Any]):
+        path = os.path.join(self.spill_dir, f"{key}.parquet")
+        try:
+            entry["df"].to_parquet(path, index=False)
+        except Exception as e:
+            logger.warning(f"Could not spill result {key[:12]} to disk: {str(e)}")
+            self._remove_file(path)
+            return
+        size = os.path.getsize(path)
+        stale = []
+        with self._lock:
+            self._disk[key] = {
+                "source_key": entry["source_key"],
+                "path": path,
+                "meta": entry["meta"],
+                "size": size,
+                "expires_at": entry["expires_at"]
+            }
+            self._disk_bytes += size
+            self.stats["spills"] += 1
+            while self._disk_bytes > self.spill_max_bytes and self._disk:
+                _, old = self._disk.popitem(last=False)
+                self._disk_bytes -= old["size"]
+                stale.append(old["path"])
+        for old_path in stale:
+            self._remove_file(old_path)
+
+    def _drop_memory(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry["size"]
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def invalidate(self, source_key: Optional[str] = None) -> int:
+        """Drop cached results of one source, or of every source; returns the number dropped"""
+        with self._lock:
+            keys = [k for k, e in self._memory.items() if source_key is None or e["source_key"] == source_key]
+            for key in keys:
+                self._drop_memory(key)
+            spilled = [k for k, e in self._disk.items() if source_key is None or e["source_key"] == source_key]
+            paths = []
+            for key in spilled:
+                entry = self._disk.pop(key)
+                self._disk_bytes -= entry["size"]
+                paths.append(entry["path"])
+        for path in paths:
+            self._remove_file(path)
+        return len(keys) + len(spilled)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "spilled_entries": len(self._disk),
+                "spilled_bytes": self._disk_bytes
+            }
+
+result_cache = ResultCache(
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    ttl=RESULT_CACHE_TTL,
+    spill_dir=RESULT_CACHE_SPILL_DIR,
+    spill_max_bytes=RESULT_CACHE_SPILL_MAX_BYTES
+)
@@ -0,0 +1,268 @@
+from typing import Any, Callable, Dict, Generator, Iterator, List, Optional, Tuple
+import json
+import logging
+import os
+import zlib
+
+import pandas as pd
+
+from .metrics import timed_stage
+from .serialization import normalize_frame
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# gzip level for streamed results; low levels keep up with the source cursor (zstd uses its default)
+STREAM_GZIP_LEVEL = int(os.getenv("STREAM_GZIP_LEVEL", "4"))
+
+# Key of the last NDJSON line and of the last Arrow batch's metadata, holding the load summary
+SUMMARY_KEY = "_summary"
+
+# Postgres type OIDs with a natural Arrow type for streamed results; anything else
+# (text, varchar, uuid, dates, which normalize_frame turns into ISO strings, ...) is sent as text
+_PG_INTEGER_TYPES = {20, 21, 23, 26}
+_PG_FLOAT_TYPES = {700, 701, 1700}
+_PG_BOOL = 16
+_PG_TIMESTAMP = 1114
+_PG_TIMESTAMPTZ = 1184
+
+class ResultStreamError(ValueError):
+    pass
+
+def _pg_arrow_type(type_code: Any):
+    if type_code in _PG_INTEGER_TYPES:
+        return pa.int64()
+    if type_code in _PG_FLOAT_TYPES:
+        return pa.float64()
+    if type_code == _PG_BOOL:
+        return pa.bool_()
+    if type_code == _PG_TIMESTAMP:
+        return pa.timestamp("us")
+    if type_code == _PG_TIMESTAMPTZ:
+        return pa.timestamp("us", tz="UTC")
+    return None
+
+def result_schema(description: List[Any]):
+    """Arrow schema for a source cursor's columns, fixed before the first row is read.
+
+    Types come from the cursor's column type OIDs. The frames are raw source
+    rows, so columns of any other type are sent as strings whatever mapped
+    field shares their name.
+    """
+    if pa is None:
+        return None
+    return pa.schema([
+        pa.field(column[0], _pg_arrow_type(column[1]) or pa.string())
+        for column in description
+    ])
+
+def _preferences(header: Optional[str]) -> List[Tuple[str, float]]:
+    """(token, q) pairs of an Accept or Accept-Encoding header, in header order"""
+    preferences = []
+    for part in (header or "").split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        preferences.append((token.lower(), q))
+    return preferences
+
+def stream_formats() -> Dict[str, str]:
+    """Streamed result formats this server can produce: media type -> format"""
+    formats = {NDJSON_MEDIA_TYPE: "ndjson", "application/ndjson": "ndjson"}
+    if pa is not None:
+        formats[ARROW_STREAM_MEDIA_TYPE] = "arrow"
+    return formats
+
+def stream_encodings() -> List[str]:
+    """Content codings available for streamed results, most preferred first"""
+    encodings = []
+    if pa is not None and pa.Codec.is_available("zstd"):
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """Streamed format the client asked for in Accept, or None for the regular JSON response.
+
+    A streamed format is only chosen when the client ranks it above
+    application/json, so browsers and existing clients keep getting JSON.
+    """
+    formats = stream_formats()
+    best, best_q = None, 0.0
+    json_q = 0.0
+    for media_type, q in _preferences(accept):
+        if media_type == "application/json":
+            json_q = max(json_q, q)
+        elif media_type in formats and q > best_q:
+            best, best_q = formats[media_type], q
+    return best if best is not None and best_q > json_q else None
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Content coding for a streamed result from Accept-Encoding, or None for identity"""
+    offered = dict(_preferences(accept_encoding))
+    available = stream_encodings()
+    choices = [
+        (offered.get(encoding, offered.get("*", 0.0)), -i, encoding)
+        for i, encoding in enumerate(available)
+    ]
+    q, _, encoding = max(choices)
+    return encoding if q > 0 else None
+
+def _encoded(frames: Generator[pd.DataFrame, None, Dict[str, Any]], encode: Callable[[pd.DataFrame], bytes]):
+    """Encode each frame of ``frames``; returns the generator's own return value (the summary)"""
+    while True:
+        try:
+            df = next(frames)
+        except StopIteration as done:
+            return done.value or {}
+        if df.empty:
+            continue
+        with timed_stage("serialize", rows=len(df)) as timer:
+            body = encode(df)
+            timer.bytes = len(body)
+        if body:
+            yield body
+
+def ndjson_stream(frames: Generator[pd.DataFrame, None, Dict[str, Any]]) -> Iterator[bytes]:
+    """One JSON object per row, then a final line holding the summary ``frames`` returns"""
+    def encode(df: pd.DataFrame) -> bytes:
+        body = normalize_frame(df).to_json(orient="records", lines=True, date_format="iso", date_unit="s").encode()
+        return body if body.endswith(b"\n") else body + b"\n"
+
+    try:
+        summary = yield from _encoded(frames, encode)
+    finally:
+        frames.close()
+    yield json.dumps({SUMMARY_KEY: summary}, default=str).encode() + b"\n"
+
+class _Sink:
+    """Write-only file collecting what a pyarrow writer produces until it is taken"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+def _arrow_batch(df: pd.DataFrame, schema=None):
+    df = normalize_frame(df)
+    if schema is None:
+        batch = pa.RecordBatch.from_pandas(df, preserve_index=False)
+        # A column that is all null in the first chunk is sent as strings
+        fields = [pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in batch.schema]
+        return batch.cast(pa.schema(fields))
+    for field in schema:
+        is_string = pa.types.is_string(field.type) or pa.types.is_large_string(field.type)
+        if is_string and not pd.api.types.is_string_dtype(df[field.name].dtype):
+            df[field.name] = df[field.name].astype("string")
+    return pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False)
+
+def arrow_stream(frames: Generator[pd.DataFrame, None, Dict[str, Any]], schema=None) -> Iterator[bytes]:
+    """Arrow IPC stream with one record batch per frame.
+
+    The schema is ``schema`` (see result_schema), or else comes from the first
+    frame; the stream ends with an empty batch whose custom metadata holds the
+    summary ``frames`` returns.
+    """
+    if pa is None:
+        raise ResultStreamError("Arrow responses require pyarrow")
+    sink = _Sink()
+    writer = None
+
+    def encode(df: pd.DataFrame) -> bytes:
+        nonlocal writer, schema
+        batch = _arrow_batch(df, schema)
+        if writer is None:
+            schema = batch.schema
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(batch)
+        return sink.take()
+
+    try:
+        summary = yield from _encoded(frames, encode)
+    finally:
+        frames.close()
+    if writer is None:
+        if schema is None:
+            schema = pa.schema([(c, pa.string()) for c in summary.get("columns") or []])
+        writer = pa.ipc.new_stream(sink, schema)
+    writer.write_batch(
+        pa.RecordBatch.from_pylist([], schema=schema),
+        custom_metadata={SUMMARY_KEY: json.dumps(summary, default=str)}
+    )
+    writer.close()
+    yield sink.take()
+
+def compress_stream(chunks: Generator[bytes, None, None], encoding: Optional[str]) -> Iterator[bytes]:
+    """Compress a byte stream chunk by chunk, flushing after each so clients can decode as it arrives"""
+    try:
+        if encoding is None:
+            yield from chunks
+        elif encoding == "gzip":
+            compressor = zlib.compressobj(STREAM_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            for chunk in chunks:
+                data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+        elif encoding == "zstd":
+            sink = _Sink()
+            out = pa.CompressedOutputStream(pa.PythonFile(sink, mode="w"), "zstd")
+            for chunk in chunks:
+                out.write(chunk)
+                out.flush()
+                data = sink.take()
+                if data:
+                    yield data
+            out.close()
+            yield sink.take()
+        else:
+            raise ResultStreamError(f"Unsupported content coding: {encoding}")
+    finally:
+        # Closing the response early closes the encoder, and with it the source frames
+        chunks.close()
+
+def encode_result_stream(
+    frames: Generator[pd.DataFrame, None, Dict[str, Any]],
+    result_format: str,
+    encoding: Optional[str] = None,
+    schema=None
+) -> Tuple[Iterator[bytes], Dict[str, str]]:
+    """Body chunks and headers for streaming ``frames`` in a negotiated format and coding"""
+    if result_format == "ndjson":
+        chunks, media_type = ndjson_stream(frames), NDJSON_MEDIA_TYPE
+    elif result_format == "arrow":
+        chunks, media_type = arrow_stream(frames, schema), ARROW_STREAM_MEDIA_TYPE
+    else:
+        raise ResultStreamError(f"Unsupported result format: {result_format}")
+    headers = {"Content-Type": media_type, "Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return compress_stream(chunks, encoding), headers
@@ -0,0 +1,261 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import logging
+import os
+import re
+
+from pydantic import BaseModel
+from sqlalchemy import literal, text
+
+from .preview import begin_read_only
+
+logger = logging.getLogger(__name__)
+
+# Use server-side PREPARE/EXECUTE on pooled connections. Disable behind
+# transaction-mode poolers (e.g. pgbouncer) that do not keep session state.
+SEGMENT_PREPARED_STATEMENTS = os.getenv("SEGMENT_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_$]*$")
+
+class SegmentCondition(BaseModel):
+    """A condition or a condition group, as produced by SegmentBuilder"""
+    id: Optional[int] = None
+    type: str = "attribute"
+    field: Optional[str] = None
+    operator: Optional[str] = None
+    value: Any = None
+    value2: Any = None
+    # Only set for groups: operator is then AND/OR over these conditions
+    conditions: Optional[List["SegmentCondition"]] = None
+
+class SegmentCompileError(ValueError):
+    pass
+
+class CompiledSegment:
+    """Parameterized SQL for one condition-tree shape"""
+
+    def __init__(self, sql: str, param_count: int, base_sql: str, base_param_count: int):
+        self.sql = sql
+        self.param_count = param_count
+        # Filter-only statement (no keyset, order or limit) used for counts and estimates
+        self.base_sql = base_sql
+        self.base_param_count = base_param_count
+        self.name = "segment_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+        # Same statement with positional $n placeholders for PREPARE
+        self.prepared_sql = re.sub(r":p(\d+)", lambda m: f"${int(m.group(1)) + 1}", sql)
+
+def quote_identifier(name: str) -> str:
+    if not name or not _IDENTIFIER.match(name):
+        raise SegmentCompileError(f"Invalid identifier: {name!r}")
+    return f'"{name}"'
+
+def _escape_like(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# operator -> (SQL template, value transforms); {col} is the quoted column and
+# {0}/{1} are placeholders for the condition's value and value2
+_OPERATORS = {
+    "equals": ("{col} = {0}", ["raw"]),
+    "not_equals": ("{col} <> {0}", ["raw"]),
+    "greater_than": ("{col} > {0}", ["raw"]),
+    "less_than": ("{col} < {0}", ["raw"]),
+    "after": ("{col} > {0}", ["raw"]),
+    "before": ("{col} < {0}", ["raw"]),
+    "on": ("CAST({col} AS DATE) = CAST({0} AS DATE)", ["text"]),
+    "not_on": ("CAST({col} AS DATE) <> CAST({0} AS DATE)", ["text"]),
+    "between": ("{col} BETWEEN {0} AND {1}", ["raw", "raw2"]),
+    "relative_days_ago": ("{col} >= now() - make_interval(days => CAST({0} AS INTEGER))", ["text"]),
+    "contains": ("CAST({col} AS TEXT) LIKE {0}", ["contains"]),
+    "not_contains": ("CAST({col} AS TEXT) NOT LIKE {0}", ["contains"]),
+    # One pattern per value in a single array placeholder, so the shape does not depend on the count
+    "contains_all": ("CAST({col} AS TEXT) LIKE ALL (CAST({0} AS TEXT[]))", ["contains_all"]),
+    "starts_with": ("CAST({col} AS TEXT) LIKE {0}", ["starts_with"]),
+    "ends_with": ("CAST({col} AS TEXT) LIKE {0}", ["ends_with"]),
+    "is_null": ("{col} IS NULL", []),
+    "is_not_null": ("{col} IS NOT NULL", []),
+    "is_empty": ("({col} IS NULL OR CAST({col} AS TEXT) IN ('', '{{}}', '[]'))", []),
+    "is_not_empty": ("({col} IS NOT NULL AND CAST({col} AS TEXT) NOT IN ('', '{{}}', '[]'))", []),
+}
+
+def _shape(node: SegmentCondition) -> Optional[tuple]:
+    """Structure of a condition without its values; None for conditions the compiler skips"""
+    if node.type == "group":
+        children = tuple(s for s in (_shape(c) for c in node.conditions or []) if s is not None)
+        return ("group", (node.operator or "AND").upper(), children) if children else None
+    if node.type != "attribute" or not node.field or not node.operator:
+        return None
+    return ("attribute", node.field, node.operator)
+
+def _values(node: SegmentCondition) -> List[SegmentCondition]:
+    """Compiled conditions in placeholder order, matching _shape"""
+    if node.type == "group":
+        return [v for c in node.conditions or [] for v in _values(c)]
+    if _shape(node) is None:
+        return []
+    return [node]
+
+def tree_shape(root_operator: str, conditions: List[SegmentCondition]) -> tuple:
+    root = SegmentCondition(type="group", operator=root_operator, conditions=conditions)
+    return _shape(root) or ("group", root_operator.upper(), ())
+
+@lru_cache(maxsize=512)
+def compile_shape(
+    table_sql: str,
+    shape: tuple,
+    order_key: Optional[str] = None,
+    keyset: bool = False,
+    paged: bool = False
+) -> CompiledSegment:
+    """Compile a condition-tree shape to SQL with named placeholders; cached by shape"""
+    count = [0]
+
+    def placeholder() -> str:
+        count[0] += 1
+        return f":p{count[0] - 1}"
+
+    def compile_node(node: tuple) -> str:
+        if node[0] == "group":
+            _, op, children = node
+            if op not in ("AND", "OR"):
+                raise SegmentCompileError(f"Unsupported group operator: {op}")
+            return "(" + f" {op} ".join(compile_node(c) for c in children) + ")"
+        _, field, operator = node
+        if operator not in _OPERATORS:
+            raise SegmentCompileError(f"Unsupported operator: {operator}")
+        template, kinds = _OPERATORS[operator]
+        return template.format(*[placeholder() for _ in kinds], col=quote_identifier(field))
+
+    where = compile_node(shape) if shape[2] else "TRUE"
+    base_sql = f"SELECT * FROM {table_sql} WHERE {where}"
+    base_param_count = count[0]
+
+    sql = base_sql
+    if order_key:
+        key_sql = quote_identifier(order_key)
+        if keyset:
+            sql += f" AND {key_sql} > {placeholder()}"
+        sql += f" ORDER BY {key_sql}"
+    sql += f" LIMIT {placeholder()}"
+    if paged:
+        sql += f" OFFSET {placeholder()}"
+    return CompiledSegment(sql, count[0], base_sql, base_param_count)
+
+def _transform(kind: str, node: SegmentCondition) -> Any:
+    if kind == "raw2":
+        return node.value2
+    if kind == "contains":
+        return f"%{_escape_like(node.value)}%"
+    if kind == "contains_all":
+        # SegmentBuilder sends a list, or a comma-separated string from a text input
+        values = node.value if isinstance(node.value, list) else str(node.value or "").split(",")
+        patterns = [f"%{_escape_like(str(v).strip())}%" for v in values if str(v).strip()]
+        if not patterns:
+            raise SegmentCompileError(f"contains_all on {node.field} needs at least one value")
+        return patterns
+    if kind == "starts_with":
+        return f"{_escape_like(node.value)}%"
+    if kind == "ends_with":
+        return f"%{_escape_like(node.value)}"
+    if kind == "text":
+        return None if node.value is None else str(node.value)
+    return node.value
+
+def compile_segment(
+    table: str,
+    schema: Optional[str],
+    root_operator: str,
+    conditions: List[SegmentCondition],
+    columns: Optional[List[str]] = None,
+    limit: int = 100,
+    order_key: Optional[str] = None,
+    after: Any = None,
+    offset: int = 0
+) -> Tuple[CompiledSegment, Dict[str, Any]]:
+    """Compile a condition tree to cached parameterized SQL plus its bind values.
+
+    With ``order_key`` the rows are ordered by that column, and ``after`` (the last
+    key of the previous page) turns the query into a keyset page. Without a key,
+    later pages are read with ``offset``.
+    """
+    table_sql = quote_identifier(table)
+    if schema:
+        table_sql = f"{quote_identifier(schema)}.{table_sql}"
+
+    shape = tree_shape(root_operator, conditions)
+    keyset = order_key is not None and after is not None
+    paged = order_key is None and offset > 0
+    compiled = compile_shape(table_sql, shape, order_key, keyset, paged)
+
+    nodes = [n for c in conditions for n in _values(c)]
+    if columns is not None:
+        unknown = {n.field for n in nodes} - set(columns)
+        if unknown:
+            raise SegmentCompileError(f"Unknown columns for {table}: {', '.join(sorted(unknown))}")
+
+    # Expand each condition into one value per placeholder it produced
+    values = []
+    for node in nodes:
+        _, kinds = _OPERATORS[node.operator]
+        values.extend(_transform(kind, node) for kind in kinds)
+    if keyset:
+        values.append(after)
+    values.append(max(1, limit))
+    if paged:
+        values.append(offset)
+
+    params = {f"p{i}": v for i, v in enumerate(values)}
+    return compiled, params
+
+def _execute_plain(source_db, compiled: CompiledSegment, params: Dict[str, Any]):
+    source_db.rollback()
+    begin_read_only(source_db)
+    return source_db.execute(text(compiled.sql), params)
+
+def _literal(source_db, value: Any) -> str:
+    if isinstance(value, list):
+        return "ARRAY[" + ", ".join(_literal(source_db, v) for v in value) + "]"
+    compiled = literal(value).compile(dialect=source_db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    # Escape colons so text() does not read them as bind parameters
+    return str(compiled).replace(":", "\\:")
+
+def _parameter_types(source_db, name: str) -> List[str]:
+    rows = source_db.execute(text(
+        "SELECT t::text FROM pg_catalog.pg_prepared_statements, "
+        "unnest(parameter_types) WITH ORDINALITY AS u(t, i) "
+        "WHERE name = :name ORDER BY i"
+    ), {"name": name}).fetchall()
+    return [row[0] for row in rows]
+
+def execute_segment(source_db, compiled: CompiledSegment, params: Dict[str, Any]):
+    """Run a compiled segment read-only, reusing a server-side prepared statement when possible"""
+    begin_read_only(source_db)
+    if not SEGMENT_PREPARED_STATEMENTS:
+        return source_db.execute(text(compiled.sql), params)
+
+    connection = source_db.connection()
+    # info lives on the pooled DBAPI connection, so it survives checkouts.
+    # Maps statement name -> parameter types inferred by the server.
+    prepared = connection.info.setdefault("prepared_segments", {})
+    if compiled.name not in prepared:
+        try:
+            connection.exec_driver_sql(f"PREPARE {compiled.name} AS {compiled.prepared_sql}")
+            prepared[compiled.name] = _parameter_types(source_db, compiled.name)
+        except Exception as e:
+            logger.warning(f"Could not prepare segment statement, running it unprepared: {str(e)}")
+            return _execute_plain(source_db, compiled, params)
+
+    # EXECUTE is a utility statement and cannot take bind parameters, so the
+    # values are rendered as literals cast to the types the server inferred
+    arguments = ", ".join(
+        f"CAST({_literal(source_db, params[f'p{i}'])} AS {t})"
+        for i, t in enumerate(prepared[compiled.name])
+    )
+    try:
+        return source_db.execute(text(f"EXECUTE {compiled.name}({arguments})"))
+    except Exception as e:
+        if "does not exist" in str(e):
+            # The server session lost the statement (e.g. a pooler switched backends)
+            prepared.pop(compiled.name, None)
+        logger.warning(f"Prepared segment execution failed, running it unprepared: {str(e)}")
+        return _execute_plain(source_db, compiled, params)
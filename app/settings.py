@@ -0,0 +1,50 @@
+from functools import lru_cache
+from typing import Optional
+import os
+
+from pydantic import BaseModel, ConfigDict
+
+class Settings(BaseModel):
+    """Connection and pool configuration, read from the environment (and .env) once per process"""
+    model_config = ConfigDict(frozen=True)
+
+    # Supabase configuration (data warehouse); SUPABASE_SERVICE_KEY bypasses RLS
+    supabase_url: Optional[str] = None
+    supabase_key: Optional[str] = None
+
+    # Direct Postgres connection to the warehouse, used by the COPY loader and init_db
+    # (e.g. the Supabase "connection string" from the database settings)
+    warehouse_database_url: Optional[str] = None
+    warehouse_pool_size: int = 4
+    # Schema holding the standard tables, for init_db and the COPY loader
+    warehouse_schema: str = "public"
+    # Rows per COPY transaction
+    copy_batch_size: int = 100000
+
+    # Source engine registry configuration
+    source_engine_max: int = 16
+    source_engine_idle_ttl: float = 900
+    source_pool_size: int = 5
+    source_pool_max_overflow: int = 5
+    source_pool_timeout: float = 30
+    source_pool_recycle: int = 1800
+
+    # Supabase HTTP connection pool configuration
+    supabase_http_max_connections: int = 20
+    supabase_http_keepalive_expiry: float = 60
+    supabase_http_timeout: float = 120
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Settings from environment variables named like the fields in upper case"""
+        values = {name: os.getenv(name.upper()) for name in cls.model_fields}
+        values["supabase_key"] = os.getenv("SUPABASE_SERVICE_KEY", os.getenv("SUPABASE_KEY"))
+        return cls(**{name: value for name, value in values.items() if value is not None})
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Process-wide settings; the first call loads .env into the environment"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return Settings.from_env()
@@ -0,0 +1,193 @@
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import logging
+import os
+import re
+import uuid
+
+import pandas as pd
+
+from .mapping import SCHEMA_MAPPINGS
+from .serialization import DATETIME_FORMAT, frame_to_records
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    pc = None
+
+# Root directory for Parquet staging files, one subdirectory per table
+STAGING_DIR = os.getenv("STAGING_DIR", "staging")
+# Rows per record batch when replaying a staging file
+STAGING_REPLAY_BATCH_SIZE = int(os.getenv("STAGING_REPLAY_BATCH_SIZE", "50000"))
+
+_STAGING_ID = re.compile(r"^[A-Za-z0-9_]+/[A-Za-z0-9_.-]+$")
+
+class StagingError(ValueError):
+    pass
+
+def _arrow_types():
+    # Microseconds, like the warehouse TIMESTAMP columns
+    return {"int": pa.int64(), "float": pa.float64(), "string": pa.string(), "date": pa.timestamp("us")}
+
+def warehouse_schema(table_name: str, columns: List[str]):
+    """Arrow schema for mapped columns, typed from SCHEMA_MAPPINGS where known"""
+    field_types = SCHEMA_MAPPINGS[table_name]["field_types"]
+    types = _arrow_types()
+    return pa.schema([(col, types[field_types[col]] if col in field_types else pa.string()) for col in columns])
+
+def warehouse_timestamps(df: pd.DataFrame) -> pd.DataFrame:
+    """Shallow copy with datetime columns as naive UTC at microsecond precision.
+
+    The warehouse stores timestamps without a zone, so aware values are
+    converted to UTC first, the same instant the JSON records carry with a Z.
+    """
+    converted = df.copy(deep=False)
+    for name in converted.columns:
+        col = converted[name]
+        if not pd.api.types.is_datetime64_any_dtype(col.dtype):
+            continue
+        if col.dt.tz is not None:
+            col = col.dt.tz_convert("UTC").dt.tz_localize(None)
+        if col.dt.unit == "ns":
+            col = col.dt.floor("us")
+        converted[name] = col
+    return converted
+
+def frame_to_arrow(df: pd.DataFrame, table_name: str):
+    """Convert a mapped frame to an Arrow table with the warehouse schema.
+
+    Casts are safe: a value the warehouse type cannot hold (2.5 in an integer
+    field, an out-of-range number) raises instead of being truncated.
+    """
+    df = warehouse_timestamps(df)
+    schema = warehouse_schema(table_name, list(df.columns))
+    arrays = []
+    for field in schema:
+        column = df[field.name]
+        try:
+            arrays.append(pa.array(column, type=field.type, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. Decimal objects from a numeric source column: infer, then cast
+            arrays.append(pa.array(column, from_pandas=True).cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def arrow_to_records(table) -> List[Dict[str, Any]]:
+    """Warehouse records from an Arrow table: timestamps formatted, nulls as None"""
+    columns = []
+    for column in table.columns:
+        if pa.types.is_timestamp(column.type):
+            # Formatted to whole seconds, like DATETIME_FORMAT on the pandas path
+            column = pc.strftime(column.cast(pa.timestamp("s"), safe=False), format=DATETIME_FORMAT)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names).to_pylist()
+
+def mapped_records(df: pd.DataFrame, table_name: str) -> List[Dict[str, Any]]:
+    """Records for a mapped frame, encoded through Arrow when it is installed"""
+    if pa is not None:
+        try:
+            return arrow_to_records(frame_to_arrow(df, table_name))
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            logger.debug(f"Arrow conversion failed, using pandas: {str(e)}")
+    return frame_to_records(df)
+
+class StagingWriter:
+    """Append mapped batches to one Parquet staging file for a table"""
+
+    def __init__(self, table_name: str, source: Optional[str] = None, staging_dir: str = STAGING_DIR):
+        if pa is None:
+            raise StagingError("Staging requires pyarrow")
+        self.table_name = table_name
+        self.source = source
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.staging_id = f"{table_name}/{name}"
+        directory = os.path.join(staging_dir, table_name)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.parquet")
+        # Written under a temporary name until closed, so a file still being written is never replayed
+        self._tmp_path = f"{self.path}.tmp"
+        self._writer = None
+        self.row_count = 0
+
+    def write(self, df: pd.DataFrame, key_generated: bool = False):
+        """Append a mapped chunk; ``key_generated`` marks primary keys the mapping made up"""
+        table = frame_to_arrow(df, self.table_name)
+        if self._writer is None:
+            metadata = {
+                "staging.table": self.table_name,
+                "staging.source": self.source or "",
+                "staging.created_at": datetime.now().isoformat(),
+                "staging.key_generated": key_generated
+            }
+            schema = table.schema.with_metadata({k: json.dumps(v) for k, v in metadata.items()})
+            # Parquet support is imported with the first staged load rather than at startup
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(self._tmp_path, schema, compression="zstd")
+        # Each mapped chunk becomes one row group
+        self._writer.write_table(table)
+        self.row_count += table.num_rows
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """Finish the file and return its summary, or None if nothing was written"""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"Staged {self.row_count} rows for {self.table_name} at {self.path}")
+        return {"staging_id": self.staging_id, "rows": self.row_count, "bytes": os.path.getsize(self.path)}
+
+def staging_path(staging_id: str, staging_dir: str = STAGING_DIR) -> str:
+    if not _STAGING_ID.match(staging_id):
+        raise StagingError(f"Invalid staging id: {staging_id}")
+    path = os.path.join(staging_dir, f"{staging_id}.parquet")
+    if not os.path.exists(path):
+        raise StagingError(f"Staging file not found: {staging_id}")
+    return path
+
+def describe_staging_file(path: str, staging_dir: str = STAGING_DIR) -> Dict[str, Any]:
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_metadata(path)
+    extra = {k.decode(): json.loads(v) for k, v in (metadata.metadata or {}).items() if k.startswith(b"staging.")}
+    return {
+        "staging_id": os.path.relpath(path, staging_dir)[:-len(".parquet")].replace(os.sep, "/"),
+        "table": extra.get("staging.table"),
+        "source": extra.get("staging.source"),
+        "created_at": extra.get("staging.created_at"),
+        "key_generated": extra.get("staging.key_generated", False),
+        "rows": metadata.num_rows,
+        "row_groups": metadata.num_row_groups,
+        "bytes": os.path.getsize(path)
+    }
+
+def list_staging_files(table_name: Optional[str] = None, staging_dir: str = STAGING_DIR) -> List[Dict[str, Any]]:
+    # Only standard table names are joined into the path, never arbitrary input
+    if table_name and table_name not in SCHEMA_MAPPINGS:
+        raise StagingError(f"Unknown table: {table_name}")
+    if pa is None or not os.path.isdir(staging_dir):
+        return []
+    tables = [table_name] if table_name else sorted(os.listdir(staging_dir))
+    files = []
+    for table in tables:
+        directory = os.path.join(staging_dir, table)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".parquet"):
+                files.append(describe_staging_file(os.path.join(directory, name), staging_dir))
+    return files
+
+def iter_staged_tables(path: str, batch_size: Optional[int] = None) -> Iterator["pa.Table"]:
+    """Arrow tables read from a staging file, one record batch at a time"""
+    if pa is None:
+        raise StagingError("Staging requires pyarrow")
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size or STAGING_REPLAY_BATCH_SIZE):
+        yield pa.Table.from_batches([batch])
@@ -0,0 +1,235 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+from .preview import estimate_rows
+from .segments import quote_identifier
+
+logger = logging.getLogger(__name__)
+
+# Local file holding the high-water mark of every synced table
+SYNC_STATE_PATH = os.getenv("SYNC_STATE_PATH", "sync_state.json")
+SYNC_CHUNK_SIZE = int(os.getenv("SYNC_CHUNK_SIZE", "10000"))
+
+class SyncError(ValueError):
+    pass
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+class SyncStateStore:
+    """High-water marks per (source, table), persisted to a local JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._running = set()
+        self._states = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read sync state from {self.path}, starting empty: {str(e)}")
+            return {}
+
+    def _write(self):
+        # Write a temp file and rename it, so a crash never leaves a half-written state
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._states, f, indent=2, default=str)
+        os.replace(tmp_path, self.path)
+
+    def get(self, state_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._states.get(state_key)
+            return dict(state) if state else None
+
+    def update(self, state_key: str, **fields) -> Dict[str, Any]:
+        with self._lock:
+            state = self._states.setdefault(state_key, {})
+            state.update({k: _json_value(v) for k, v in fields.items()})
+            self._write()
+            return dict(state)
+
+    def reset(self, state_key: str):
+        with self._lock:
+            if self._states.pop(state_key, None) is not None:
+                self._write()
+
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(state) for state in self._states.values()]
+
+    def acquire(self, state_key: str):
+        """Mark a sync as running; two syncs of the same table would race on the watermark"""
+        with self._lock:
+            if state_key in self._running:
+                raise SyncError("A sync for this table is already running")
+            self._running.add(state_key)
+
+    def release(self, state_key: str):
+        with self._lock:
+            self._running.discard(state_key)
+
+def resolve_column(columns: List[str], name: str) -> str:
+    """Match a standard field name to a source column case-insensitively"""
+    for col in columns:
+        if col.lower() == name.lower():
+            return col
+    raise SyncError(f"Column {name} not found in source table")
+
+def delta_query(
+    table: str,
+    schema: Optional[str],
+    watermark_column: str,
+    key_column: str,
+    state: Optional[Dict[str, Any]]
+) -> Tuple[str, Dict[str, Any]]:
+    """Rows after the stored (watermark, key) position, in watermark order.
+
+    The key breaks ties, so rows sharing a watermark value are neither skipped
+    nor read twice across runs.
+    """
+    table_sql = quote_identifier(table)
+    if schema:
+        table_sql = f"{quote_identifier(schema)}.{table_sql}"
+    watermark_sql = quote_identifier(watermark_column)
+    key_sql = quote_identifier(key_column)
+
+    params: Dict[str, Any] = {}
+    if watermark_column == key_column:
+        conditions = []
+        order = key_sql
+        if state and state.get("key") is not None:
+            conditions.append(f"{key_sql} > :sync_key")
+            params["sync_key"] = state["key"]
+    else:
+        # Rows without a watermark cannot be positioned and are left out
+        conditions = [f"{watermark_sql} IS NOT NULL"]
+        order = f"{watermark_sql}, {key_sql}"
+        if state and state.get("watermark") is not None:
+            conditions.append(f"({watermark_sql}, {key_sql}) > (:sync_watermark, :sync_key)")
+            params["sync_watermark"] = state["watermark"]
+            params["sync_key"] = state["key"]
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT * FROM {table_sql}{where} ORDER BY {order}", params
+
+def sync_chunks(
+    source_db,
+    sql: str,
+    params: Dict[str, Any],
+    chunk_size: int
+) -> Iterable[pd.DataFrame]:
+    result = source_db.execute(
+        text(sql),
+        params,
+        execution_options={"stream_results": True, "yield_per": chunk_size}
+    )
+    columns = list(result.keys())
+    for rows in result.partitions(chunk_size):
+        yield pd.DataFrame(rows, columns=columns)
+
+def run_sync(
+    source_db,
+    store: SyncStateStore,
+    state_key: str,
+    table_name: str,
+    source_table: str,
+    source_schema: Optional[str],
+    columns: List[str],
+    primary_key: str,
+    watermark: str,
+    load_chunk: Callable[[pd.DataFrame], Dict[str, Any]],
+    chunk_size: Optional[int] = None,
+    full_refresh: bool = False,
+    progress: Optional[Callable[..., None]] = None
+) -> Dict[str, Any]:
+    """Pull rows past the stored watermark and load them chunk by chunk.
+
+    The watermark advances only after a chunk is fully loaded, so a failed run
+    resumes from the last complete chunk.
+    """
+    chunk_size = max(1, chunk_size or SYNC_CHUNK_SIZE)
+    watermark_column = resolve_column(columns, watermark)
+    key_column = resolve_column(columns, primary_key)
+
+    store.acquire(state_key)
+    try:
+        if full_refresh:
+            store.reset(state_key)
+        state = store.get(state_key)
+        if state and (state.get("watermark_column"), state.get("key_column")) != (watermark_column, key_column):
+            logger.info(f"Watermark columns changed for {table_name}, syncing from the start")
+            state = None
+
+        sql, params = delta_query(source_table, source_schema, watermark_column, key_column, state)
+        logger.info(f"Syncing {table_name} from {state.get('watermark') if state else 'the beginning'}")
+        if progress:
+            progress(total_rows=estimate_rows(source_db, sql, params))
+
+        started = time.perf_counter()
+        row_count = 0
+        inserted_count = 0
+        status = "completed"
+        error = None
+        for df in sync_chunks(source_db, sql, params, chunk_size):
+            if df.empty:
+                continue
+            load = load_chunk(df)
+            row_count += len(df)
+            inserted_count += load["inserted_count"]
+            if load["failed_count"]:
+                status = "failed"
+                error = f"{load['failed_count']} rows failed to load"
+                break
+            state = store.update(
+                state_key,
+                table=table_name,
+                source_table=source_table,
+                watermark_column=watermark_column,
+                key_column=key_column,
+                watermark=df[watermark_column].iloc[-1],
+                key=df[key_column].iloc[-1],
+                rows_synced=(state or {}).get("rows_synced", 0) + len(df)
+            )
+
+        elapsed = time.perf_counter() - started
+        state = store.update(
+            state_key,
+            table=table_name,
+            last_run_at=datetime.now().isoformat(),
+            last_status=status,
+            last_error=error,
+            last_row_count=row_count
+        )
+        logger.info(f"Sync of {table_name} {status}: {row_count} rows read, {inserted_count} upserted in {elapsed:.2f}s")
+        return {
+            "status": status,
+            "error": error,
+            "row_count": row_count,
+            "inserted_count": inserted_count,
+            "elapsed_seconds": round(elapsed, 3),
+            "state": state
+        }
+    finally:
+        store.release(state_key)
+
+sync_state = SyncStateStore(SYNC_STATE_PATH)
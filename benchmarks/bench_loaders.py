@@ -0,0 +1,140 @@
+"""Compare warehouse load backends: PostgREST JSON batches vs COPY + merge.
+
+Loads synthetic transactions into a Postgres database twice per size, once through
+the Supabase client (bulk_load) and once through copy_load, and reports rows/sec.
+The second COPY run hits existing keys, so it measures the upsert path.
+
+Without --postgrest-url a small PostgREST stand-in is started that inserts each
+JSON batch with json_populate_recordset, as PostgREST itself does.
+
+Usage: python -m benchmarks.bench_loaders --warehouse-url postgresql://postgres@127.0.0.1:5432/warehouse
+       [--rows 100000 500000] [--postgrest-url http://...] [--postgrest-key ...]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sqlalchemy import create_engine
+
+from app.copy_loader import copy_load
+from app.loader import bulk_load
+from app.main import to_warehouse_records
+from app.mapping import validate_and_map_data
+from benchmarks.datasets import make_transactions
+
+DDL = """
+DROP TABLE IF EXISTS public.transactions;
+CREATE TABLE public.transactions (
+    transaction_id BIGINT PRIMARY KEY,
+    customer_id BIGINT,
+    store_id BIGINT,
+    transaction_date TIMESTAMP,
+    total_amount DOUBLE PRECISION,
+    payment_method TEXT,
+    product_line_id BIGINT,
+    quantity BIGINT,
+    unit_price DOUBLE PRECISION
+)
+"""
+
+class PostgrestStandIn(BaseHTTPRequestHandler):
+    """Insert/upsert endpoint that writes JSON batches into Postgres"""
+
+    def do_POST(self):
+        table = urlparse(self.path).path.rsplit("/", 1)[-1]
+        on_conflict = parse_qs(urlparse(self.path).query).get("on_conflict", [None])[0]
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        columns = list(json.loads(body)[0].keys())
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        sql = (
+            f'INSERT INTO public."{table}" ({column_list}) '
+            f'SELECT {column_list} FROM json_populate_recordset(NULL::public."{table}", %s::json)'
+        )
+        if on_conflict:
+            updates = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in columns if c != on_conflict)
+            sql += f' ON CONFLICT ("{on_conflict}") DO UPDATE SET {updates}'
+
+        connection = self.server.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(sql, (body.decode(),))
+            connection.commit()
+        finally:
+            connection.close()
+
+        # return=minimal keeps the response small, like PostgREST without representation
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"[]")
+
+    def log_message(self, *args):
+        pass
+
+def start_standin(engine):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PostgrestStandIn)
+    server.engine = engine
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def count_rows(engine) -> int:
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("SELECT count(*) FROM public.transactions").scalar()
+
+def reset(engine):
+    with engine.begin() as connection:
+        connection.exec_driver_sql(DDL)
+
+def run(rows_list, warehouse_url, postgrest_url, postgrest_key, batch_size, max_in_flight):
+    from supabase import create_client
+
+    engine = create_engine(warehouse_url, pool_size=max_in_flight + 2)
+    server = None
+    if not postgrest_url:
+        server, postgrest_url = start_standin(engine)
+    supabase = create_client(postgrest_url, postgrest_key)
+
+    print(f"{'rows':>9} {'backend':<22} {'seconds':>8} {'rows/sec':>10} {'rows in table':>14}")
+    for rows in rows_list:
+        mapped = validate_and_map_data(make_transactions(rows), "transactions")
+
+        reset(engine)
+        started = time.perf_counter()
+        records = to_warehouse_records(mapped, "transactions")
+        result = bulk_load(supabase, "transactions", records, on_conflict="transaction_id", batch_size=batch_size, max_in_flight=max_in_flight)
+        elapsed = time.perf_counter() - started
+        print(f"{rows:>9} {'supabase (PostgREST)':<22} {elapsed:>8.2f} {rows / elapsed:>10.0f} {count_rows(engine):>14}"
+              + (f"  ({result['failed_count']} failed)" if result["failed_count"] else ""))
+
+        reset(engine)
+        for label in ("copy (insert)", "copy (upsert)"):
+            started = time.perf_counter()
+            result = copy_load(engine, "transactions", mapped, upsert=(label == "copy (upsert)"))
+            elapsed = time.perf_counter() - started
+            print(f"{rows:>9} {label:<22} {elapsed:>8.2f} {rows / elapsed:>10.0f} {count_rows(engine):>14}"
+                  + (f"  ({result['failed_count']} failed)" if result["failed_count"] else ""))
+
+    if server:
+        server.shutdown()
+    engine.dispose()
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--warehouse-url", default=os.getenv("WAREHOUSE_DATABASE_URL"))
+    parser.add_argument("--postgrest-url", default=None)
+    parser.add_argument("--postgrest-key", default="benchmark-key")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+    if not args.warehouse_url:
+        parser.error("--warehouse-url or WAREHOUSE_DATABASE_URL is required")
+    run(args.rows, args.warehouse_url, args.postgrest_url, args.postgrest_key, args.batch_size, args.max_in_flight)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,58 @@
+"""Compare the legacy per-cell serializer with the column-wise engine.
+
+Usage: python -m benchmarks.bench_serialization [--rows 100000 1000000]
+"""
+import argparse
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from app.serialization import frame_to_json, frame_to_records
+from benchmarks.datasets import make_transactions
+
+# The per-cell serializer app/main.py used before the column-wise engine, kept as the baseline
+def convert_to_json_serializable(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    elif isinstance(obj, (np.integer, np.int64)):
+        return int(obj)
+    elif isinstance(obj, (np.floating, np.float64)):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, dict):
+        return {k: convert_to_json_serializable(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_to_json_serializable(i) for i in obj]
+    elif pd.isna(obj):
+        return None
+    return obj
+
+def legacy(df: pd.DataFrame):
+    df = df.copy()
+    for col in df.select_dtypes(include=['datetime64']).columns:
+        df[col] = df[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return convert_to_json_serializable(df.to_dict('records'))
+
+def timed(fn, df):
+    started = time.perf_counter()
+    fn(df)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy':>10} {'records':>10} {'json':>10} {'speedup':>9}")
+    for rows in args.rows:
+        df = make_transactions(rows)
+        t_legacy = timed(legacy, df)
+        t_records = timed(frame_to_records, df)
+        t_json = timed(frame_to_json, df)
+        print(f"{rows:>10} {t_legacy:>9.2f}s {t_records:>9.2f}s {t_json:>9.2f}s {t_legacy / t_json:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
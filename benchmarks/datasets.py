@@ -0,0 +1,102 @@
+"""Synthetic datasets shaped like mock_data/*.csv, reproducible from a seed."""
+import numpy as np
+import pandas as pd
+
+FIRST_NAMES = ["John", "Emma", "Michael", "Sarah", "David", "Lisa", "James", "Anna", "Robert", "Maria"]
+LAST_NAMES = ["Smith", "Johnson", "Brown", "Davis", "Wilson", "Miller", "Taylor", "Anderson", "Thomas", "Moore"]
+CITIES = ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix", "Philadelphia", "San Antonio", "Seattle"]
+REGIONS = ["Northeast", "West", "Midwest", "South"]
+STORE_TYPES = ["Supermarket", "Hypermarket", "Express"]
+CATEGORIES = {
+    "Dairy": ["Milk", "Yogurt", "Cheese"],
+    "Bakery": ["Bread", "Pastry"],
+    "Produce": ["Fruits", "Vegetables"],
+    "Meat": ["Poultry", "Beef"],
+    "Pantry": ["Sauces", "Soups", "Pasta"],
+    "Household": ["Cleaning", "Paper Products"],
+    "Snacks": ["Chips", "Candy"],
+    "Beverages": ["Coffee", "Juice"],
+}
+PAYMENT_METHODS = ["Credit Card", "Cash", "Debit Card", "Mobile"]
+
+def _dates(rng, rows: int, start: str, days: int, with_time: bool = False) -> pd.Series:
+    unit = 24 * 3600 if not with_time else 1
+    offsets = rng.integers(0, days * 24 * 3600 // unit, rows)
+    return pd.Timestamp(start) + pd.to_timedelta(offsets * unit, unit="s")
+
+def make_transactions(rows: int, seed: int = 42, customers: int = 50000, stores: int = 50, product_lines: int = 200) -> pd.DataFrame:
+    """Synthetic frame shaped like mock_data/transactions.csv, with some nulls"""
+    rng = np.random.default_rng(seed)
+    quantity = rng.integers(1, 10, rows)
+    unit_price = rng.choice([1.8, 2.5, 3.25, 5.99, 12.0], rows)
+    total_amount = np.round(quantity * unit_price, 2)
+    total_amount[rng.random(rows) < 0.01] = np.nan
+    dates = _dates(rng, rows, "2024-01-01", 365, with_time=True)
+    return pd.DataFrame({
+        "transaction_id": np.arange(1, rows + 1),
+        "customer_id": rng.integers(1, customers, rows),
+        "store_id": rng.integers(1, stores, rows),
+        "product_line_id": rng.integers(1, product_lines, rows),
+        "transaction_date": dates,
+        "total_amount": total_amount,
+        "payment_method": rng.choice(PAYMENT_METHODS, rows),
+        "quantity": quantity,
+        "unit_price": unit_price,
+    })
+
+def make_customers(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Synthetic frame shaped like mock_data/customers.csv"""
+    rng = np.random.default_rng(seed)
+    first = rng.choice(FIRST_NAMES, rows)
+    last = rng.choice(LAST_NAMES, rows)
+    ids = np.arange(1, rows + 1)
+    return pd.DataFrame({
+        "customer_id": ids,
+        "first_name": first,
+        "last_name": last,
+        "email": [f"{f.lower()}.{l.lower()}{i}@email.com" for f, l, i in zip(first, last, ids)],
+        "phone": [f"555-{i % 10000:04d}" for i in ids],
+        "gender": rng.choice(["Male", "Female"], rows),
+        "birth_date": _dates(rng, rows, "1950-01-01", 50 * 365),
+        "registration_date": _dates(rng, rows, "2023-01-01", 730),
+        "address": [f"{n} Main St" for n in rng.integers(1, 999, rows)],
+        "city": rng.choice(CITIES, rows),
+    })
+
+def make_stores(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Synthetic frame shaped like mock_data/stores.csv"""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, rows + 1)
+    return pd.DataFrame({
+        "store_id": ids,
+        "store_name": [f"Store {i}" for i in ids],
+        "address": [f"{n} Market St" for n in rng.integers(1, 999, rows)],
+        "city": rng.choice(CITIES, rows),
+        "store_type": rng.choice(STORE_TYPES, rows),
+        "opening_date": _dates(rng, rows, "2015-01-01", 3650),
+        "region": rng.choice(REGIONS, rows),
+    })
+
+def make_product_lines(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Synthetic frame shaped like mock_data/product_lines.csv"""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, rows + 1)
+    category = rng.choice(list(CATEGORIES), rows)
+    return pd.DataFrame({
+        "product_line_id": ids,
+        "name": [f"Product {i}" for i in ids],
+        "category": category,
+        "subcategory": [CATEGORIES[c][i % len(CATEGORIES[c])] for c, i in zip(category, ids)],
+        "brand": rng.choice(["Nature's Best", "Healthy Baker", "Farm Fresh", "Premium Meats"], rows),
+        "unit_cost": np.round(rng.uniform(0.5, 15.0, rows), 2),
+    })
+
+GENERATORS = {
+    "transactions": make_transactions,
+    "customers": make_customers,
+    "stores": make_stores,
+    "product_lines": make_product_lines,
+}
+
+def make_dataset(table: str, rows: int, seed: int = 42) -> pd.DataFrame:
+    return GENERATORS[table](rows, seed=seed)
@@ -0,0 +1,112 @@
+"""Concurrent load test for /api/query against a slow stand-in source database.
+
+Each request spends --latency seconds inside the "database". If blocking work ran
+on the event loop the requests would serialise (wall time ~ requests * latency);
+on the worker pool wall time should approach requests / QUERY_CONCURRENCY * latency,
+and /api/tables should keep answering in milliseconds while the load runs.
+
+Usage: python -m benchmarks.load_test_endpoints [--requests 32] [--latency 0.25]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+import app.main as main
+
+class SlowResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def keys(self):
+        return ["store_id", "store_name", "address", "city", "store_type", "opening_date", "region"]
+
+    def fetchall(self):
+        return self.rows
+
+class SlowSession:
+    """Blocking session that simulates a slow source database"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def connection(self):
+        pass
+
+    def execute(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return SlowResult([(i, f"Store {i}", "1 Main St", "Springfield", "Supermarket", "2022-01-15", "West") for i in range(200)])
+
+    def close(self):
+        pass
+
+class StubWarehouse:
+    def table(self, name):
+        return self
+
+    def upsert(self, records, **kwargs):
+        self.records = records
+        return self
+
+    insert = upsert
+
+    def execute(self):
+        time.sleep(0.01)
+        return type("Response", (), {"data": self.records})()
+
+async def probe_latency(client, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/api/tables")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.02)
+
+async def run(requests: int, latency: float):
+    main.create_source_connection = lambda **kwargs: SlowSession(latency)
+    main.get_supabase = lambda: StubWarehouse()
+
+    body = {
+        "table": "stores",
+        "query": "SELECT * FROM stores",
+        "connection_details": {"host": "h", "port": "5432", "database": "d", "username": "u", "password": "p"},
+    }
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        stop = asyncio.Event()
+        probes = []
+        prober = asyncio.create_task(probe_latency(client, stop, probes))
+
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/api/query", json=body) for _ in range(requests)))
+        wall = time.perf_counter() - started
+
+        stop.set()
+        await prober
+
+    failed = sum(1 for r in responses if r.status_code != 200)
+    print(f"requests:            {requests} ({failed} failed)")
+    if failed:
+        # Timings of failed requests say nothing about the worker pool
+        first = next(r for r in responses if r.status_code != 200)
+        print(f"first failure:       {first.status_code} {first.text[:200]}")
+        return failed
+    print(f"source latency:      {latency:.2f}s")
+    print(f"wall time:           {wall:.2f}s (serialised would be {requests * latency:.2f}s)")
+    print(f"throughput:          {requests / wall:.1f} req/s")
+    if probes:
+        print(f"/api/tables p50/max: {statistics.median(probes) * 1000:.1f}ms / {max(probes) * 1000:.1f}ms")
+    return 0
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.25)
+    args = parser.parse_args()
+    if asyncio.run(run(args.requests, args.latency)):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,364 @@
+"""Reproducible benchmark suite for ingestion, query and mapping/serialization paths.
+
+Generates synthetic datasets shaped like mock_data/*.csv at each --rows size, loads
+them into a source database (a local Postgres via --source-url, or a SQLite file
+stand-in) and drives the FastAPI app in process against a stubbed warehouse.
+Each scenario reports throughput, p50/p99 latency over --requests runs and peak
+RSS, and the whole run is written as JSON so commits can be compared:
+
+    python -m benchmarks.suite --rows 10000 100000 --output before.json
+    python -m benchmarks.suite --rows 10000 100000 --compare before.json
+
+Scenarios:
+    map           validate_and_map_data on each table
+    serialize     frame_to_json and to_warehouse_records on mapped transactions
+    query         POST /api/query, whole result in one response
+    query_stream  POST /api/query with stream=true (server-side cursor, chunked loads)
+    upload        POST /api/upload/transactions with a CSV file
+
+Usage: python -m benchmarks.suite [--rows 10000 100000 1000000] [--scenarios ...]
+       [--source-url postgresql://postgres@127.0.0.1:5432/bench] [--requests 5]
+       [--concurrency 1] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+import app.main as main
+from app.mapping import validate_and_map_data
+from app.serialization import frame_to_json
+from benchmarks.datasets import GENERATORS, make_dataset
+
+SCENARIOS = ("map", "serialize", "query", "query_stream", "upload")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Dimension tables scale down with the fact table, like the mock data
+DIMENSION_RATIO = {"transactions": 1, "customers": 10, "stores": 1000, "product_lines": 500}
+
+class StubWarehouse:
+    """Supabase stand-in that accepts every batch after an optional round-trip delay"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def table(self, name):
+        return StubRequest(self.latency)
+
+class StubRequest:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.records = []
+
+    def upsert(self, records, **kwargs):
+        self.records = records
+        return self
+
+    insert = upsert
+
+    def execute(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return type("Response", (), {"data": self.records})()
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS mark so each scenario reports its own peak (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is the process-wide peak: KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentile(samples, fraction: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def summarize(scenario: str, table: str, rows: int, latencies, wall: float, peak_scoped: bool) -> dict:
+    processed = rows * len(latencies)
+    return {
+        "scenario": scenario,
+        "table": table,
+        "rows": rows,
+        "runs": len(latencies),
+        "wall_seconds": round(wall, 4),
+        "rows_per_second": round(processed / wall, 1) if wall > 0 else None,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_scope": "scenario" if peak_scoped else "process",
+    }
+
+def measure(scenario: str, table: str, rows: int, runs: int, fn) -> dict:
+    """Call fn() runs times in a row, timing each call"""
+    peak_scoped = reset_peak_rss()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(runs):
+        call_started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(scenario, table, rows, latencies, time.perf_counter() - started, peak_scoped)
+
+async def measure_requests(client, scenario: str, table: str, rows: int, runs: int, concurrency: int, send) -> dict:
+    """Send runs requests with at most concurrency in flight, timing each response"""
+    peak_scoped = reset_peak_rss()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies = []
+    failures = []
+
+    async def one():
+        async with semaphore:
+            call_started = time.perf_counter()
+            response = await send(client)
+            latencies.append(time.perf_counter() - call_started)
+            if response.status_code != 200:
+                failures.append(response.text[:200])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(runs)))
+    result = summarize(scenario, table, rows, latencies, time.perf_counter() - started, peak_scoped)
+    result["concurrency"] = concurrency
+    result["failed"] = len(failures)
+    if failures:
+        result["error"] = failures[0]
+    return result
+
+def load_source(engine, datasets: dict):
+    """Write each dataset to the source database, replacing earlier runs"""
+    for table, df in datasets.items():
+        if engine.dialect.name == "postgresql":
+            df.head(0).to_sql(table, engine, if_exists="replace", index=False)
+            buffer = io.StringIO()
+            df.to_csv(buffer, index=False, header=False)
+            connection = engine.raw_connection()
+            try:
+                with connection.cursor() as cursor:
+                    with cursor.copy(f'COPY "{table}" FROM STDIN WITH (FORMAT csv)') as copy:
+                        copy.write(buffer.getvalue())
+                connection.commit()
+            finally:
+                connection.close()
+        else:
+            df.to_sql(table, engine, if_exists="replace", index=False, chunksize=50000)
+
+def connection_details(source_url: str) -> dict:
+    url = make_url(source_url)
+    return {
+        "host": url.host or "localhost",
+        "port": str(url.port or 5432),
+        "database": url.database,
+        "username": url.username or "",
+        "password": url.password or "",
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+async def run_endpoints(scenarios, rows: int, datasets: dict, details: dict, args) -> list:
+    results = []
+    query = f"SELECT * FROM transactions WHERE transaction_id <= {rows}"
+    query_body = {
+        "table": "transactions",
+        "query": query,
+        "connection_details": details,
+        "preview_rows": 0,
+    }
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        if "query" in scenarios:
+            results.append(await measure_requests(
+                client, "query", "transactions", rows, args.requests, args.concurrency,
+                lambda c: c.post("/api/query", json=query_body)
+            ))
+        if "query_stream" in scenarios:
+            body = {**query_body, "stream": True, "chunk_size": args.chunk_size}
+            results.append(await measure_requests(
+                client, "query_stream", "transactions", rows, args.requests, args.concurrency,
+                lambda c: c.post("/api/query", json=body)
+            ))
+        if "upload" in scenarios:
+            csv_bytes = datasets["transactions"].head(rows).to_csv(index=False).encode()
+            results.append(await measure_requests(
+                client, "upload", "transactions", rows, args.requests, args.concurrency,
+                lambda c: c.post(
+                    "/api/upload/transactions",
+                    params={"chunk_size": args.chunk_size},
+                    files={"file": ("transactions.csv", csv_bytes, "text/csv")}
+                )
+            ))
+    return results
+
+def run(args) -> dict:
+    scenarios = set(args.scenarios)
+    main.get_supabase = lambda: StubWarehouse(args.warehouse_latency)
+    largest = max(args.rows)
+
+    print(f"Generating datasets for up to {largest} transactions", file=sys.stderr)
+    datasets = {
+        table: make_dataset(table, max(1, largest // DIMENSION_RATIO[table]), seed=args.seed)
+        for table in GENERATORS
+    }
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    source_url = args.source_url or f"sqlite:///{os.path.join(workdir, 'source.db')}"
+    engine = create_engine(source_url)
+    details = None
+    endpoint_scenarios = scenarios & {"query", "query_stream", "upload"}
+    if endpoint_scenarios - {"upload"}:
+        print(f"Loading source database {engine.url.render_as_string(hide_password=True)}", file=sys.stderr)
+        load_source(engine, datasets)
+        if engine.dialect.name == "postgresql":
+            # Exercise the real pooled source engine path
+            details = connection_details(source_url)
+        else:
+            factory = sessionmaker(bind=engine)
+            main.create_source_connection = lambda **kwargs: factory()
+            details = {"host": "sqlite", "port": "0", "database": "source", "username": "bench", "password": "bench"}
+
+    results = []
+    for rows in sorted(args.rows):
+        print(f"Running {rows} rows", file=sys.stderr)
+        if "map" in scenarios:
+            for table in GENERATORS:
+                count = max(1, rows // DIMENSION_RATIO[table])
+                df = datasets[table].head(count)
+                results.append(measure("map", table, count, args.requests, lambda: validate_and_map_data(df, table)))
+        if "serialize" in scenarios:
+            mapped = validate_and_map_data(datasets["transactions"].head(rows), "transactions")
+            results.append(measure("serialize", "transactions", rows, args.requests, lambda: frame_to_json(mapped)))
+            results.append(measure(
+                "warehouse_records", "transactions", rows, args.requests,
+                lambda: main.to_warehouse_records(mapped, "transactions")
+            ))
+        if endpoint_scenarios:
+            results.extend(asyncio.run(run_endpoints(scenarios, rows, datasets, details, args)))
+
+    engine.dispose()
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "rows": sorted(args.rows),
+            "scenarios": sorted(scenarios),
+            "source": engine.dialect.name,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "chunk_size": args.chunk_size,
+            "warehouse_latency": args.warehouse_latency,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+def result_key(result: dict) -> tuple:
+    return (result["scenario"], result["table"], result["rows"])
+
+def print_results(report: dict):
+    print(f"{'scenario':<18} {'table':<14} {'rows':>9} {'rows/sec':>12} {'p50 ms':>10} {'p99 ms':>10} {'peak MB':>9}")
+    for r in report["results"]:
+        print(f"{r['scenario']:<18} {r['table']:<14} {r['rows']:>9} {r['rows_per_second'] or 0:>12.0f} "
+              f"{r['p50_ms']:>10.1f} {r['p99_ms']:>10.1f} {r['peak_rss_mb']:>9.1f}"
+              + (f"  ({r['failed']} failed)" if r.get("failed") else ""))
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Print throughput and p99 changes against a baseline run; return the regressions"""
+    previous = {result_key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit', '?')} ({baseline.get('created_at', '?')}):")
+    changed = [k for k in ("source", "requests", "concurrency", "chunk_size", "warehouse_latency", "seed")
+               if baseline.get("config", {}).get(k) != report["config"][k]]
+    if changed:
+        print(f"Note: the runs differ in {', '.join(changed)}, so the numbers are not like for like")
+    print(f"{'scenario':<18} {'table':<14} {'rows':>9} {'rows/sec':>10} {'p99':>10}")
+    for r in report["results"]:
+        old = previous.get(result_key(r))
+        if old is None or not old.get("rows_per_second") or not r.get("rows_per_second"):
+            continue
+        throughput = r["rows_per_second"] / old["rows_per_second"] - 1
+        p99 = r["p99_ms"] / old["p99_ms"] - 1 if old["p99_ms"] else 0.0
+        flag = ""
+        if throughput < -threshold:
+            flag = "  REGRESSION"
+            regressions.append({"scenario": r["scenario"], "table": r["table"], "rows": r["rows"], "change": round(throughput, 3)})
+        print(f"{r['scenario']:<18} {r['table']:<14} {r['rows']:>9} {throughput:>+9.1%} {p99:>+9.1%}{flag}")
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--source-url", default=None, help="Postgres source database; defaults to a SQLite stand-in")
+    parser.add_argument("--requests", type=int, default=5, help="Runs per scenario and size")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight for endpoint scenarios")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--warehouse-latency", type=float, default=0.0, help="Seconds per stubbed warehouse batch")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="JSON results file; defaults to benchmarks/results/<commit>-<time>.json")
+    parser.add_argument("--compare", default=None, help="Earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Throughput drop reported as a regression")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        for name in ("app", "httpx"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    report = run(args)
+    print_results(report)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{report['commit']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -46,6 +46,46 @@ const CONNECTION_STORAGE_KEY = 'postgres_connection';
 const CONNECTION_EXPIRY_KEY = 'postgres_connection_expiry';
 const ONE_HOUR_MS = 60 * 60 * 1000; // 1 hour in milliseconds
 
+// Run /api/query as NDJSON so rows can be shown while the rest is still loading.
+// onRows gets each batch of rows; the returned promise resolves to the load summary
+// sent on the last line.
+const streamQuery = async (requestData, onRows) => {
+  const response = await fetch(`${API_BASE_URL}/api/query`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'application/x-ndjson' },
+    body: JSON.stringify(requestData)
+  });
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({}));
+    const error = new Error(body.detail || 'Failed to execute query');
+    error.response = { data: body };
+    throw error;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  let summary = null;
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+    const lines = buffered.split('\n');
+    buffered = done ? '' : lines.pop();
+    const rows = [];
+    for (const line of lines) {
+      if (!line) continue;
+      const record = JSON.parse(line);
+      if (record._summary) {
+        summary = record._summary;
+      } else {
+        rows.push(record);
+      }
+    }
+    if (rows.length) onRows(rows);
+    if (done) return summary;
+  }
+};
+
 function App() {
   const [selectedTable, setSelectedTable] = useState('');
   const [query, setQuery] = useState('');
@@ -201,25 +241,29 @@ function App() {
         }
       });
 
-      const response = await axios.post(`${API_BASE_URL}/api/query`, requestData);
+      setResults({ data: [], columns: [], row_count: 0 });
+      const summary = await streamQuery(requestData, (rows) => {
+        setResults((previous) => ({
+          data: previous.data.concat(rows),
+          columns: previous.columns.length ? previous.columns : Object.keys(rows[0]),
+          row_count: previous.row_count + rows.length
+        }));
+      });
 
-      console.log('Query response:', response.data);
+      console.log('Query summary:', summary);
 
-      if (response.data.success) {
-        setResults({
-          data: response.data.data,
-          columns: response.data.columns,
-          row_count: response.data.row_count
-        });
+      if (summary?.success) {
+        setResults((previous) => ({ ...previous, columns: summary.columns, row_count: summary.row_count }));
 
         toast.success(
           `Query executed successfully!\n` +
-          `Retrieved ${response.data.row_count} rows from source database.\n` +
-          `Inserted ${response.data.inserted_count} rows into data warehouse.`
+          `Retrieved ${summary.row_count} rows from source database.\n` +
+          `Inserted ${summary.inserted_count} rows into data warehouse.`
         );
       } else {
-        setError('Query executed but returned no results');
-        toast.warning('Query returned no results');
+        const error = new Error(summary?.error || 'Query stopped before all rows were loaded');
+        error.response = { data: { detail: summary?.error } };
+        throw error;
       }
     } catch (err) {
       console.error('Query error:', err);
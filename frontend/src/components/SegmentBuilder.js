@@ -211,6 +211,8 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
   const [previewOpen, setPreviewOpen] = useState(false);
   const [previewData, setPreviewData] = useState([]);
   const [previewLoading, setPreviewLoading] = useState(false);
+  const [previewCursor, setPreviewCursor] = useState(null);
+  const [previewTotal, setPreviewTotal] = useState(null);
 
   // Add these new states for SQL editing
   const [sqlDialogOpen, setSqlDialogOpen] = useState(false);
@@ -342,7 +344,7 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
         // Process the tables into datasets
         const processedDatasets = {};
         for (const tableInfo of response.data) {
-          const { table_name, columns, description, schema_name } = tableInfo;
+          const { table_name, columns, column_types, description, schema_name } = tableInfo;
           
           // Only include tables we're interested in
           if (desiredTables.includes(table_name.toLowerCase())) {
@@ -370,7 +372,8 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
               name: table_name,
               schema: schema_name,
               description: description || `${table_name} data`,
-              fields: columns || []
+              fields: columns || [],
+              columnTypes: column_types || {}
             };
           }
         }
@@ -445,7 +448,7 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
       if (!forceRefresh && tableInfo.fields && Array.isArray(tableInfo.fields) && tableInfo.fields.length > 0) {
         const formattedAttributes = tableInfo.fields.map(field => ({
           name: field,
-          type: determineFieldType(field)
+          type: determineFieldType(field, tableInfo.columnTypes?.[field])
         }));
         
         setAttributes(formattedAttributes);
@@ -468,7 +471,8 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
       
       try {
         const url = new URL(connectionUrl);
-        const tableName = tableInfo.name.toLowerCase();
+        // Sent as listed: the catalog matches table names exactly, and quoted names keep their case
+        const tableName = tableInfo.name;
         
         // Parse the connection URL to get individual components
         const username = url.username;
@@ -487,13 +491,16 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
             database: database,
             username: username,
             password: password,
-            table: tableName
+            table: tableName,
+            schema: tableInfo.schema,
+            // Bypass the server-side catalog cache when the user asks for a refresh
+            refresh: forceRefresh
           }
         });
         
         // Find the table in the response
         const tableData = response.data.find(table => 
-          table.table_name.toLowerCase() === tableName
+          table.table_name === tableName
         );
         
         if (tableData && Array.isArray(tableData.columns) && tableData.columns.length > 0) {
@@ -502,14 +509,15 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
             ...prevDatasets,
             [datasetName]: {
               ...prevDatasets[datasetName],
-              fields: tableData.columns
+              fields: tableData.columns,
+              columnTypes: tableData.column_types || {}
             }
           }));
           
           // Create formatted attributes from the column data
           const formattedAttributes = tableData.columns.map(field => ({
             name: field,
-            type: determineFieldType(field)
+            type: determineFieldType(field, tableData.column_types?.[field])
           }));
           
           setAttributes(formattedAttributes);
@@ -607,6 +615,37 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
       });
   };
 
+  // Store the segment on the server and materialize its members; the local copy stays the source for the UI
+  const materializeSegment = async (segment) => {
+    const connectionUrl = localStorage.getItem('postgres_connection');
+    if (!connectionUrl || !datasets[selectedDataset]) {
+      return;
+    }
+
+    try {
+      const url = new URL(connectionUrl);
+      const response = await axios.put(`${API_BASE_URL}/api/segments/${encodeURIComponent(segment.id)}`, {
+        name: segment.name,
+        table: datasets[selectedDataset].name,
+        schema_name: datasets[selectedDataset].schema,
+        root_operator: rootOperator,
+        conditions: [...conditions, ...conditionGroups],
+        connection_details: {
+          host: url.hostname,
+          port: url.port,
+          database: url.pathname.replace('/', ''),
+          username: url.username,
+          password: url.password
+        }
+      });
+      console.log(`✅ [SegmentBuilder] Materialized segment with ${response.data?.segment?.member_count} members`);
+    } catch (error) {
+      const errorDetail = error.response?.data?.detail || error.message;
+      console.error('❌ [SegmentBuilder] Error materializing segment:', errorDetail?.replace(/postgresql:\/\/[^:]+:[^@]+@/g, 'postgresql://****:****@'));
+      toast.warning('Segment saved locally, but its membership could not be materialized on the server');
+    }
+  };
+
   // Update the handleSaveSegment function to pass the new segment data back to the parent component
   const handleSaveSegment = () => {
     try {
@@ -658,7 +697,10 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
       
       // Save back to localStorage
       localStorage.setItem('segments', JSON.stringify(storedSegments));
-      
+
+      // Persist the definition server-side too, so its membership is materialized for set operations
+      materializeSegment(segment);
+
       toast.success(`Segment ${editSegment ? 'updated' : 'created'} successfully!`);
       
       // Reset unsaved changes flag
@@ -1727,13 +1769,12 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
   };
 
   // Function to fetch preview data based on current conditions
-  const fetchPreviewData = async () => {
+  // Pass the cursor of the previous page to append the next one
+  const fetchPreviewData = async (cursor = null) => {
     setPreviewLoading(true);
     setPreviewOpen(true); // Open dialog immediately to show loading state
     
     try {
-      const sqlQuery = generateSQLPreview();
-      
       // Get connection URL from localStorage
       const connectionUrl = localStorage.getItem('postgres_connection');
       
@@ -1743,9 +1784,6 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
         return;
       }
       
-      // Only log the query, not the connection details
-      console.log("Executing SQL query for preview:", sqlQuery);
-      
       try {
         const url = new URL(connectionUrl);
         const username = url.username;
@@ -1754,10 +1792,14 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
         const port = url.port;
         const database = url.pathname.replace('/', '');
         
-        // Format request data to match what the API expects
+        // Send the condition tree; the server compiles it to parameterized SQL
         const requestData = {
           table: datasets[selectedDataset].name,
-          query: sqlQuery,
+          schema_name: datasets[selectedDataset].schema,
+          root_operator: rootOperator,
+          conditions: [...conditions, ...conditionGroups],
+          limit: 100,
+          cursor,
           connection_details: {
             host,
             port,
@@ -1770,7 +1812,7 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
         // Log request WITHOUT showing password
         console.log("Sending request to API with connection details:", {
           table: requestData.table,
-          query: requestData.query,
+          conditions: requestData.conditions,
           connection_details: {
             host: requestData.connection_details.host,
             port: requestData.connection_details.port,
@@ -1781,18 +1823,22 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
         });
         
         // Call the API endpoint
-        const response = await axios.post(`${API_BASE_URL}/api/query`, requestData);
+        const response = await axios.post(`${API_BASE_URL}/api/segments/preview`, requestData);
         
         // Only log the success status, not the full response which might contain sensitive data
+        console.log(`Executed SQL: ${response.data?.sql}`);
         console.log(`Query executed successfully. Status: ${response.status}, Records: ${response.data?.data?.length || 0}`);
         
         // Process the response as before
         if (response.data && response.data.success) {
-          setPreviewData(response.data.data || []);
+          const rows = response.data.data || [];
+          setPreviewData(prev => cursor ? [...prev, ...rows] : rows);
+          setPreviewCursor(response.data.next_cursor || null);
+          setPreviewTotal(response.data.exact_total ?? response.data.approximate_total ?? null);
           
-          if (response.data.data && response.data.data.length > 0) {
-            toast.success(`Retrieved ${response.data.data.length} records`);
-          } else {
+          if (rows.length > 0) {
+            toast.success(`Retrieved ${rows.length} records`);
+          } else if (!cursor) {
             toast.warning("Query executed successfully but returned no records");
           }
         } else {
@@ -1855,7 +1901,7 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
             </Typography>
             <Typography variant="body2" color="text.secondary">
               {previewData.length > 0 
-                ? `Showing ${previewData.length} records` 
+                ? `Showing ${previewData.length}${previewTotal !== null ? ` of ~${previewTotal}` : ''} records` 
                 : previewLoading 
                   ? 'Loading...' 
                   : 'No records found'}
@@ -1863,7 +1909,7 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
           </Box>
         </DialogTitle>
         <DialogContent dividers sx={{ minHeight: 300 }}>
-          {previewLoading ? (
+          {previewLoading && previewData.length === 0 ? (
             <Box sx={{ display: 'flex', justifyContent: 'center', alignItems: 'center', height: '100%', p: 3 }}>
               <Typography>Loading preview data...</Typography>
             </Box>
@@ -1913,6 +1959,15 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
           >
             Copy SQL
           </Button>
+          {previewCursor && (
+            <Button
+              variant="outlined"
+              onClick={() => fetchPreviewData(previewCursor)}
+              disabled={previewLoading}
+            >
+              {previewLoading ? 'Loading...' : 'Load more'}
+            </Button>
+          )}
           <Button onClick={handleClosePreview}>Close</Button>
         </DialogActions>
       </Dialog>
@@ -2356,7 +2411,7 @@ const SegmentBuilder = ({ onBack, editSegment }) => {
           <Button 
             variant="outlined" 
             sx={{ mx: 0.5 }}
-            onClick={fetchPreviewData}
+            onClick={() => fetchPreviewData()}
             disabled={previewLoading}
           >
             {previewLoading ? 'Loading...' : 'Preview Results'}
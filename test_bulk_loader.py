@@ -0,0 +1,114 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("supabase")
+from supabase import create_client
+
+from app.loader import bulk_load
+
+class PostgrestStandIn(BaseHTTPRequestHandler):
+    """Minimal PostgREST insert/upsert endpoint backed by a dict per table"""
+
+    def do_POST(self):
+        server = self.server
+        table = urlparse(self.path).path.rsplit("/", 1)[-1]
+        on_conflict = parse_qs(urlparse(self.path).query).get("on_conflict", [None])[0]
+        rows = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        with server.lock:
+            server.requests += 1
+            if server.fail_next > 0:
+                server.fail_next -= 1
+                status, code = server.failure
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"message": "failed", "code": code}).encode())
+                return
+            store = server.tables.setdefault(table, {})
+            for row in rows:
+                key = row[on_conflict] if on_conflict else len(store)
+                if key in store and "merge-duplicates" not in self.headers.get("Prefer", ""):
+                    self.send_response(409)
+                    self.end_headers()
+                    return
+                store[key] = row
+
+        body = json.dumps(rows).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def postgrest():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PostgrestStandIn)
+    server.lock = threading.Lock()
+    server.tables = {}
+    server.requests = 0
+    server.fail_next = 0
+    # HTTP status and error code of the failed requests
+    server.failure = (503, "503")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def supabase(postgrest):
+    return create_client(f"http://127.0.0.1:{postgrest.server_address[1]}", "test-key")
+
+def make_records(n):
+    return [{"store_id": i, "store_name": f"Store {i}"} for i in range(n)]
+
+def test_bulk_load_splits_into_batches(postgrest, supabase):
+    result = bulk_load(supabase, "stores", make_records(25), on_conflict="store_id", batch_size=10, max_in_flight=3)
+
+    assert result["inserted_count"] == 25
+    assert result["failed_count"] == 0
+    assert [b["rows"] for b in result["batches"]] == [10, 10, 5]
+    assert len(postgrest.tables["stores"]) == 25
+
+def test_bulk_load_retries_failed_batches(postgrest, supabase):
+    postgrest.fail_next = 2
+
+    result = bulk_load(supabase, "stores", make_records(10), on_conflict="store_id", batch_size=5, max_in_flight=1, backoff=0)
+
+    assert result["inserted_count"] == 10
+    assert result["batches"][0]["attempts"] == 3
+    assert postgrest.requests == 4
+
+def test_bulk_load_reports_exhausted_batches(postgrest, supabase):
+    postgrest.fail_next = 100
+
+    result = bulk_load(supabase, "stores", make_records(10), batch_size=5, max_retries=1, backoff=0)
+
+    assert result["inserted_count"] == 0
+    assert result["failed_count"] == 10
+    assert all(b["error"] for b in result["batches"])
+
+def test_upsert_makes_reloads_idempotent(postgrest, supabase):
+    bulk_load(supabase, "stores", make_records(10), on_conflict="store_id", batch_size=4)
+    result = bulk_load(supabase, "stores", make_records(10), on_conflict="store_id", batch_size=4)
+
+    assert result["failed_count"] == 0
+    assert len(postgrest.tables["stores"]) == 10
+
+def test_constraint_violations_are_not_retried(postgrest, supabase):
+    # What PostgREST returns for a unique violation; no retry can fix it
+    postgrest.fail_next = 100
+    postgrest.failure = (409, "23505")
+
+    result = bulk_load(supabase, "stores", make_records(5), max_retries=3, backoff=0)
+
+    assert result["failed_count"] == 5
+    assert result["batches"][0]["attempts"] == 1
+    assert postgrest.requests == 1
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+pytest.importorskip("pyarrow")
+import app.main as main
+from app.staging import describe_staging_file, staging_path
+
+class SourceResult:
+    def __init__(self, columns, rows):
+        self.columns, self.rows = columns, rows
+
+    def keys(self):
+        return self.columns
+
+    def fetchall(self):
+        return self.rows
+
+class SourceSession:
+    """Source session returning fixed rows for any query"""
+
+    def __init__(self, columns, rows):
+        self.result = SourceResult(columns, rows)
+
+    def connection(self):
+        pass
+
+    def execute(self, statement, *args, **kwargs):
+        return self.result
+
+    def close(self):
+        pass
+
+class WarehouseTable:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def insert(self, rows, **kwargs):
+        self.calls.append(("insert", rows))
+        self.rows = rows
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.calls.append(("upsert", rows))
+        self.rows = rows
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})()
+
+class Warehouse:
+    def __init__(self):
+        self.calls = []
+
+    def table(self, name):
+        return WarehouseTable(self.calls)
+
+@pytest.fixture
+def warehouse(monkeypatch, tmp_path):
+    # Staging files go to the relative STAGING_DIR
+    monkeypatch.chdir(tmp_path)
+    stub = Warehouse()
+    monkeypatch.setattr(main, "get_supabase", lambda: stub)
+    monkeypatch.setattr(
+        main, "create_source_connection",
+        lambda **details: SourceSession(["first_name", "email"], [("Ada", "ada@example.com"), ("Bo", "bo@example.com")])
+    )
+    return stub
+
+def query_request(**options):
+    details = {"host": "localhost", "port": "5432", "database": "retail", "username": "u", "password": "p"}
+    return main.QueryRequest(
+        table="customers", query="SELECT first_name, email FROM people",
+        connection_details=details, quality_checks=False, **options
+    )
+
+def test_upsert_refused_when_the_source_has_no_key_column(warehouse):
+    with pytest.raises(HTTPException) as error:
+        main.run_query(query_request(upsert=True))
+
+    assert error.value.status_code == 400
+    assert "Cannot upsert into customers" in error.value.detail
+    assert warehouse.calls == []
+
+def test_staged_load_records_the_generated_key(warehouse):
+    response = main.run_query(query_request(stage=True))
+    result = json.loads(response.body)
+
+    assert result["inserted_count"] == 2
+    assert [kind for kind, _ in warehouse.calls] == ["insert"]
+    staged = describe_staging_file(staging_path(result["staging"]["staging_id"]))
+    assert staged["key_generated"] is True
@@ -0,0 +1,57 @@
+import json
+
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+from app.result_stream import SUMMARY_KEY, arrow_stream, result_schema
+
+# Postgres type OIDs, as in cursor.description
+INT4, TEXT, VARCHAR, TIMESTAMPTZ = 23, 25, 1043, 1184
+
+def frames(*chunks, summary=None):
+    for chunk in chunks:
+        yield pd.DataFrame(chunk)
+    return summary or {"success": True}
+
+def read_stream(chunks):
+    reader = pa.ipc.open_stream(b"".join(chunks))
+    batches, metadata = [], None
+    while True:
+        try:
+            batch, metadata = reader.read_next_batch_with_custom_metadata()
+        except StopIteration:
+            break
+        batches.append(batch)
+    # The summary is in the metadata of the last, empty batch
+    return reader.schema, pa.Table.from_batches(batches, reader.schema), metadata
+
+def test_text_columns_named_like_mapped_fields_stay_strings():
+    # customer_id and transaction_date are int and date fields in SCHEMA_MAPPINGS
+    description = [("customer_id", VARCHAR), ("transaction_date", TEXT), ("quantity", INT4)]
+    chunks = arrow_stream(
+        frames({"customer_id": ["C001"], "transaction_date": ["03/04/2024"], "quantity": [2]}),
+        result_schema(description)
+    )
+
+    schema, table, metadata = read_stream(chunks)
+
+    assert schema.types == [pa.string(), pa.string(), pa.int64()]
+    assert table.to_pylist() == [{"customer_id": "C001", "transaction_date": "03/04/2024", "quantity": 2}]
+    assert json.loads(metadata[SUMMARY_KEY.encode()]) == {"success": True}
+
+def test_columns_null_in_the_first_chunk_keep_their_type():
+    description = [("quantity", INT4), ("paid_at", TIMESTAMPTZ)]
+    chunks = arrow_stream(
+        frames(
+            {"quantity": [None], "paid_at": [None]},
+            {"quantity": [3], "paid_at": [pd.Timestamp("2024-03-04 10:00", tz="Europe/Berlin")]}
+        ),
+        result_schema(description)
+    )
+
+    schema, table, _ = read_stream(chunks)
+
+    assert schema.types == [pa.int64(), pa.timestamp("us", tz="UTC")]
+    assert table.column("quantity").to_pylist() == [None, 3]
+    assert table.column("paid_at")[1].as_py() == pd.Timestamp("2024-03-04 09:00", tz="UTC")
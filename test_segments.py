@@ -0,0 +1,126 @@
+import pytest
+
+from app.segments import _OPERATORS, SegmentCompileError, SegmentCondition, compile_segment
+
+def condition(field, operator, value=None, value2=None):
+    return SegmentCondition(type="attribute", field=field, operator=operator, value=value, value2=value2)
+
+def group(operator, *conditions):
+    return SegmentCondition(type="group", operator=operator, conditions=list(conditions))
+
+def compile_one(node, **options):
+    return compile_segment("customers", "public", "AND", [node], **options)
+
+@pytest.mark.parametrize("operator", sorted(_OPERATORS))
+def test_every_operator_binds_one_value_per_placeholder(operator):
+    compiled, params = compile_one(condition("city", operator, "x", "y"))
+
+    # The filter placeholders plus the LIMIT
+    assert compiled.param_count == len(params)
+    for i in range(compiled.param_count):
+        assert f":p{i}" in compiled.sql
+    assert compiled.sql.startswith('SELECT * FROM "public"."customers" WHERE ')
+
+def test_comparison_values_are_bound_unchanged():
+    compiled, params = compile_one(condition("age", "between", 18, 30))
+
+    assert compiled.base_sql == 'SELECT * FROM "public"."customers" WHERE ("age" BETWEEN :p0 AND :p1)'
+    assert params == {"p0": 18, "p1": 30, "p2": 100}
+
+def test_like_operators_escape_wildcards():
+    _, params = compile_one(condition("email", "contains", "50%_off\\"))
+    assert params["p0"] == "%50\\%\\_off\\\\%"
+
+    _, params = compile_one(condition("email", "starts_with", "a_"))
+    assert params["p0"] == "a\\_%"
+
+    _, params = compile_one(condition("email", "ends_with", "%.com"))
+    assert params["p0"] == "%\\%.com"
+
+def test_contains_all_matches_every_value():
+    compiled, params = compile_one(condition("tags", "contains_all", ["vip", "50%"]))
+
+    assert '(CAST("tags" AS TEXT) LIKE ALL (CAST(:p0 AS TEXT[])))' in compiled.sql
+    assert params["p0"] == ["%vip%", "%50\\%%"]
+
+def test_contains_all_accepts_comma_separated_text():
+    compiled, params = compile_one(condition("tags", "contains_all", "vip, new ,"))
+
+    assert params["p0"] == ["%vip%", "%new%"]
+    # The value count is not part of the shape, so both forms share one statement
+    assert compiled is compile_one(condition("tags", "contains_all", ["a"]))[0]
+
+def test_contains_all_needs_a_value():
+    with pytest.raises(SegmentCompileError):
+        compile_one(condition("tags", "contains_all", " , "))
+
+def test_nested_groups_keep_placeholder_order():
+    tree = [
+        condition("city", "equals", "Berlin"),
+        group("or", condition("age", "greater_than", 30), condition("gender", "equals", "F")),
+    ]
+    compiled, params = compile_segment("customers", None, "AND", tree)
+
+    assert compiled.base_sql == (
+        'SELECT * FROM "customers" WHERE ("city" = :p0 AND ("age" > :p1 OR "gender" = :p2))'
+    )
+    assert [params["p0"], params["p1"], params["p2"]] == ["Berlin", 30, "F"]
+
+def test_empty_groups_and_incomplete_conditions_are_skipped():
+    tree = [group("OR"), condition("city", None, "x"), SegmentCondition(type="event", field="x", operator="equals")]
+    compiled, params = compile_segment("customers", None, "AND", tree)
+
+    assert compiled.base_sql == 'SELECT * FROM "customers" WHERE TRUE'
+    assert params == {"p0": 100}
+
+def test_same_shape_reuses_the_compiled_statement():
+    first, first_params = compile_one(condition("city", "equals", "Berlin"))
+    second, second_params = compile_one(condition("city", "equals", "Paris"))
+
+    assert first is second
+    assert first_params["p0"] == "Berlin" and second_params["p0"] == "Paris"
+
+def test_values_never_reach_the_sql():
+    payload = "x'; DROP TABLE customers; --"
+    compiled, params = compile_one(condition("city", "equals", payload))
+
+    assert payload not in compiled.sql
+    assert "DROP" not in compiled.sql
+    assert params["p0"] == payload
+
+@pytest.mark.parametrize("field", [
+    'city"; DROP TABLE customers; --',
+    "city OR 1=1",
+    "city)",
+    "1city",
+])
+def test_field_names_must_be_identifiers(field):
+    with pytest.raises(SegmentCompileError):
+        compile_one(condition(field, "equals", 1))
+
+@pytest.mark.parametrize("table, schema", [
+    ('customers"; DROP TABLE x; --', None),
+    ("customers", "public; DROP TABLE x"),
+])
+def test_table_and_schema_must_be_identifiers(table, schema):
+    with pytest.raises(SegmentCompileError):
+        compile_segment(table, schema, "AND", [condition("city", "equals", 1)])
+
+def test_unknown_operators_are_rejected():
+    with pytest.raises(SegmentCompileError):
+        compile_one(condition("city", "equals; DROP TABLE customers", 1))
+    with pytest.raises(SegmentCompileError):
+        compile_segment("customers", None, "AND", [group("AND OR", condition("city", "equals", 1))])
+
+def test_columns_outside_the_catalog_are_rejected():
+    with pytest.raises(SegmentCompileError):
+        compile_one(condition("password", "equals", "x"), columns=["city", "email"])
+
+def test_keyset_and_offset_pages():
+    compiled, params = compile_one(condition("city", "equals", "Berlin"), limit=11, order_key="customer_id", after=42)
+    assert compiled.sql.endswith('AND "customer_id" > :p1 ORDER BY "customer_id" LIMIT :p2')
+    assert params == {"p0": "Berlin", "p1": 42, "p2": 11}
+
+    compiled, params = compile_one(condition("city", "equals", "Berlin"), limit=11, offset=20)
+    assert compiled.sql.endswith("LIMIT :p1 OFFSET :p2")
+    assert params == {"p0": "Berlin", "p1": 11, "p2": 20}